@@ -1,8 +1,12 @@
 import customtkinter as ctk
 from tkinter import messagebox
 from .rtsp_helper import RTSPHelper
+from .roi_editor import ROIEditor
 
 RAL_6002 = "#2D572C"
+CAPTURE_MODES = ["grab", "decode_all"]
+CALVING_CAPTURE_MODES = CAPTURE_MODES + ["keyframes"]
+CAPTURE_BACKENDS = ["opencv", "ffmpeg"]
 
 class CameraSettingsFrame(ctk.CTkFrame):
     def __init__(self, parent, config_manager, refresh_callback):
@@ -11,6 +15,7 @@ class CameraSettingsFrame(ctk.CTkFrame):
         self.refresh_callback = refresh_callback # Function to refresh the list in the sidebar
         self.current_cam_id = None
         self.dynamic_vars = {}
+        self.roi_polygons = []
 
         self.setup_ui()
 
@@ -35,48 +40,85 @@ class CameraSettingsFrame(ctk.CTkFrame):
         self.entry_url.grid(row=0, column=0, sticky="ew", padx=(0, 5))
 
         self.btn_rtsp_helper = ctk.CTkButton(rtsp_container, text="+", width=30, 
-                                             fg_color=RAL_6002, command=self.open_rtsp_helper)
+                                             fg_color=RAL_6002, command=lambda: self.open_rtsp_helper(self.entry_url))
         self.btn_rtsp_helper.grid(row=0, column=1)
 
+        # --- Optional dual stream (sub-stream for detection, main stream for screenshots) ---
+        self.entry_detection_url = self._add_url_row("Detection URL (sub):", 3, "sub")
+        self.entry_evidence_url = self._add_url_row("Evidence URL (main):", 4, "main")
+
         # --- Other fields ---
-        ctk.CTkLabel(self, text="Telegram Bot:").grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        ctk.CTkLabel(self, text="Telegram Bot:").grid(row=5, column=0, padx=10, pady=5, sticky="w")
         self.combo_bot = ctk.CTkComboBox(self, values=["None"])
-        self.combo_bot.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        self.combo_bot.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
 
         # Switches
         self.var_enabled = ctk.BooleanVar()
         self.switch_enabled = ctk.CTkSwitch(self, text="Enabled", variable=self.var_enabled, progress_color=RAL_6002)
-        self.switch_enabled.grid(row=4, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        self.switch_enabled.grid(row=6, column=0, columnspan=2, padx=10, pady=5, sticky="w")
         
         self.var_live = ctk.BooleanVar()
         self.switch_live = ctk.CTkSwitch(self, text="Show Live Feed", variable=self.var_live, progress_color=RAL_6002)
-        self.switch_live.grid(row=5, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        self.switch_live.grid(row=7, column=0, columnspan=2, padx=10, pady=5, sticky="w")
 
         # --- Handler Type ---
-        ctk.CTkLabel(self, text="Handler Type:", font=("", 12, "bold")).grid(row=6, column=0, sticky="w", padx=10, pady=(15, 0))
-        self.combo_type = ctk.CTkComboBox(self, values=["cowcatcher", "calvingcatcher"], command=self.on_type_change)
-        self.combo_type.grid(row=6, column=1, padx=10, pady=(15, 5), sticky="ew")
+        ctk.CTkLabel(self, text="Handler Type:", font=("", 12, "bold")).grid(row=8, column=0, sticky="w", padx=10, pady=(15, 0))
+        self.combo_type = ctk.CTkComboBox(self, values=["cowcatcher", "calvingcatcher", "combined"], command=self.on_type_change)
+        self.combo_type.grid(row=8, column=1, padx=10, pady=(15, 5), sticky="ew")
 
         # --- Dynamic Frame ---
         self.frame_dynamic = ctk.CTkFrame(self, fg_color="transparent")
-        self.frame_dynamic.grid(row=7, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+        self.frame_dynamic.grid(row=9, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
         self.frame_dynamic.grid_columnconfigure(1, weight=1)
 
+        # --- Region of Interest (only this part of the image goes to the AI) ---
+        ctk.CTkLabel(self, text="Region of Interest:").grid(row=10, column=0, padx=10, pady=5, sticky="w")
+        roi_container = ctk.CTkFrame(self, fg_color="transparent")
+        roi_container.grid(row=10, column=1, padx=10, pady=5, sticky="ew")
+        roi_container.grid_columnconfigure(0, weight=1)
+
+        self.lbl_roi = ctk.CTkLabel(roi_container, text="Full frame", anchor="w")
+        self.lbl_roi.grid(row=0, column=0, sticky="ew")
+        ctk.CTkButton(roi_container, text="Edit", width=60, fg_color=RAL_6002, command=self.open_roi_editor).grid(row=0, column=1)
+
         # Buttons
         self.btn_save = ctk.CTkButton(self, text="Save", fg_color=RAL_6002, command=self.save_camera)
-        self.btn_save.grid(row=9, column=1, padx=10, pady=20, sticky="e")
+        self.btn_save.grid(row=11, column=1, padx=10, pady=20, sticky="e")
         
         self.btn_del = ctk.CTkButton(self, text="Delete", fg_color="#8B0000", hover_color="#500000", command=self.delete_camera)
-        self.btn_del.grid(row=9, column=0, padx=10, pady=20, sticky="w")
-
-    def open_rtsp_helper(self):
+        self.btn_del.grid(row=11, column=0, padx=10, pady=20, sticky="w")
+
+    def _add_url_row(self, label, row, stream):
+        """Adds an optional RTSP URL entry with its own helper button."""
+        ctk.CTkLabel(self, text=label).grid(row=row, column=0, padx=10, pady=5, sticky="w")
+        container = ctk.CTkFrame(self, fg_color="transparent")
+        container.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
+        container.grid_columnconfigure(0, weight=1)
+
+        entry = ctk.CTkEntry(container, placeholder_text="optional, defaults to RTSP URL")
+        entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        ctk.CTkButton(container, text="+", width=30, fg_color=RAL_6002,
+                      command=lambda: self.open_rtsp_helper(entry, stream)).grid(row=0, column=1)
+        return entry
+
+    def open_rtsp_helper(self, entry, stream="main"):
         """Opens the popup to generate RTSP links."""
-        RTSPHelper(self, self.fill_rtsp_field)
+        RTSPHelper(self, lambda url: self.fill_rtsp_field(entry, url), stream=stream)
 
-    def fill_rtsp_field(self, url):
+    def fill_rtsp_field(self, entry, url):
         """Callback function for the RTSPHelper."""
-        self.entry_url.delete(0, "end")
-        self.entry_url.insert(0, url)
+        entry.delete(0, "end")
+        entry.insert(0, url)
+
+    def open_roi_editor(self):
+        """Opens the popup to draw the ROI polygons on a snapshot of the detection stream."""
+        url = self.entry_detection_url.get() or self.entry_url.get()
+        ROIEditor(self, self.set_roi, url, self.roi_polygons)
+
+    def set_roi(self, polygons):
+        """Callback function for the ROIEditor (also used when loading a camera)."""
+        self.roi_polygons = polygons
+        self.lbl_roi.configure(text=f"{len(polygons)} region(s)" if polygons else "Full frame")
 
     def load_camera(self, cam_id):
         self.current_cam_id = cam_id
@@ -85,8 +127,11 @@ class CameraSettingsFrame(ctk.CTkFrame):
 
         self.entry_name.delete(0, "end"); self.entry_name.insert(0, cam.get("name", ""))
         self.entry_url.delete(0, "end"); self.entry_url.insert(0, cam.get("rtsp_url", ""))
+        self.entry_detection_url.delete(0, "end"); self.entry_detection_url.insert(0, cam.get("detection_rtsp_url", ""))
+        self.entry_evidence_url.delete(0, "end"); self.entry_evidence_url.insert(0, cam.get("evidence_rtsp_url", ""))
         self.var_enabled.set(cam.get("enabled", True))
         self.var_live.set(cam.get("show_live_feed", False))
+        self.set_roi(cam.get("roi", []))
 
         # Update bots dropdown
         bots = [b['name'] for b in self.cfg.get_telegram_bots()]
@@ -115,6 +160,10 @@ class CameraSettingsFrame(ctk.CTkFrame):
         elif handler_type == "calvingcatcher":
             settings = self.cfg.get_calvingcatcher_settings()
             models = settings.get("available_models", [])
+        elif handler_type == "combined":
+            # One model for both detectors, it must know the mounting and the calving class
+            models = list(self.cfg.get_cowcatcher_settings().get("available_models", []))
+            models += [m for m in self.cfg.get_calvingcatcher_settings().get("available_models", []) if m not in models]
 
         current_model = data.get("model_path", "")
         if not current_model and models:
@@ -130,7 +179,36 @@ class CameraSettingsFrame(ctk.CTkFrame):
         elif handler_type == "calvingcatcher":
             self._add_field("Save Threshold:", "save_threshold", data.get("save_threshold", 0.80), float, 1)
             self._add_field("Notify Threshold:", "notify_threshold", data.get("notify_threshold", 0.87), float, 2)
-            self._add_field("Check Interval (sec):", "check_interval", data.get("check_interval", 1), int, 3)
+
+        elif handler_type == "combined":
+            self._add_field("Mounting Notify Threshold:", "notify_threshold", data.get("notify_threshold", 0.87), float, 1)
+            self._add_field("Calving Save Threshold:", "calving_save_threshold", data.get("calving_save_threshold", 0.80), float, 2)
+            self._add_field("Calving Notify Threshold:", "calving_notify_threshold", data.get("calving_notify_threshold", 0.87), float, 3)
+            self._add_field("Calving Check Interval (sec):", "check_interval", data.get("check_interval", 1), int, 4)
+
+        # --- STEP 3: Sampling rate (analyzed frames per second) ---
+        # Idle at the min rate, full rate as soon as something is detected, lower when the CPU is saturated
+        default_min, default_max = (0.2, 1.0) if handler_type == "calvingcatcher" else (2.0, 10.0)
+        row = 5 if handler_type == "combined" else 4
+        self._add_field("Min Rate (frames/sec):", "min_rate", data.get("min_rate", default_min), float, row)
+        self._add_field("Max Rate (frames/sec):", "max_rate", data.get("max_rate", default_max), float, row + 1)
+
+        # --- STEP 4: Capture ---
+        # grab = skipped frames are grabbed but never decoded, decode_all = decode every frame,
+        # keyframes = only decode I-frames (calving, needs ffmpeg and a keyframe interval <= 1 / max rate)
+        modes = CALVING_CAPTURE_MODES if handler_type == "calvingcatcher" else CAPTURE_MODES
+        row += 2
+        self._add_dropdown("Capture Mode:", "capture_mode", data.get("capture_mode", "grab"), list(modes), row)
+        # ffmpeg = decode and scale to the model input size in an ffmpeg subprocess (needs ffmpeg on PATH),
+        # screenshots then come from a second, full resolution connection to the camera
+        self._add_dropdown("Capture Backend:", "capture_backend", data.get("capture_backend", "opencv"), list(CAPTURE_BACKENDS), row + 1)
+        self._add_field("Model Input Size:", "imgsz", data.get("imgsz", 640), int, row + 2)
+
+        # --- STEP 5: Cascade ---
+        # Low resolution search over the whole frame, candidates are checked on full resolution crops
+        # at up to the model input size (use the full resolution stream for detection)
+        self._add_switch("Cascade (far away cows)", "cascade", data.get("cascade", False), row + 3)
+        self._add_field("Search Input Size:", "cascade_imgsz", data.get("cascade_imgsz", 320), int, row + 4)
 
 
     def _add_dropdown(self, label, key, current_value, options, row):
@@ -164,10 +242,13 @@ class CameraSettingsFrame(ctk.CTkFrame):
                 "id": self.current_cam_id,
                 "name": self.entry_name.get(),
                 "rtsp_url": self.entry_url.get(),
+                "detection_rtsp_url": self.entry_detection_url.get(),
+                "evidence_rtsp_url": self.entry_evidence_url.get(),
                 "enabled": self.var_enabled.get(),
                 "show_live_feed": self.var_live.get(),
                 "telegram_bot": self.combo_bot.get(),
-                "type": self.combo_type.get()
+                "type": self.combo_type.get(),
+                "roi": self.roi_polygons
             }
             for key, info in self.dynamic_vars.items():
                 val = info['var'].get()
@@ -2,6 +2,7 @@ import customtkinter as ctk
 from .sub_cowcatcher import CowCatcherSettings
 from .sub_calving import CalvingSettings
 from .sub_telegram import TelegramSettings
+from .sub_inference import InferenceServerSettings
 
 RAL_6002 = "#2D572C"
 
@@ -15,7 +16,7 @@ class ConfigTab(ctk.CTkFrame):
         
         self.sidebar = ctk.CTkFrame(self, width=200, corner_radius=0)
         self.sidebar.grid(row=0, column=0, sticky="nsew")
-        self.sidebar.grid_rowconfigure(4, weight=1) 
+        self.sidebar.grid_rowconfigure(5, weight=1) 
         
         ctk.CTkLabel(self.sidebar, text="CONFIGURATIE", font=ctk.CTkFont(size=14, weight="bold")).grid(row=0, column=0, padx=20, pady=20)
         
@@ -28,13 +29,17 @@ class ConfigTab(ctk.CTkFrame):
         self.btn_tele = ctk.CTkButton(self.sidebar, text="Telegram", fg_color="transparent", command=lambda: self.show_view("tele"))
         self.btn_tele.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
 
+        self.btn_infer = ctk.CTkButton(self.sidebar, text="Inference Server", fg_color="transparent", command=lambda: self.show_view("infer"))
+        self.btn_infer.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
+
         self.content_area = ctk.CTkFrame(self, fg_color="transparent")
         self.content_area.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
 
         self.views = {
             "cow": CowCatcherSettings(self.content_area, self.cfg),
             "calv": CalvingSettings(self.content_area, self.cfg),
-            "tele": TelegramSettings(self.content_area, self.cfg)
+            "tele": TelegramSettings(self.content_area, self.cfg),
+            "infer": InferenceServerSettings(self.content_area, self.cfg)
         }
         
         self.show_view("cow")
@@ -44,9 +49,11 @@ class ConfigTab(ctk.CTkFrame):
         self.btn_cow.configure(fg_color="transparent")
         self.btn_calv.configure(fg_color="transparent")
         self.btn_tele.configure(fg_color="transparent")
+        self.btn_infer.configure(fg_color="transparent")
 
         self.views[name].pack(fill="both", expand=True)
         
         if name == "cow": self.btn_cow.configure(fg_color="gray")
         elif name == "calv": self.btn_calv.configure(fg_color="gray")
-        elif name == "tele": self.btn_tele.configure(fg_color="gray")
\ No newline at end of file
+        elif name == "tele": self.btn_tele.configure(fg_color="gray")
+        elif name == "infer": self.btn_infer.configure(fg_color="gray")
\ No newline at end of file
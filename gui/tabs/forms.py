@@ -36,6 +36,8 @@ class DynamicSettingsFrame(ctk.CTkFrame):
 
         if self.settings_key == "cowcatcher":
             data = self.cfg.get_cowcatcher_settings()
+        elif self.settings_key == "inference_server":
+            data = self.cfg.get_inference_server_settings()
         else:
             data = self.cfg.get_calvingcatcher_settings()
 
@@ -46,6 +48,8 @@ class DynamicSettingsFrame(ctk.CTkFrame):
             new_settings = self._extract_form()
             if self.settings_key == "cowcatcher":
                 self.cfg.update_cowcatcher_settings(new_settings)
+            elif self.settings_key == "inference_server":
+                self.cfg.update_inference_server_settings(new_settings)
             else:
                 self.cfg.update_calvingcatcher_settings(new_settings)
             messagebox.showinfo("Success", f"{self.title} saved successfully.")
@@ -28,7 +28,9 @@ class HelpPopup(ctk.CTkToplevel):
 
         self.add_section("2. Detection Modes", 
             "• CowCatcher: Specifically monitors for 'mounting' behavior, the primary sign of estrus (heat).\n"
-            "• CalvingCatcher: Monitors for signs of calving and automatically saves high-resolution photos when detection confidence is high.")
+            "• CalvingCatcher: Monitors for signs of calving and automatically saves high-resolution photos when detection confidence is high.\n"
+            "• Combined: Runs both detections on one camera with a single model pass per frame. "
+            "The selected model must detect both mounting and calving.")
 
         self.add_section("3. Hardware Requirements", 
             "• Camera: Any IP camera that supports RTSP.\n"
@@ -37,14 +39,38 @@ class HelpPopup(ctk.CTkToplevel):
 
         self.add_section("4. Telegram Integration", 
             "The system sends instant photo notifications to your smartphone via Telegram.\n\n"
-            "Remote Commands (CalvingCatcher):\n"
+            "Remote Commands (CalvingCatcher and Combined):\n"
             "• 'start' or 'check': Manually triggers monitoring for 15 minutes.\n"
             "• 'stop': Immediately terminates manual monitoring.")
 
         self.add_section("5. Settings & Thresholds", 
             "• Notify Threshold: The confidence level (0.0 - 1.0) the AI must reach before sending an alert.\n"
             "• Save Threshold: Saves an image to your local drive without triggering a notification alarm.\n"
-            "• Min. Detections: The number of consecutive frames required to validate an event.")
+            "• Detection / Evidence URL: Optionally run detection on the camera's low resolution sub-stream. "
+            "The high resolution main stream is then only opened for screenshots during an event or alarm.\n"
+            "• Min. Detections: The number of consecutive frames required to validate an event.\n"
+            "• Region of Interest: Draw one or more areas (e.g. the pen) on a camera snapshot. Only these areas are "
+            "checked by the AI, which is faster and avoids false alarms from the feed alley or neighbouring pens.\n"
+            "• Motion Gate: Skips the AI on frames where nothing moved. Motion Sensitivity (0.0 - 1.0) sets how much "
+            "change counts as motion, Motion Keepalive (seconds) still runs the AI regularly on a quiet scene.\n"
+            "• Min / Max Rate: Frames per second the AI analyzes. A quiet camera runs at the min rate; as soon as a "
+            "detection reaches the Pre-trigger Confidence it switches to the max rate (held for Full Rate Hold Time "
+            "seconds). When the CPU load passes CPU Backoff Percent the rate is lowered, but never below the min rate.\n"
+            "• Cascade: For large pens where cows far from the camera are small. The whole frame is searched at the low "
+            "Search Input Size; only the spots where something may be happening are checked again at full resolution "
+            "(up to the Model Input Size). Use the high resolution stream for detection with this option.\n"
+            "• Gate Model: Optional small model file in weights/ (e.g. a nano classifier with the same classes) that "
+            "checks every frame first. Only frames it flags above Gate Confidence go to the full model, plus one frame "
+            "every Gate Full Pass Interval seconds. The log shows the gate recall measured on those frames.\n"
+            "• Track Between Detections (CowCatcher): While a mounting is being collected, the AI only runs every "
+            "Detect Every N Frames; in between the cows are followed with optical flow. Tracked frames count with a "
+            "slightly lower confidence (Track Confidence Decay), and the AI runs again as soon as a cow is lost.\n"
+            "• Event Screenshots (CowCatcher): During a mounting only the Max Screenshots best frames are kept in memory; "
+            "they are saved when the event ends. Event Archive Frames saves that many extra random frames of the event. "
+            "An event that does not reach Min. High Confidence Detections saves nothing, unless Save Rejected Events is on.\n"
+            "• History Seconds (CowCatcher): How far back the frames just before a mounting are kept, to be included in "
+            "the event. Streams above 1280x720 keep them JPEG compressed, History As JPEG does so for every stream; "
+            "History Max MB limits the memory of the uncompressed frames.")
 
         self.add_section("6. Support & Resources", 
             "For updates and source code, visit our GitHub:\n"
@@ -0,0 +1,130 @@
+import threading
+import tkinter as tk
+import customtkinter as ctk
+
+RAL_6002 = "#2D572C"
+CANVAS_WIDTH = 800
+CANVAS_HEIGHT = 450
+POLYGON_COLOR = "#4CAF50"
+DRAFT_COLOR = "#FFC107"
+
+class ROIEditor(ctk.CTkToplevel):
+    """
+    Popup to draw the region(s) of interest of a camera on a snapshot.
+    Left click adds a point, 'Close Polygon' finishes the current region.
+    Points are stored relative to the frame size (0.0 - 1.0), so the regions
+    fit both the main stream and the sub-stream of the camera.
+    """
+    def __init__(self, parent, callback, rtsp_url, polygons=None):
+        super().__init__(parent)
+        self.title("Region of Interest Editor")
+
+        # --- Window Size and Centering ---
+        width = CANVAS_WIDTH + 40
+        height = CANVAS_HEIGHT + 140
+
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+
+        x = (screen_width // 2) - (width // 2)
+        y = (screen_height // 2) - (height // 2)
+
+        self.geometry(f"{width}x{height}+{x}+{y}")
+
+        self.callback = callback
+        self.rtsp_url = rtsp_url
+        self.polygons = [list(map(list, p)) for p in (polygons or [])]
+        self.draft = []
+        self.photo = None # Keep a reference, otherwise Tk drops the image
+
+        self.after(100, self.lift)
+        self.attributes("-topmost", True)
+
+        self.setup_ui()
+        self.redraw()
+
+        # Load a snapshot in the background, the stream can take a few seconds to open
+        threading.Thread(target=self._load_snapshot, daemon=True).start()
+
+    def setup_ui(self):
+        self.lbl_info = ctk.CTkLabel(self, text="Loading camera snapshot... (click to add points)")
+        self.lbl_info.pack(pady=(10, 5))
+
+        self.canvas = tk.Canvas(self, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, bg="#202020", highlightthickness=0)
+        self.canvas.pack(padx=20)
+        self.canvas.bind("<Button-1>", self.add_point)
+
+        buttons = ctk.CTkFrame(self, fg_color="transparent")
+        buttons.pack(pady=15)
+        ctk.CTkButton(buttons, text="Close Polygon", width=120, fg_color=RAL_6002, command=self.close_polygon).pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Undo", width=80, command=self.undo).pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Clear All", width=80, fg_color="#8B0000", hover_color="#500000", command=self.clear).pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Insert into Settings", fg_color=RAL_6002, command=self.apply).pack(side="left", padx=(30, 5))
+
+    def _load_snapshot(self):
+        try:
+            import cv2
+            from PIL import Image
+            cap = cv2.VideoCapture(self.rtsp_url)
+            ret, frame = cap.read() if cap.isOpened() else (False, None)
+            cap.release()
+            if not ret:
+                raise RuntimeError("no frame")
+            frame = cv2.resize(frame, (CANVAS_WIDTH, CANVAS_HEIGHT), interpolation=cv2.INTER_AREA)
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        except Exception:
+            self.after(0, lambda: self.lbl_info.configure(text="No snapshot available, draw on the empty canvas (click to add points)"))
+            return
+        self.after(0, lambda: self._show_snapshot(image))
+
+    def _show_snapshot(self, image):
+        from PIL import ImageTk
+        if not self.winfo_exists():
+            return
+        self.photo = ImageTk.PhotoImage(image)
+        self.lbl_info.configure(text="Click to add points, 'Close Polygon' to finish a region")
+        self.redraw()
+
+    # --- Editing ---
+    def add_point(self, event):
+        self.draft.append([round(event.x / CANVAS_WIDTH, 4), round(event.y / CANVAS_HEIGHT, 4)])
+        self.redraw()
+
+    def close_polygon(self):
+        if len(self.draft) >= 3:
+            self.polygons.append(self.draft)
+        self.draft = []
+        self.redraw()
+
+    def undo(self):
+        if self.draft:
+            self.draft.pop()
+        elif self.polygons:
+            self.polygons.pop()
+        self.redraw()
+
+    def clear(self):
+        self.polygons = []
+        self.draft = []
+        self.redraw()
+
+    def apply(self):
+        self.close_polygon()
+        self.callback(self.polygons)
+        self.destroy()
+
+    def redraw(self):
+        self.canvas.delete("all")
+        if self.photo:
+            self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+
+        def to_canvas(points):
+            return [c for x, y in points for c in (x * CANVAS_WIDTH, y * CANVAS_HEIGHT)]
+
+        for polygon in self.polygons:
+            self.canvas.create_polygon(to_canvas(polygon), outline=POLYGON_COLOR, fill="", width=2)
+        if len(self.draft) > 1:
+            self.canvas.create_line(to_canvas(self.draft), fill=DRAFT_COLOR, width=2)
+        for x, y in self.draft:
+            cx, cy = x * CANVAS_WIDTH, y * CANVAS_HEIGHT
+            self.canvas.create_oval(cx - 3, cy - 3, cx + 3, cy + 3, fill=DRAFT_COLOR, outline="")
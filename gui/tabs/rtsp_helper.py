@@ -1,13 +1,13 @@
 import customtkinter as ctk
 
 class RTSPHelper(ctk.CTkToplevel):
-    def __init__(self, parent, callback):
+    def __init__(self, parent, callback, stream="main"):
         super().__init__(parent)
         self.title("Camera RTSP Helper")
         
         # --- Window Size and Centering ---
         width = 450
-        height = 580 # Slightly taller for the extra NVR field
+        height = 640 # Slightly taller for the extra NVR and stream fields
         
         screen_width = self.winfo_screenwidth()
         screen_height = self.winfo_screenheight()
@@ -18,6 +18,7 @@ class RTSPHelper(ctk.CTkToplevel):
         self.geometry(f"{width}x{height}+{x}+{y}")
         
         self.callback = callback
+        self.stream = stream
         self.after(100, self.lift)
         self.attributes("-topmost", True)
 
@@ -42,6 +43,15 @@ class RTSPHelper(ctk.CTkToplevel):
             "custom": "/"
         }
 
+        # Sub-stream (low resolution) paths, used for the detection stream
+        self.sub_brands = {
+            "Foscam": "/videoSub",
+            "TP-Link": "/stream2",
+            "Tapo": "/stream2",
+            "Axis": "/axis-media/media.amp?videocodec=h264&resolution=640x360",
+            "ctronics": "/12",
+        }
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -55,6 +65,12 @@ class RTSPHelper(ctk.CTkToplevel):
         self.brand_menu = ctk.CTkComboBox(self, values=list(self.brands.keys()), variable=self.brand_var, width=250)
         self.brand_menu.pack(pady=5)
 
+        # 1b. Stream Selection
+        ctk.CTkLabel(self, text="Stream:").pack(pady=(5, 0))
+        self.stream_var = ctk.StringVar(value="Sub-stream (detection)" if self.stream == "sub" else "Main stream")
+        self.stream_menu = ctk.CTkComboBox(self, values=["Main stream", "Sub-stream (detection)"], variable=self.stream_var, width=250)
+        self.stream_menu.pack(pady=5)
+
         # 2. IP Address
         ctk.CTkLabel(self, text="IP Address:").pack(pady=(5, 0))
         ip_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -161,23 +177,28 @@ class RTSPHelper(ctk.CTkToplevel):
         except ValueError:
             channel = 1 # Fallback if text is entered instead of a number
 
-        # Determine path based on brand and channel number
+        sub = self.stream_var.get().startswith("Sub")
+
+        # Determine path based on brand, channel number and stream
         if brand == "Reolink":
-            # Reolink: /h264Preview_01_main (Note the leading zero: 01, 02)
-            path = f"/h264Preview_{channel:02d}_main"
+            # Reolink: /h264Preview_01_main (Note the leading zero: 01, 02), sub-stream ends in _sub
+            path = f"/h264Preview_{channel:02d}_{'sub' if sub else 'main'}"
             
         elif brand in ["Dahua", "Amcrest", "Swann"]:
-            # Dahua style: channel=1, channel=2
-            path = f"/cam/realmonitor?channel={channel}&subtype=0"
+            # Dahua style: channel=1, channel=2, subtype=1 is the sub-stream
+            path = f"/cam/realmonitor?channel={channel}&subtype={1 if sub else 0}"
             
         elif brand in ["Hikvision", "Annke"]:
-            # Hikvision NVR style: 101 (ch1), 201 (ch2), etc.
-            path = f"/Streaming/Channels/{channel}01"
+            # Hikvision NVR style: 101 (ch1), 201 (ch2), etc. 102/202 are the sub-streams
+            path = f"/Streaming/Channels/{channel}0{2 if sub else 1}"
             
         elif brand == "Uniview":
-            # Uniview: unicast/c1/s0/live
-            path = f"/unicast/c{channel}/s0/live"
+            # Uniview: unicast/c1/s0/live, s1 is the sub-stream
+            path = f"/unicast/c{channel}/s{1 if sub else 0}/live"
             
+        elif sub and brand in self.sub_brands:
+            path = self.sub_brands[brand]
+
         else:
             # Fallback for brands without NVR logic or Custom
             path = self.brands.get(brand, "/")
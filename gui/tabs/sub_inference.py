@@ -0,0 +1,10 @@
+from .forms import DynamicSettingsFrame
+
+class InferenceServerSettings(DynamicSettingsFrame):
+    def __init__(self, parent, config_manager):
+        super().__init__(
+            parent, 
+            config_manager, 
+            "inference_server", 
+            "Inference Server Settings"
+        )
\ No newline at end of file
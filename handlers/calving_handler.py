@@ -2,12 +2,22 @@ import sys
 import os
 import json
 import time
-import threading
-import requests
-import cv2
-from datetime import datetime, timedelta
-from queue import Queue
-from ultralytics import YOLO
+from datetime import datetime
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.capture import EvidenceStream, open_detection_stream
+from handlers.detections import Detections
+from handlers.motion import MotionGate
+from handlers.roi import RegionOfInterest
+from handlers.model_loader import check_and_download_model, load_model
+from handlers.calving_logic import CalvingLogic
+from handlers.pipeline import Pipeline
+from handlers.sampler import AdaptiveSampler
+from handlers.cascade import CascadeDetector
+from handlers.gate import load_gate
+from handlers.image_writer import ImageWriter
+from handlers.notifier import Notifier, telegram_settings
 
 # --- PATH SETUP ---
 BASE_DIR = os.getcwd()
@@ -15,49 +25,6 @@ CONFIG_PATH = os.path.join(BASE_DIR, "settings", "config.json")
 WEIGHTS_DIR = os.path.join(BASE_DIR, "weights")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
-# --- MODEL DOWNLOADER ---
-def check_and_download_model(model_filename, download_url):
-    """
-    Checks if model exists. 
-    YES -> Prints 'Model found locally' and continues.
-    NO  -> Prints 'Not found', starts download, and warns about wait time.
-    """
-    if not os.path.exists(WEIGHTS_DIR):
-        os.makedirs(WEIGHTS_DIR)
-
-    model_local_path = os.path.join(WEIGHTS_DIR, model_filename)
-
-    # Check happens here:
-    if not os.path.exists(model_local_path):
-        # Model is NOT present
-        print(f"⚠️ Model '{model_filename}' not found locally.")
-        
-        if not download_url:
-            print("❌ Error: No download URL available in settings.")
-            sys.exit(1)
-
-        print(f"⬇️ Starting to download from: {download_url}")
-        print("⏳ Downloading model can take up to multiple minutes...")
-
-        sys.stdout.flush()
-        time.sleep(0.5)
-        
-        try:
-            response = requests.get(download_url, stream=True, timeout=30)
-            response.raise_for_status()
-            with open(model_local_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"✅ Model successfully downloaded to: {model_local_path}")
-        except Exception as e:
-            print(f"❌ ERROR downloading model: {e}")
-            sys.exit(1)
-    else:
-        # Model IS present
-        print(f"✅ Model found locally: {model_local_path}")
-
-    return model_local_path
-
 # --- LOAD CONFIG ---
 def load_config():
     try:
@@ -85,21 +52,33 @@ global_settings = config.get("calvingcatcher_settings", {})
 # --- SETTINGS ---
 NOTIFY_THRESHOLD = camera.get("notify_threshold", 0.87)
 SAVE_THRESHOLD = camera.get("save_threshold", 0.80)  # <--- NEW: Threshold for direct saving
-CHECK_INTERVAL = camera.get("check_interval", 1)
+# Scans per second: min while idle, max around detections (max defaults to the old fixed check interval)
+MAX_RATE = camera.get("max_rate", 1.0 / camera.get("check_interval", 1))
+MIN_RATE = camera.get("min_rate", min(0.2, MAX_RATE))
 RTSP_URL = camera.get("rtsp_url")
+# Optional dual stream: cheap sub-stream for detection, main stream only for screenshots
+DETECTION_URL = camera.get("detection_rtsp_url") or RTSP_URL
+EVIDENCE_URL = camera.get("evidence_rtsp_url") or RTSP_URL
+CAPTURE_MODE = camera.get("capture_mode", "grab")
+CAPTURE_BACKEND = camera.get("capture_backend", "opencv")
+IMGSZ = camera.get("imgsz", 640)
+# Cascade: low resolution search over the frame, full resolution check of the candidates
+CASCADE = camera.get("cascade", False)
+CASCADE_IMGSZ = camera.get("cascade_imgsz", 320)
+ROI = RegionOfInterest(camera.get("roi"))
 CAMERA_NAME = camera.get("name", "Unknown Camera")
 
-# Interval to prevent flood of save-images (e.g. max 1 per 5 sec at high confidence)
-HIGH_CONF_SAVE_INTERVAL = 5 
+EVIDENCE_TIMEOUT = 10 # Max seconds to wait for the evidence stream when an alarm fires
 
-MIN_DETECTIONS = global_settings.get("min_detections", 30)
-MANUAL_DURATION_MINUTES = global_settings.get("manual_mode_duration", 15)
-MANUAL_DURATION = MANUAL_DURATION_MINUTES * 60
-MANUAL_INTERVAL = global_settings.get("manual_mode_interval", 30)
-HARDCODED_SAVE_INTERVAL = 10 
+# Detection, alarm and manual mode settings are read by CalvingLogic
 SEND_CALVING_NOTIFICATIONS = global_settings.get("send_calving_notifications", False)
-SEND_CALVING_SCREENSHOTS = global_settings.get("send_calving_screenshots", False)
-SCREENSHOTS_INTERVAL = global_settings.get("Calving_screenshots_interval", 30)
+PRE_TRIGGER_CONFIDENCE = global_settings.get("pre_trigger_confidence", 0.5)
+FULL_RATE_HOLD_TIME = global_settings.get("full_rate_hold_time", 30)
+CPU_BACKOFF_PERCENT = global_settings.get("cpu_backoff_percent", 90)
+# Skip inference on frames without motion (off by default, calving can be slow)
+MOTION_GATE = global_settings.get("motion_gate", False)
+MOTION_SENSITIVITY = global_settings.get("motion_sensitivity", 0.5)
+MOTION_KEEPALIVE = global_settings.get("motion_keepalive", 30)
 
 # --- MODEL SELECTION ---
 camera_model_file = camera.get("model_path")
@@ -112,29 +91,23 @@ if not camera_model_file:
         camera_model_file = "cowcatcherV15.pt"
 
 # --- TELEGRAM SETUP ---
-BOT_NAME = camera.get("telegram_bot", "")
-telegram_bots = config.get("telegram", {}).get("bots", [])
-telegram_users = config.get("telegram", {}).get("users", [])
-TOKEN = next((b["token"] for b in telegram_bots if b["name"] == BOT_NAME and b["enabled"]), None)
-CHAT_IDS = [u["chat_id"] for u in telegram_users if u["enabled"]]
-
-telegram_queue = Queue()
+TOKEN, CHAT_IDS = telegram_settings(config, camera)
 
 # --- INITIALIZATION START ---
 
 print("Starting CalvingCatcherAI...")
 
 # 1. Model Check (Downloads only if necessary)
-final_model_path = check_and_download_model(camera_model_file, master_model_url)
+final_model_path = check_and_download_model(camera_model_file, master_model_url, WEIGHTS_DIR)
 
-# 2. Load Model
-print(f"Loading detection model: {final_model_path}")
-try:
-    model = YOLO(final_model_path)
-    print("Detection model successfully loaded")
-except Exception as e:
-    print(f"❌ FATAL ERROR: Could not load model. {e}")
-    sys.exit(1)
+# 2. Load Model (or use the shared inference server when the application runs one)
+model = load_model(final_model_path, IMGSZ, global_settings)
+
+# Cascade uses the same model for the search and for the check of the candidates
+detector = CascadeDetector(model, CASCADE_IMGSZ, global_settings.get("cascade_candidate_confidence", 0.2),
+                           global_settings.get("cascade_crop_margin", 0.5), global_settings.get("cascade_max_crops", 4)) if CASCADE else model
+# Optional tiny gate model: only the scans it flags go to the full model
+gate = load_gate(global_settings, WEIGHTS_DIR, [1], positive_conf=SAVE_THRESHOLD)
 
 # 3. Connect Camera
 print(f"Connecting to camera: {CAMERA_NAME}")
@@ -146,183 +119,165 @@ manual_save_folder = os.path.join(DATA_DIR, "manual", CAMERA_ID)
 os.makedirs(manual_save_folder, exist_ok=True)
 
 # 4. Telegram Status
-num_chats = len(CHAT_IDS) if TOKEN else 0
-print(f"Telegram bot active for {num_chats} chat(s)")
-
-# Threads definitions
-def telegram_worker():
-    while True:
-        task = telegram_queue.get()
-        if task is None: break 
-        t_type, path, msg, silent = task
-        if not TOKEN: 
-            telegram_queue.task_done()
-            continue
-        for chat_id in CHAT_IDS:
-            try:
-                if t_type == 'photo':
-                    with open(path, 'rb') as f:
-                        requests.post(f"https://api.telegram.org/bot{TOKEN}/sendPhoto", 
-                            files={'photo': f}, data={'chat_id': chat_id, 'caption': msg, 'disable_notification': silent}, timeout=30)
-                elif t_type == 'text':
-                    requests.post(f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-                        data={'chat_id': chat_id, 'text': msg, 'disable_notification': silent}, timeout=30)
-            except Exception as e:
-                print(f"Telegram Error: {e}")
-        telegram_queue.task_done()
-
-global manual_expiry
-manual_expiry = None
-
-def command_listener():
-    global manual_expiry
-    last_id = 0
-    while True:
-        if not TOKEN: 
-            time.sleep(30); continue
-        try:
-            url = f"https://api.telegram.org/bot{TOKEN}/getUpdates?offset={last_id+1}&timeout=10"
-            r = requests.get(url, timeout=15).json()
-            for u in r.get("result", []):
-                last_id = u["update_id"]
-                msg_text = u.get("message", {}).get("text", "").lower()
-                if "check" in msg_text or "start" in msg_text:
-                    manual_expiry = datetime.now() + timedelta(seconds=MANUAL_DURATION)
-                    print(f"📸 Manual monitoring started via Telegram.")
-                    reply = f"✅ Started manual mode for {MANUAL_DURATION_MINUTES} min."
-                    telegram_queue.put(('text', None, reply, False))
-                elif "stop" in msg_text:
-                    manual_expiry = None
-                    print("🛑 Manual monitoring stopped by user.")
-                    telegram_queue.put(('text', None, "Manual process stopped", False))
-        except Exception: pass
-        time.sleep(2)
-
-if TOKEN and CHAT_IDS:
-    # Test connection
-    try:
-        if requests.get(f"https://api.telegram.org/bot{TOKEN}/getMe", timeout=5).status_code == 200:
-            print("Telegram bot connection tested")
-        else:
-            print("⚠️ Telegram connection test failed")
-    except:
-        print("⚠️ Telegram connection test failed (Network error)")
-
-    # Start threads
-    t_tele = threading.Thread(target=telegram_worker, daemon=True)
-    t_tele.start()
-    t_cmd = threading.Thread(target=command_listener, daemon=True)
-    t_cmd.start()
-    
+notifier = Notifier(CAMERA_ID, TOKEN, CHAT_IDS, DATA_DIR, camera_name=CAMERA_NAME)
+
+# Screenshots and calving event logic
+def evidence_frame(frame):
+    """
+    Returns a fresh frame for screenshots: from the evidence stream when it differs from the
+    detection stream, when keyframe decoding makes the scanned frame up to one GOP old, or
+    when ffmpeg scales the scanned frame down. Falls back to `frame` itself.
+    """
+    if EVIDENCE_URL == DETECTION_URL and grabber.mode != "keyframes" and not grabber.scaled:
+        return frame
+    ev_frame = evidence.frame(timeout=EVIDENCE_TIMEOUT)
+    return ev_frame if ev_frame is not None else frame
+
+# Disk writes and Telegram sends are collected here and run on the persist stage,
+# the screenshots themselves are encoded and written by the image writer pool
+persist_jobs = []
+writer = ImageWriter()
+calving = CalvingLogic(CAMERA_NAME, global_settings, SAVE_THRESHOLD, NOTIFY_THRESHOLD, save_folder, manual_save_folder,
+                       send_photo=notifier.send_photo,
+                       evidence_frame=evidence_frame, persist=persist_jobs.append, writer=writer)
+
+# Telegram commands start and stop the manual check
+if notifier.start(handle_command=calving.handle_command) and SEND_CALVING_NOTIFICATIONS:
     # Optional start msg
-    if SEND_CALVING_NOTIFICATIONS:
-        telegram_queue.put(('text', None, f"📋 CalvingCatcher started at {datetime.now().strftime('%H:%M')}", True))
-
-# 5. Stream
-print("Opening camera stream...")
-cap = cv2.VideoCapture(RTSP_URL)
-if not cap.isOpened():
-    print("ERROR: Cannot open camera stream")
-    sys.exit(1)
-else:
-    print("Camera stream successfully opened")
+    notifier.send_message(f"📋 CalvingCatcher started at {datetime.now().strftime('%H:%M')}", disable_notification=True)
+
+# 5. Stream (captured on its own thread, newest frame wins)
+grabber = open_detection_stream(DETECTION_URL, CAPTURE_MODE, CAPTURE_BACKEND, IMGSZ, cascade=CASCADE,
+                                max_keyframe_interval=1.0 / MAX_RATE)
+
+# Evidence stream: only opened for alarms and manual checks, closed again when idle
+evidence = EvidenceStream(EVIDENCE_URL, backend=CAPTURE_BACKEND)
+
+motion_gate = MotionGate(MOTION_SENSITIVITY, MOTION_KEEPALIVE) if MOTION_GATE else None
+sampler = AdaptiveSampler(MIN_RATE, MAX_RATE, PRE_TRIGGER_CONFIDENCE, FULL_RATE_HOLD_TIME, CPU_BACKOFF_PERCENT)
+
+# --- PIPELINE STAGES (each on its own thread) ---
+processed_count = 0
+
+def capture_stage():
+    # Only ask for a frame when a scan or manual save is due (in grab mode the rest is never decoded)
+    current_time = time.time()
+    wait = sampler.wait_time(current_time)
+    if calving.manual_expiry:
+        wait = min(wait, calving.next_manual_due() - current_time)
+    if wait > 0:
+        time.sleep(min(wait, 1.0))
+        return None
+
+    # Reconnecting is handled by the capture thread
+    ret, frame, capture_time = grabber.read()
+    if not ret:
+        return None
+
+    current_time = time.time()
+    scan = sampler.wait_time(current_time) == 0
+    if scan:
+        sampler.taken(current_time)
+    return {'frame': frame, 'time': current_time, 'scan': scan}
+
+def preprocess_stage(item):
+    global processed_count
+    item['run_model'] = False
+    if item['scan']:
+        processed_count += 1
+        # Only the region of interest goes to the model (and counts for motion)
+        item['roi'], item['offset'] = ROI.crop(item['frame'])
+
+        # Motion gate: while a detection is building up every scan goes to the model
+        if motion_gate:
+            if calving.detection_counter > 0:
+                motion_gate.force(item['roi'], item['time'])
+                item['run_model'] = True
+            else:
+                item['run_model'] = motion_gate.check(item['roi'], item['time'])
+        else:
+            item['run_model'] = True
+    return item
+
+def gate_stage(item):
+    # Scans the gate model does not flag skip the full model (except the periodic check and while a detection builds up)
+    if item['run_model']:
+        item['run_model'], item['gate_sample'] = gate.check(item['roi'], item['time'], force=calving.detection_counter > 0)
+    return item
+
+def inference_stage(item):
+    item['result'] = None
+    if item['run_model']:
+        frame = item['frame']
+        # We set conf slightly lower here (e.g. 0.4) so we can filter for SAVE vs NOTIFY ourselves
+        results = detector.predict(source=item['roi'], conf=0.4, imgsz=ROI.imgsz(IMGSZ, frame.shape), verbose=False, classes=[1])
+        # Only a compact record in full-frame coordinates is kept (the alarm screenshot shows the whole image),
+        # the Results object with its image and tensors is dropped here
+        item['result'] = Detections.from_result(results[0], frame.shape, item['offset'])
+        if item.get('gate_sample') is not None:
+            # Periodic pass: compare the gate verdict with the full model (recall in the log)
+            gate.record(item['gate_sample'], item['result'].max_conf())
+    return item
+
+def event_stage(item):
+    if item['scan']:
+        calving.scan(item['result'], item['frame'], item['time'])
+        # Full rate once something calving-like is seen and while a detection builds up
+        sampler.report(calving.last_conf, active=calving.detection_counter > 0)
+
+    # Manual Monitoring
+    calving.manual_check(item['frame'], item['time'])
+
+    evidence.close_if_idle()
+
+    item['jobs'] = persist_jobs[:]
+    persist_jobs.clear()
+    return item if item['jobs'] else None
+
+def persist_stage(item):
+    for job in item['jobs']:
+        job()
+
+pipeline = Pipeline(capture_stage, [
+    ("preprocess", preprocess_stage),
+    *([("gate", gate_stage)] if gate else []),
+    ("inference", inference_stage),
+    ("events", event_stage),
+    ("persist", persist_stage),
+])
 
 print("Processing started")
 
 # --- MAIN LOOP ---
-last_scan_time = 0
+# The main thread only logs; check() re-raises errors of the stages
 last_print_time = 0
-frame_count = 0
-processed_count = 0
-last_trigger_time = 0
-last_manual_save = 0
-last_manual_send = 0
-last_threshold_save_time = 0 # <--- NEW: Timer for threshold saves
-detection_counter = 0
+last_progress = None # (frames read, frames scanned) at the last log line
 
 try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("⚠️ Stream lost, reconnecting in 5s...")
-            cap.release()
-            time.sleep(5)
-            cap = cv2.VideoCapture(RTSP_URL)
-            continue
-
-        frame_count += 1
+    pipeline.start()
+    while pipeline.check():
         current_time = time.time()
 
-        # AI Detection
-        if current_time - last_scan_time >= CHECK_INTERVAL:
-            last_scan_time = current_time
-            processed_count += 1
-            
-            # Run inference
-            # We set conf slightly lower here (e.g. 0.4) so we can filter for SAVE vs NOTIFY ourselves
-            results = model.predict(source=frame, conf=0.4, verbose=False, classes=[1])
-            
-            top_conf = 0.0
-            if len(results[0].boxes) > 0:
-                top_conf = float(results[0].boxes[0].conf)
-
-            # --- NEW: SAVE THRESHOLD LOGIC ---
-            # If detection is higher than save_threshold, save immediately (independent of alarm)
-            if top_conf >= SAVE_THRESHOLD:
-                if (current_time - last_threshold_save_time) >= HIGH_CONF_SAVE_INTERVAL:
-                    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    # Filename now includes the confidence score
-                    path = os.path.join(save_folder, f"calving_highconf_{ts}_conf{top_conf:.2f}.jpg")
-                    cv2.imwrite(path, frame)
-                    print(f"💾 High Conf Save ({top_conf:.2f}): {path}")
-                    last_threshold_save_time = current_time
-            # -------------------------------------
-
-            if top_conf >= NOTIFY_THRESHOLD:
-                detection_counter += 1
-                if detection_counter > (MIN_DETECTIONS + 5): detection_counter = MIN_DETECTIONS + 5
-
-                if detection_counter >= MIN_DETECTIONS:
-                    if (current_time - last_trigger_time) >= SCREENSHOTS_INTERVAL:
-                        print(f"🚨 DETECTION EVENT (Conf: {top_conf:.2f})")
-                        last_trigger_time = current_time 
-                        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        path = os.path.join(save_folder, f"calving_alarm_{ts}.jpg")
-                        cv2.imwrite(path, results[0].plot())
-
-                        if SEND_CALVING_NOTIFICATIONS:
-                            if SEND_CALVING_SCREENSHOTS:
-                                caption = f"🚨 CALVING ({CAMERA_NAME})\nConf: {top_conf:.2f}"
-                                telegram_queue.put(('photo', path, caption, False))
-            else:
-                detection_counter = max(0, detection_counter - 1)
-
         # Console Log (every 10s)
         if current_time - last_print_time >= 10:
             last_print_time = current_time
             ts_str = datetime.now().strftime("%H:%M:%S")
-            print(f"[{ts_str}] Frames processed {processed_count} | Detection: {detection_counter}/{MIN_DETECTIONS}", flush=True)
-
-        # Manual Monitoring
-        if manual_expiry:
-            if datetime.now() < manual_expiry:
-                if current_time - last_manual_save >= HARDCODED_SAVE_INTERVAL:
-                    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    path = os.path.join(manual_save_folder, f"manual_{ts}.jpg")
-                    cv2.imwrite(path, frame)
-                    print(f"📸 Manual save: {path}")
-                    last_manual_save = current_time
-
-                    if current_time - last_manual_send >= MANUAL_INTERVAL:
-                        telegram_queue.put(('photo', path, f"🕒 Check: {CAMERA_NAME}", True))
-                        last_manual_send = current_time
-                        print(f"📤 Photo sent to Telegram")
-            else:
-                manual_expiry = None
-                print("⏹️ Manual monitoring expired.")
+            motion_info = f" | {motion_gate.stats_line()}" if motion_gate else ""
+            if CASCADE: motion_info += f" | {detector.stats_line()}"
+            if gate: motion_info += f" | {gate.stats_line()}"
+            # Only report frames processed while frames actually come in, a stalled stream must not look alive
+            progress = (grabber.last_read_id, processed_count)
+            heartbeat = f"Frames processed {processed_count} | " if progress != last_progress else ""
+            last_progress = progress
+            print(f"[{ts_str}] {heartbeat}Detection: {calving.detection_counter}/{calving.min_detections} | {grabber.stats_line()}{motion_info} | {sampler.stats_line()} | {pipeline.stats_line()} | {writer.stats_line()} | {notifier.stats_line()}", flush=True)
+
+        time.sleep(0.5)
 
 except KeyboardInterrupt:
     print("\nScript stopped by user.")
 finally:
-    cap.release()
-    telegram_queue.put(None)
\ No newline at end of file
+    pipeline.stop()
+    writer.close()
+    grabber.stop()
+    evidence.close()
+    notifier.close()
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Calving event logic of the CalvingCatcher handler.
+
+Takes the detections of every scan: saves high confidence frames, counts
+consecutive detections and raises the alarm when the counter reaches 'min_detections'.
+Also runs the manual monitoring mode that is started with a Telegram command.
+Used by calving_handler.py and combined_handler.py.
+"""
+
+import os
+from datetime import datetime, timedelta
+from functools import partial
+
+from handlers.detections import draw_detections
+from handlers.image_writer import write_now
+
+HIGH_CONF_SAVE_INTERVAL = 5 # Max 1 high confidence save per 5 sec
+MANUAL_SAVE_INTERVAL = 10
+
+
+class CalvingLogic:
+    def __init__(self, camera_name, settings, save_threshold, notify_threshold, save_folder, manual_save_folder,
+                 send_photo, evidence_frame=None, persist=None, writer=None):
+        """
+        settings: the 'calvingcatcher_settings' of config.json.
+        send_photo(path, caption, disable_notification, priority): queues a Telegram photo
+        ('alarm' or 'manual', see logic/outbox.py).
+        evidence_frame(frame): returns the frame to use for screenshots (default: the frame itself).
+        persist(job): runs the high confidence, alarm and manual screenshots and sending (a callable without
+        arguments) in order, e.g. on the persist stage of the pipeline. Default: right away.
+        writer: optional ImageWriter for the screenshots (default: written right away).
+        """
+        self.camera_name = camera_name
+        self.save_threshold = save_threshold
+        self.notify_threshold = notify_threshold
+        self.save_folder = save_folder
+        self.manual_save_folder = manual_save_folder
+        self.send_photo = send_photo
+        self.evidence_frame = evidence_frame or (lambda frame: frame)
+        self.persist = persist or (lambda job: job())
+        self.write_image = writer.write if writer else write_now
+
+        self.min_detections = settings.get("min_detections", 30)
+        self.manual_duration_minutes = settings.get("manual_mode_duration", 15)
+        self.manual_interval = settings.get("manual_mode_interval", 30)
+        self.send_calving_notifications = settings.get("send_calving_notifications", False)
+        self.send_calving_screenshots = settings.get("send_calving_screenshots", False)
+        self.screenshots_interval = settings.get("Calving_screenshots_interval", 30)
+
+        self.detection_counter = 0
+        self.last_conf = 0.0 # Highest confidence of the last scan
+        self.last_trigger_time = 0
+        self.last_threshold_save_time = 0
+        self.manual_expiry = None
+        self.last_manual_save = 0
+        self.last_manual_send = 0
+
+    # --- Detection ---
+    def scan(self, detections, frame, current_time):
+        """Processes the calving Detections (class 1) of one scan. `detections` is None when the scan was skipped."""
+        top_conf = detections.max_conf() if detections is not None else 0.0
+        self.last_conf = top_conf
+
+        # If detection is higher than save_threshold, save immediately (independent of alarm)
+        if top_conf >= self.save_threshold:
+            if (current_time - self.last_threshold_save_time) >= HIGH_CONF_SAVE_INTERVAL:
+                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+                # Filename includes the confidence score
+                path = os.path.join(self.save_folder, f"calving_highconf_{ts}_conf{top_conf:.2f}.jpg")
+                # Like the alarm: the evidence frame can take seconds, keep it off the detection path
+                self.persist(partial(self._write_high_conf, path, frame, top_conf))
+                self.last_threshold_save_time = current_time
+
+        if top_conf >= self.notify_threshold:
+            self.detection_counter = min(self.detection_counter + 1, self.min_detections + 5)
+
+            if self.detection_counter >= self.min_detections:
+                if (current_time - self.last_trigger_time) >= self.screenshots_interval:
+                    self._alarm(detections, frame, top_conf, current_time)
+        else:
+            self.detection_counter = max(0, self.detection_counter - 1)
+
+    def _write_high_conf(self, path, frame, top_conf):
+        self.write_image(path, self.evidence_frame(frame))
+        print(f"💾 High Conf Save ({top_conf:.2f}): {path}")
+
+    def _alarm(self, detections, frame, top_conf, current_time):
+        print(f"🚨 DETECTION EVENT (Conf: {top_conf:.2f})")
+        self.last_trigger_time = current_time
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Waiting for the evidence stream can take seconds, keep it off the detection path
+        self.persist(partial(self._write_alarm, detections, frame, top_conf, ts))
+
+    def _write_alarm(self, detections, frame, top_conf, ts):
+        path = os.path.join(self.save_folder, f"calving_alarm_{ts}.jpg")
+        # Drawn on a copy: the frame (or evidence frame) is still used by the other stages
+        annotated = draw_detections(self.evidence_frame(frame).copy(), detections)
+        # The alarm image must not be dropped, and must be on disk before it is sent
+        if not self.write_image(path, annotated, block=True).result():
+            return
+
+        if self.send_calving_notifications and self.send_calving_screenshots:
+            caption = f"🚨 CALVING ({self.camera_name})\nConf: {top_conf:.2f}"
+            self.send_photo(path, caption, False, priority="alarm")
+
+    # --- Manual monitoring ---
+    def handle_command(self, text):
+        """Handles a Telegram message, returns the reply or None when it is not a command."""
+        text = text.lower()
+        if "check" in text or "start" in text:
+            self.manual_expiry = datetime.now() + timedelta(minutes=self.manual_duration_minutes)
+            print(f"📸 Manual monitoring started via Telegram.")
+            return f"✅ Started manual mode for {self.manual_duration_minutes} min."
+        if "stop" in text:
+            self.manual_expiry = None
+            print("🛑 Manual monitoring stopped by user.")
+            return "Manual process stopped"
+        return None
+
+    def next_manual_due(self):
+        """Time of the next manual save, or None when manual monitoring is off."""
+        return self.last_manual_save + MANUAL_SAVE_INTERVAL if self.manual_expiry else None
+
+    def manual_check(self, frame, current_time):
+        if not self.manual_expiry:
+            return
+        if datetime.now() >= self.manual_expiry:
+            self.manual_expiry = None
+            print("⏹️ Manual monitoring expired.")
+            return
+
+        if current_time - self.last_manual_save >= MANUAL_SAVE_INTERVAL:
+            ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+            path = os.path.join(self.manual_save_folder, f"manual_{ts}.jpg")
+            self.last_manual_save = current_time
+            send = current_time - self.last_manual_send >= self.manual_interval
+            if send:
+                self.last_manual_send = current_time
+            self.persist(partial(self._write_manual, path, frame, send))
+
+    def _write_manual(self, path, frame, send):
+        written = self.write_image(path, self.evidence_frame(frame), block=send)
+        print(f"📸 Manual save: {path}")
+        if send and written.result():
+            self.send_photo(path, f"🕒 Check: {self.camera_name}", True, priority="manual")
+            print(f"📤 Photo sent to Telegram")
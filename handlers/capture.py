@@ -0,0 +1,438 @@
+"""
+Threaded camera capture for the handlers.
+
+The capture thread drains the RTSP stream continuously and keeps only the
+newest frames, so a slow model.predict or cv2.imwrite never backs up the
+decoder buffer.
+
+Capture backends (per camera "capture_backend"):
+- "opencv": cv2.VideoCapture, frames at full camera resolution.
+- "ffmpeg": an ffmpeg subprocess that decodes and scales the stream to the
+  model input size and writes rawvideo into a pipe. Screenshots then come from
+  an EvidenceStream on the same camera, which is not scaled.
+
+Capture modes:
+- "decode_all": every frame is fully read, the newest one wins.
+- "grab": every frame is grabbed to keep the stream drained, but only frames
+  somebody asked for are retrieved (colour converted and copied out).
+- "keyframes": ffmpeg only decodes I-frames (-skip_frame nokey). Falls back to
+  "grab" when the camera's keyframe interval is longer than allowed.
+
+EvidenceStream is a second, on-demand stream used only for screenshots, e.g. the
+high resolution main stream while detection runs on the cheap sub-stream.
+"""
+
+import sys
+import time
+import shutil
+import threading
+import subprocess
+from collections import deque
+
+import cv2
+import numpy as np
+
+RECONNECT_DELAY = 5  # Seconds to wait before reopening a lost stream
+CAPTURE_MODES = ["grab", "decode_all", "keyframes"]
+KEYFRAME_INTERVAL_SAMPLES = 5  # Keyframe intervals measured before deciding on a fallback
+KEYFRAME_INTERVAL_MARGIN = 1.25 # Allowed jitter on top of the maximum keyframe interval
+EVIDENCE_RETRY_DELAY = 30      # Seconds before retrying an evidence stream that failed to open
+CAPTURE_BACKENDS = ["opencv", "ffmpeg"]
+
+
+class FFmpegCapture:
+    """
+    Capture backend that lets an ffmpeg subprocess decode the stream and scale it
+    to `frame_size` (longest side) before the frame ever reaches Python.
+
+    Implements the part of the cv2.VideoCapture interface the handlers use
+    (isOpened/read/grab/retrieve/release). Frames are read from the pipe straight
+    into the memory of a NumPy array, so no extra copy is made.
+
+    With `keyframes_only` the decoder skips every non-key frame.
+    """
+
+    def __init__(self, source, frame_size=None, keyframes_only=False):
+        self.source = source
+        self.proc = None
+        self.shape = None
+        self._scratch = None
+
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            print("ERROR: ffmpeg not found on PATH, cannot use the ffmpeg capture backend.", flush=True)
+            return
+
+        size = self._probe_size(source)
+        if size is None:
+            return
+        width, height = self._scaled_size(size, frame_size)
+        self.shape = (height, width, 3)
+
+        cmd = [ffmpeg, "-hide_banner", "-loglevel", "error"]
+        if str(source).startswith("rtsp://"):
+            cmd += ["-rtsp_transport", "tcp"]
+        if keyframes_only:
+            cmd += ["-skip_frame", "nokey"]
+        cmd += ["-i", str(source), "-an", "-vf", f"scale={width}:{height}"]
+        if keyframes_only:
+            # Pass the sparse keyframes through as-is instead of duplicating them to the stream rate
+            cmd += ["-vsync", "0"]
+        cmd += ["-pix_fmt", "bgr24", "-f", "rawvideo", "-"]
+
+        creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                         bufsize=0, creationflags=creation_flags)
+        except OSError as e:
+            print(f"ERROR: Could not start ffmpeg: {e}", flush=True)
+            self.proc = None
+
+    @staticmethod
+    def _probe_size(source):
+        """Returns the (width, height) of the stream, using ffprobe when available."""
+        ffprobe = shutil.which("ffprobe")
+        if ffprobe:
+            cmd = [ffprobe, "-v", "error", "-select_streams", "v:0",
+                   "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x"]
+            if str(source).startswith("rtsp://"):
+                cmd += ["-rtsp_transport", "tcp"]
+            try:
+                out = subprocess.run(cmd + [str(source)], capture_output=True, text=True, timeout=20).stdout
+                width, height = out.strip().splitlines()[0].split("x")[:2]
+                return int(width), int(height)
+            except (subprocess.SubprocessError, OSError, ValueError, IndexError):
+                pass
+
+        cap = cv2.VideoCapture(source)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if width <= 0 or height <= 0:
+            print("ERROR: Could not determine stream resolution for ffmpeg backend.", flush=True)
+            return None
+        return width, height
+
+    @staticmethod
+    def _scaled_size(size, frame_size):
+        """Scales (width, height) so the longest side equals frame_size (never upscales, even dimensions)."""
+        width, height = size
+        if frame_size and max(width, height) > frame_size:
+            factor = frame_size / max(width, height)
+            width, height = width * factor, height * factor
+        return max(2, int(round(width / 2)) * 2), max(2, int(round(height / 2)) * 2)
+
+    def isOpened(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _read_into(self, frame):
+        view = memoryview(frame).cast("B")
+        filled = 0
+        while filled < len(view):
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def grab(self):
+        if not self.isOpened():
+            return False
+        if self._scratch is None:
+            self._scratch = np.empty(self.shape, dtype=np.uint8)
+        return self._read_into(self._scratch)
+
+    def retrieve(self):
+        # Hand over the grabbed buffer itself, the next grab() gets a fresh one
+        frame, self._scratch = self._scratch, None
+        return frame is not None, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try: self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired: self.proc.kill()
+        self.proc.stdout.close()
+        self.proc = None
+
+
+def open_capture(source, backend="opencv", frame_size=None):
+    """Opens `source` with the configured capture backend."""
+    if backend == "ffmpeg":
+        return FFmpegCapture(source, frame_size=frame_size)
+    return cv2.VideoCapture(source)
+
+
+class FrameGrabber:
+    """
+    Latest-frame-wins capture thread.
+
+    Decoded frames are kept with their capture timestamp in a small ring buffer.
+    read() always hands out the newest frame; frames that were decoded but overwritten
+    before anyone read them are counted as dropped (frames grab mode never retrieves
+    are not), frames older than `max_frame_age` at hand-off are counted as stale.
+    """
+
+    def __init__(self, source, mode="decode_all", backend="opencv", frame_size=None, buffer_size=2,
+                 max_frame_age=1.0, max_keyframe_interval=None):
+        self.source = source
+        self.mode = mode
+        self.backend = backend
+        self.frame_size = frame_size
+        self.max_frame_age = max_frame_age
+        self.max_keyframe_interval = max_keyframe_interval
+        self.keyframe_times = []
+        self.buffer = deque(maxlen=buffer_size)
+        self.frame_ready = threading.Condition()
+        self.frame_id = 0        # Id of the newest captured frame
+        self.last_read_id = 0    # Id of the last frame handed out by read()
+        self.requested_id = None # Grab mode: first frame id a waiting reader wants
+        self.retrieve_time = 0.0 # Grab mode: running average cost of one retrieve()
+        self.stats = {'captured': 0, 'dropped': 0, 'stale': 0, 'reconnects': 0, 'decode_skipped': 0}
+        self.running = False
+        self.cap = None
+        self.thread = None
+
+    @property
+    def scaled(self):
+        """True when ffmpeg scales the frames down, screenshots then need a full resolution stream."""
+        return self.backend == "ffmpeg" and self.frame_size is not None
+
+    @property
+    def decode_on_demand(self):
+        return self.mode == "grab"
+
+    def _open(self, keyframes_only=None):
+        if keyframes_only is None:
+            keyframes_only = (self.mode == "keyframes")
+        if keyframes_only:
+            # Only ffmpeg can skip non-key frames; keep the native resolution unless ffmpeg scaling was chosen
+            frame_size = self.frame_size if self.backend == "ffmpeg" else None
+            return FFmpegCapture(self.source, frame_size=frame_size, keyframes_only=True)
+        return open_capture(self.source, self.backend, self.frame_size)
+
+    def start(self):
+        """Opens the stream and starts the capture thread. Returns False if the stream cannot be opened."""
+        self.cap = self._open()
+        if not self.cap.isOpened() and self.mode == "keyframes":
+            print("⚠️ Keyframe decoding unavailable, falling back to normal decoding.", flush=True)
+            self.cap.release()
+            self.mode = "grab"
+            self.cap = self._open()
+        if not self.cap.isOpened():
+            self.cap.release()
+            return False
+
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        if self.cap is not None:
+            self.cap.release()
+
+    def _reconnect(self):
+        print(f"ERROR: Cannot read frame from camera, reconnecting in {RECONNECT_DELAY}s...", flush=True)
+        self.cap.release()
+        time.sleep(RECONNECT_DELAY)
+        self.cap = self._open()
+        self.stats['reconnects'] += 1
+
+    def _capture_loop(self):
+        while self.running:
+            if self.decode_on_demand:
+                self._grab_next()
+                continue
+
+            ret, frame = self.cap.read()
+            if not ret:
+                self._reconnect()
+                continue
+            with self.frame_ready:
+                self.frame_id += 1
+                self._publish(frame)
+            if self.mode == "keyframes":
+                self._check_keyframe_interval()
+
+    def _check_keyframe_interval(self):
+        """Falls back to normal decoding if keyframes arrive less often than the scans need them."""
+        if not self.max_keyframe_interval or len(self.keyframe_times) > KEYFRAME_INTERVAL_SAMPLES:
+            return
+        self.keyframe_times.append(time.time())
+        if len(self.keyframe_times) <= KEYFRAME_INTERVAL_SAMPLES:
+            return
+
+        # Skip the first interval, the stream start often delivers a burst of buffered frames
+        intervals = sorted(b - a for a, b in zip(self.keyframe_times[1:], self.keyframe_times[2:]))
+        gop = intervals[len(intervals) // 2]
+        if gop <= self.max_keyframe_interval * KEYFRAME_INTERVAL_MARGIN:
+            print(f"Keyframe decoding active (keyframe every {gop:.1f}s)", flush=True)
+            return
+
+        print(f"⚠️ Keyframe interval {gop:.1f}s is longer than {self.max_keyframe_interval}s, "
+              f"falling back to normal decoding.", flush=True)
+        self.cap.release()
+        self.mode = "grab"
+        self.cap = self._open()
+
+    def _grab_next(self):
+        """Grab mode: keeps the stream drained and only retrieves frames a reader is waiting for."""
+        if not self.cap.grab():
+            self._reconnect()
+            return
+
+        with self.frame_ready:
+            self.frame_id += 1
+            wanted = self.requested_id is not None and self.frame_id >= self.requested_id
+            if not wanted:
+                self.stats['decode_skipped'] += 1
+                return
+
+        start = time.perf_counter()
+        ret, frame = self.cap.retrieve()
+        elapsed = time.perf_counter() - start
+        self.retrieve_time = elapsed if not self.retrieve_time else 0.9 * self.retrieve_time + 0.1 * elapsed
+        if not ret:
+            return
+
+        with self.frame_ready:
+            self.requested_id = None
+            self._publish(frame)
+
+    def _publish(self, frame):
+        # Caller holds self.frame_ready
+        if len(self.buffer) == self.buffer.maxlen and self.buffer[0][0] > self.last_read_id:
+            self.stats['dropped'] += 1 # Pushed out before anyone read it
+        self.buffer.append((self.frame_id, time.time(), frame))
+        self.stats['captured'] += 1
+        self.frame_ready.notify_all()
+
+    def read(self, timeout=5.0, min_frame_id=None):
+        """
+        Returns (ret, frame, capture_time) for the newest frame that has not been read yet.
+        With `min_frame_id` the frame id must be at least that value, which lets callers
+        skip frames (in grab mode the skipped frames are never retrieved).
+        Waits up to `timeout` seconds for a matching frame to arrive.
+        """
+        min_id = max(self.last_read_id + 1, min_frame_id or 0)
+        with self.frame_ready:
+            if self.decode_on_demand:
+                self.requested_id = min_id
+            available = lambda: bool(self.buffer) and self.buffer[-1][0] >= min_id
+            self.frame_ready.wait_for(lambda: available() or not self.running, timeout)
+            if not self.running or not available():
+                return False, None, None
+
+            frame_id, capture_time, frame = self.buffer[-1]
+            # Decoded frames passed over for this one; frames below min_id were skipped on purpose
+            self.stats['dropped'] += sum(min_id <= entry[0] < frame_id for entry in self.buffer)
+            self.last_read_id = frame_id
+
+        if time.time() - capture_time > self.max_frame_age:
+            self.stats['stale'] += 1
+        return True, frame, capture_time
+
+    def decode_cpu_saved(self):
+        """Estimated CPU seconds saved by not retrieving skipped frames (grab mode)."""
+        return self.stats['decode_skipped'] * self.retrieve_time
+
+    def stats_line(self):
+        line = f"Dropped: {self.stats['dropped']} | Stale: {self.stats['stale']}"
+        if self.decode_on_demand:
+            line += f" | Decode skipped: {self.stats['decode_skipped']} (~{self.decode_cpu_saved():.1f}s CPU saved)"
+        return line
+
+
+def open_detection_stream(source, mode, backend, imgsz, cascade=False, **options):
+    """Starts the FrameGrabber of a handler's detection stream, exits the worker when it cannot be opened."""
+    print("Opening camera stream...")
+    # Cascade crops come from the full resolution frame, so ffmpeg must not scale it down
+    grabber = FrameGrabber(source, mode=mode, backend=backend, frame_size=None if cascade else imgsz, **options)
+    if not grabber.start():
+        print("ERROR: Cannot open camera stream")
+        sys.exit(1)
+    print("Camera stream successfully opened")
+    return grabber
+
+
+class EvidenceStream:
+    """
+    Secondary stream that is only opened while screenshots are needed and closed
+    again after `idle_timeout` seconds without use.
+
+    Frames are decoded on demand (grab mode) at the native resolution of the stream.
+    """
+
+    def __init__(self, source, backend="opencv", idle_timeout=60):
+        self.source = source
+        self.backend = backend
+        self.idle_timeout = idle_timeout
+        self.grabber = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.last_used = 0.0
+        self.failed_at = 0.0
+
+    def open(self):
+        """Starts opening the stream in the background, so it is warm by the time a frame is needed."""
+        self.last_used = time.time()
+        with self.lock:
+            if self.grabber is not None or time.time() - self.failed_at < EVIDENCE_RETRY_DELAY:
+                return
+            self.grabber = FrameGrabber(self.source, mode="grab", backend=self.backend)
+            self.ready.clear()
+        threading.Thread(target=self._start, args=(self.grabber,), daemon=True).start()
+
+    def _start(self, grabber):
+        if not grabber.start():
+            print("⚠️ Cannot open evidence stream, screenshots use the detection stream.", flush=True)
+            with self.lock:
+                if self.grabber is grabber:
+                    self.grabber = None
+                self.failed_at = time.time()
+            return
+
+        with self.lock:
+            closed_meanwhile = self.grabber is not grabber
+        if closed_meanwhile:
+            grabber.stop()
+            return
+        print("Evidence stream opened", flush=True)
+        self.ready.set()
+
+    def frame(self, timeout=0.5):
+        """Returns a fresh evidence frame, or None if the stream is not available within `timeout` seconds."""
+        self.open()
+        deadline = time.time() + timeout
+        if not self.ready.wait(timeout):
+            return None
+        grabber = self.grabber
+        if grabber is None:
+            return None
+        ret, frame, _ = grabber.read(timeout=max(0.05, deadline - time.time()))
+        return frame if ret else None
+
+    def close_if_idle(self):
+        if self.grabber is not None and time.time() - self.last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            grabber, self.grabber = self.grabber, None
+            self.ready.clear()
+        if grabber is not None and grabber.running:
+            grabber.stop()
+            print("Evidence stream closed", flush=True)
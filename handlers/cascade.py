@@ -0,0 +1,89 @@
+"""
+Two-stage resolution cascade.
+
+A cheap low resolution pass over the whole frame only looks for candidates (low
+confidence). Each candidate region is then cut out of the full resolution frame and
+checked again by the model at (close to) native resolution. Only the boxes of this
+second pass are returned, so the save/notify thresholds work on the confidence of the
+high resolution view. A cow at the far end of the pen stays large enough to be
+recognised, while a quiet frame costs only the small first pass.
+
+CascadeDetector.predict() takes the same arguments as YOLO.predict(), so a handler
+can use either.
+"""
+
+import math
+
+import numpy as np
+from ultralytics.engine.results import Results
+
+CROP_STRIDE = 32 # Model input sizes are multiples of the stride
+MIN_CROP_SIZE = 96 # Pixels, small candidates still get some context
+
+
+def _to_numpy(data):
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+
+class CascadeDetector:
+    def __init__(self, model, coarse_imgsz=320, candidate_conf=0.1, crop_margin=0.5, max_crops=4):
+        """
+        model: YOLO or InferenceClient.
+        crop_margin: context added around a candidate, as a fraction of its size on each side.
+        max_crops: the most confident candidate regions that get a second pass.
+        """
+        self.model = model
+        self.coarse_imgsz = coarse_imgsz
+        self.candidate_conf = candidate_conf
+        self.crop_margin = crop_margin
+        self.max_crops = max_crops
+        self.stats = {'frames': 0, 'crops': 0, 'crop_pixels': 0, 'frame_pixels': 0}
+
+    def _regions(self, boxes, frame_shape):
+        """Candidate boxes grown by the margin, overlapping ones merged, most confident first."""
+        h, w = frame_shape[:2]
+        regions = []
+        for x0, y0, x1, y1, conf in sorted(boxes, key=lambda b: -b[4]):
+            mx = max((x1 - x0) * self.crop_margin, (MIN_CROP_SIZE - (x1 - x0)) / 2, 0)
+            my = max((y1 - y0) * self.crop_margin, (MIN_CROP_SIZE - (y1 - y0)) / 2, 0)
+            region = [max(0, x0 - mx), max(0, y0 - my), min(w, x1 + mx), min(h, y1 + my)]
+            for other in regions:
+                if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                    other[:] = [min(other[0], region[0]), min(other[1], region[1]),
+                                max(other[2], region[2]), max(other[3], region[3])]
+                    break
+            else:
+                regions.append(region)
+        return [[int(v) for v in r] for r in regions[:self.max_crops]]
+
+    def predict(self, source, imgsz=640, conf=0.25, classes=None, verbose=False):
+        """
+        First pass at `coarse_imgsz`, second pass on full resolution crops at up to `imgsz`
+        with the normal `conf`. Returns [Results] for `source` with the second pass boxes.
+        """
+        coarse = self.model.predict(source=source, imgsz=self.coarse_imgsz, conf=min(self.candidate_conf, conf),
+                                    classes=classes, verbose=verbose)[0]
+        candidates = _to_numpy(coarse.boxes.data)[:, :5]
+        self.stats['frames'] += 1
+        self.stats['frame_pixels'] += source.shape[0] * source.shape[1]
+
+        detections = []
+        for x0, y0, x1, y1 in self._regions(candidates, source.shape):
+            crop = source[y0:y1, x0:x1]
+            # Native resolution when the region is small, never more than the normal input size
+            crop_imgsz = min(imgsz, math.ceil(max(crop.shape[:2]) / CROP_STRIDE) * CROP_STRIDE)
+            result = self.model.predict(source=crop, imgsz=crop_imgsz, conf=conf, classes=classes, verbose=verbose)[0]
+            data = _to_numpy(result.boxes.data).copy()
+            data[:, [0, 2]] += x0
+            data[:, [1, 3]] += y0
+            detections.append(data)
+            self.stats['crops'] += 1
+            self.stats['crop_pixels'] += crop.shape[0] * crop.shape[1]
+
+        boxes = np.concatenate(detections) if detections else np.zeros((0, 6), dtype=np.float32)
+        return [Results(orig_img=source, path=coarse.path, names=coarse.names, boxes=boxes)]
+
+    def stats_line(self):
+        frames = self.stats['frames'] or 1
+        share = self.stats['crop_pixels'] / self.stats['frame_pixels'] if self.stats['frame_pixels'] else 0.0
+        return f"Cascade: {self.stats['crops'] / frames:.2f} crops/frame ({share:.1%} of the pixels)"
@@ -0,0 +1,309 @@
+"""
+Combined CowCatcher + CalvingCatcher handler.
+
+One camera, one capture thread and one model pass per analyzed frame for both
+detectors: class 0 (mounting) goes to MountingLogic, class 1 (calving) to CalvingLogic.
+The model must know both classes. Mounting uses the 'cowcatcher_settings', calving the
+'calvingcatcher_settings' of config.json; the thresholds are set per camera.
+"""
+
+import sys
+import os
+import json
+import time
+import cv2
+from datetime import datetime
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.capture import EvidenceStream, open_detection_stream
+from handlers.detections import Detections, draw_detections
+from handlers.motion import MotionGate
+from handlers.roi import RegionOfInterest
+from handlers.model_loader import check_and_download_model, load_model
+from handlers.mounting_logic import MountingLogic
+from handlers.calving_logic import CalvingLogic
+from handlers.pipeline import Pipeline
+from handlers.sampler import AdaptiveSampler
+from handlers.cascade import CascadeDetector
+from handlers.gate import load_gate
+from handlers.image_writer import ImageWriter
+from handlers.notifier import Notifier, telegram_settings
+
+# --- PATH SETUP ---
+BASE_DIR = os.getcwd()
+CONFIG_PATH = os.path.join(BASE_DIR, "settings", "config.json")
+WEIGHTS_DIR = os.path.join(BASE_DIR, "weights")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+MOUNTING_CLASS = 0
+CALVING_CLASS = 1
+MOUNTING_MIN_CONF = 0.2 # Same model confidences as the separate handlers
+CALVING_MIN_CONF = 0.4
+
+# --- LOAD CONFIG ---
+try:
+    with open(CONFIG_PATH, 'r') as f:
+        config = json.load(f)
+except FileNotFoundError:
+    print(f"ERROR: {CONFIG_PATH} not found.")
+    sys.exit(1)
+except json.JSONDecodeError:
+    print(f"ERROR: {CONFIG_PATH} is invalid JSON.")
+    sys.exit(1)
+
+# --- ARGUMENT PARSING ---
+if len(sys.argv) < 2:
+    print("ERROR: CAMERA_ID is required as a command-line argument.")
+    sys.exit(1)
+
+CAMERA_ID = sys.argv[1]
+camera = next((c for c in config["cameras"] if c["id"] == CAMERA_ID), None)
+
+if camera is None:
+    print(f"ERROR: Camera ID '{CAMERA_ID}' not found in config.")
+    sys.exit(1)
+
+# --- READ SETTINGS ---
+cc_settings = config.get("cowcatcher_settings", {})
+calving_settings = config.get("calvingcatcher_settings", {})
+
+CAMERA_NAME = camera.get("name", "Unknown Camera")
+RTSP_URL = camera.get("rtsp_url")
+# Optional dual stream: cheap sub-stream for detection, main stream only for screenshots
+DETECTION_URL = camera.get("detection_rtsp_url") or RTSP_URL
+EVIDENCE_URL = camera.get("evidence_rtsp_url") or RTSP_URL
+CAPTURE_MODE = camera.get("capture_mode", "grab")
+CAPTURE_BACKEND = camera.get("capture_backend", "opencv")
+IMGSZ = camera.get("imgsz", 640)
+# Cascade: low resolution search over the frame, full resolution check of the candidates
+CASCADE = camera.get("cascade", False)
+CASCADE_IMGSZ = camera.get("cascade_imgsz", 320)
+ROI = RegionOfInterest(camera.get("roi"))
+SHOW_LIVE_FEED = camera.get("show_live_feed", False)
+NOTIFY_THRESHOLD = camera.get("notify_threshold", 0.80)
+CALVING_SAVE_THRESHOLD = camera.get("calving_save_threshold", 0.80)
+CALVING_NOTIFY_THRESHOLD = camera.get("calving_notify_threshold", 0.87)
+CHECK_INTERVAL = camera.get("check_interval", 1)
+# Analyzed frames per second: min while idle, max around detections
+MIN_RATE = camera.get("min_rate", 2.0)
+MAX_RATE = camera.get("max_rate", 10.0)
+
+EVIDENCE_FRAME_TIMEOUT = 0.1 # Max seconds the detection loop waits for an evidence frame while collecting
+EVIDENCE_TIMEOUT = 10 # Max seconds to wait for the evidence stream when a calving alarm fires
+
+# Sampling, model and optimization follow the CowCatcher settings (mounting needs the higher rate)
+PRE_TRIGGER_CONFIDENCE = cc_settings.get("pre_trigger_confidence", 0.5)
+FULL_RATE_HOLD_TIME = cc_settings.get("full_rate_hold_time", 10)
+CPU_BACKOFF_PERCENT = cc_settings.get("cpu_backoff_percent", 90)
+SEND_STATUS_NOTIFICATIONS = cc_settings.get("send_status_notifications", True)
+MOTION_GATE = cc_settings.get("motion_gate", True)
+MOTION_SENSITIVITY = cc_settings.get("motion_sensitivity", 0.5)
+MOTION_KEEPALIVE = cc_settings.get("motion_keepalive", 30)
+
+camera_model_file = camera.get("model_path")
+master_model_url = cc_settings.get("master_model_url")
+
+if not camera_model_file:
+    camera_model_file = master_model_url.split('/')[-1]
+
+TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS = telegram_settings(config, camera)
+
+# --- INITIALIZATION ---
+
+print("Starting combined CowCatcher/CalvingCatcher...")
+
+# 1. Ensure model exists (download if necessary)
+final_model_path = check_and_download_model(camera_model_file, master_model_url, WEIGHTS_DIR)
+
+# 2. Load Model (or use the shared inference server when the application runs one)
+model = load_model(final_model_path, IMGSZ, cc_settings)
+# Cascade uses the same model for the search and for the check of the candidates
+detector = CascadeDetector(model, CASCADE_IMGSZ, cc_settings.get("cascade_candidate_confidence", 0.1),
+                           cc_settings.get("cascade_crop_margin", 0.5), cc_settings.get("cascade_max_crops", 4)) if CASCADE else model
+# Optional tiny gate model (CowCatcher settings, must know both classes): only the frames it flags go to the full model
+gate = load_gate(cc_settings, WEIGHTS_DIR, [MOUNTING_CLASS, CALVING_CLASS],
+                 positive_conf=min(cc_settings.get("save_threshold", 0.83), CALVING_SAVE_THRESHOLD))
+
+print(f"Connecting to camera: {CAMERA_NAME}")
+
+# 3. Setup folders (the same ones the separate handlers use)
+mounting_folder = os.path.join(DATA_DIR, f"mounting_detections_{CAMERA_ID}")
+calving_folder = os.path.join(DATA_DIR, CAMERA_NAME.replace(" ", "_"))
+manual_save_folder = os.path.join(DATA_DIR, "manual", CAMERA_ID)
+for folder in (mounting_folder, calving_folder, manual_save_folder):
+    os.makedirs(folder, exist_ok=True)
+
+# --- TELEGRAM ---
+notifier = Notifier(CAMERA_ID, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS, DATA_DIR, camera_name=CAMERA_NAME)
+
+# Open the camera stream (captured on its own thread, newest frame wins)
+grabber = open_detection_stream(DETECTION_URL, CAPTURE_MODE, CAPTURE_BACKEND, IMGSZ, cascade=CASCADE)
+
+# Evidence stream (shared by both detectors): only opened for screenshots, closed again when idle.
+# Also used on the detection stream itself when ffmpeg scales it, so screenshots keep the full resolution
+evidence = EvidenceStream(EVIDENCE_URL, backend=CAPTURE_BACKEND) if EVIDENCE_URL != DETECTION_URL or grabber.scaled else None
+
+def evidence_frame(frame):
+    """Calving screenshots come from the evidence stream when there is one."""
+    if evidence is None:
+        return frame
+    ev_frame = evidence.frame(timeout=EVIDENCE_TIMEOUT)
+    return ev_frame if ev_frame is not None else frame
+
+# Disk writes and Telegram sends of both detectors are collected here and run on the persist stage,
+# the screenshots themselves are encoded and written by one shared image writer pool
+persist_jobs = []
+writer = ImageWriter()
+mounting = MountingLogic(cc_settings, NOTIFY_THRESHOLD, mounting_folder, notifier.send_photo,
+                         evidence=evidence, evidence_timeout=EVIDENCE_FRAME_TIMEOUT, persist=persist_jobs.append,
+                         writer=writer, max_rate=MAX_RATE, send_album=notifier.send_album)
+calving = CalvingLogic(CAMERA_NAME, calving_settings, CALVING_SAVE_THRESHOLD, CALVING_NOTIFY_THRESHOLD,
+                       calving_folder, manual_save_folder, send_photo=notifier.send_photo,
+                       evidence_frame=evidence_frame, persist=persist_jobs.append, writer=writer)
+
+# Telegram commands start and stop the manual calving check
+notifier.start(handle_command=calving.handle_command)
+
+motion_gate = MotionGate(MOTION_SENSITIVITY, MOTION_KEEPALIVE) if MOTION_GATE else None
+sampler = AdaptiveSampler(MIN_RATE, MAX_RATE, PRE_TRIGGER_CONFIDENCE, FULL_RATE_HOLD_TIME, CPU_BACKOFF_PERCENT)
+
+frame_count = 0
+last_log_frame = 0
+last_calving_scan = 0
+live_frame = None # Newest annotated frame for the live feed, shown by the main thread
+
+# --- PIPELINE STAGES (each on its own thread) ---
+def capture_stage():
+    # Only ask for a frame when the sampler wants one; in grab mode the ones in between are never decoded.
+    # Reconnecting is handled by the capture thread.
+    wait = sampler.wait_time()
+    if wait > 0:
+        time.sleep(min(wait, 0.5))
+        return None
+    ret, frame, capture_time = grabber.read()
+    if not ret:
+        return None
+    sampler.taken()
+    return {'frame': frame, 'time': capture_time}
+
+def preprocess_stage(item):
+    # Only the region of interest goes to the model (and counts for motion)
+    item['roi'], item['offset'] = ROI.crop(item['frame'])
+
+    # Motion gate: always run while a mounting event is collected, a calving detection builds up
+    # or the manual check is on (it needs the frames). Skipped frames still go on to the event
+    # stage without detections, so the calving counter decays like in the calving handler
+    item['run_model'] = True
+    if motion_gate:
+        if mounting.collecting or calving.detection_counter > 0 or calving.manual_expiry:
+            motion_gate.force(item['roi'], item['time'])
+        else:
+            item['run_model'] = motion_gate.check(item['roi'], item['time'])
+    return item
+
+def gate_stage(item):
+    # Frames the gate model does not flag skip the full model (except the periodic check and during events)
+    if item['run_model']:
+        event_running = mounting.collecting or calving.detection_counter > 0 or calving.manual_expiry
+        item['run_model'], item['gate_sample'] = gate.check(item['roi'], item['time'], force=bool(event_running))
+    return item
+
+def inference_stage(item):
+    item['result'] = None
+    if not item['run_model']:
+        return item
+    # One pass for both classes
+    frame = item['frame']
+    results = detector.predict(source=item['roi'], classes=[MOUNTING_CLASS, CALVING_CLASS], conf=MOUNTING_MIN_CONF,
+                            imgsz=ROI.imgsz(IMGSZ, frame.shape), verbose=False)
+    # Only a compact record in full-frame coordinates is kept (screenshots are annotated on the whole image),
+    # the Results object with its image and tensors is dropped here
+    item['result'] = Detections.from_result(results[0], frame.shape, item['offset'])
+    if item.get('gate_sample') is not None:
+        # Periodic pass: compare the gate verdict with the full model (recall in the log)
+        gate.record(item['gate_sample'], item['result'].max_conf())
+    return item
+
+def event_stage(item):
+    global last_calving_scan
+    frame, result, current_time = item['frame'], item['result'], time.time()
+    if result is not None:
+        mounting.update(result.select(MOUNTING_CLASS), frame, item['time'])
+
+    # Calving is slow: its detection counter keeps the CalvingCatcher check interval.
+    # A skipped frame counts as a scan without detections
+    if current_time - last_calving_scan >= CHECK_INTERVAL:
+        last_calving_scan = current_time
+        calving.scan(result.select(CALVING_CLASS, CALVING_MIN_CONF) if result is not None else None, frame, current_time)
+    calving.manual_check(frame, current_time)
+
+    # Full rate as soon as either detector sees something, while collecting and while a calving builds up
+    if result is not None:
+        sampler.report(max(mounting.last_conf, calving.last_conf),
+                       active=mounting.collecting or calving.detection_counter > 0)
+
+    item['jobs'] = persist_jobs[:]
+    persist_jobs.clear()
+    return item if item['jobs'] or SHOW_LIVE_FEED else None
+
+def persist_stage(item):
+    global live_frame
+    for job in item['jobs']:
+        job()
+    if SHOW_LIVE_FEED:
+        # The frame is still referenced by the mounting history, draw on a copy
+        live_frame = draw_detections(item['frame'].copy(), item['result']) if item['result'] is not None else item['frame']
+
+pipeline = Pipeline(capture_stage, [
+    ("preprocess", preprocess_stage),
+    *([("gate", gate_stage)] if gate else []),
+    ("inference", inference_stage),
+    ("events", event_stage),
+    ("persist", persist_stage),
+])
+
+print(f"Processing started, {MIN_RATE}-{MAX_RATE} frames per second will be analyzed (calving at most every {CHECK_INTERVAL}s)")
+
+if SEND_STATUS_NOTIFICATIONS:
+    notifier.send_message(f"📋 Combined detection script started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+try:
+    pipeline.start()
+    # The main thread only logs and shows the live feed; check() re-raises errors of the stages
+    while pipeline.check():
+        frame_count = grabber.last_read_id
+
+        if frame_count - last_log_frame >= 100:
+            last_log_frame = frame_count
+            motion_info = f" | {motion_gate.stats_line()}" if motion_gate else ""
+            if CASCADE: motion_info += f" | {detector.stats_line()}"
+            if gate: motion_info += f" | {gate.stats_line()}"
+            print(f"Frames processed: {frame_count} | Calving detection: {calving.detection_counter}/{calving.min_detections} | "
+                  f"{grabber.stats_line()}{motion_info} | {sampler.stats_line()} | {pipeline.stats_line()} | {writer.stats_line()} | {notifier.stats_line()}", flush=True)
+
+        if SHOW_LIVE_FEED:
+            if live_frame is not None:
+                cv2.imshow(f"Cam {CAMERA_ID}", live_frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        else:
+            time.sleep(0.1)
+
+except KeyboardInterrupt:
+    print("Script stopped by user")
+    stop_reason = "Manual Stop (Ctrl+C)"
+except Exception as e:
+    print(f"Critical Error: {str(e)}")
+    stop_reason = f"Error: {str(e)}"
+
+finally:
+    print("Cleaning up...")
+    pipeline.stop()
+    writer.close()
+    grabber.stop()
+    if evidence: evidence.close()
+    if SHOW_LIVE_FEED: cv2.destroyAllWindows()
+
+    stop_message = f"⚠️ Script Stopped: {stop_reason}" if SEND_STATUS_NOTIFICATIONS and 'stop_reason' in locals() else None
+    notifier.close(final_message=stop_message)
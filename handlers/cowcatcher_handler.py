@@ -2,17 +2,28 @@
 CowCatcher Script with Threading Optimization, Multi-Chat Support & Auto-Model Download
 """
 
-from ultralytics import YOLO
 import sys
 import cv2
 import os
 import time
-import requests
 import json
 from datetime import datetime
-from collections import deque
-from threading import Thread
-from queue import Queue
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.capture import EvidenceStream, open_detection_stream
+from handlers.detections import Detections, draw_detections
+from handlers.motion import MotionGate
+from handlers.roi import RegionOfInterest
+from handlers.model_loader import check_and_download_model, load_model
+from handlers.mounting_logic import MountingLogic
+from handlers.pipeline import Pipeline
+from handlers.sampler import AdaptiveSampler
+from handlers.cascade import CascadeDetector
+from handlers.gate import load_gate
+from handlers.tracker import OpticalFlowTracker
+from handlers.image_writer import ImageWriter
+from handlers.notifier import Notifier, telegram_settings
 
 # --- PATH SETUP ---
 # Ensure we always work from the root, regardless of where the script is called
@@ -21,42 +32,6 @@ CONFIG_PATH = os.path.join(BASE_DIR, "settings", "config.json")
 WEIGHTS_DIR = os.path.join(BASE_DIR, "weights")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
-# --- MODEL DOWNLOADER ---
-def check_and_download_model(model_filename, download_url):
-    """
-    Checks if the model exists in the 'weights' directory.
-    If not, downloads the file from the provided URL.
-    """
-    if not os.path.exists(WEIGHTS_DIR):
-        os.makedirs(WEIGHTS_DIR)
-        print(f"Created weights directory: {WEIGHTS_DIR}")
-
-    model_local_path = os.path.join(WEIGHTS_DIR, model_filename)
-
-    if not os.path.exists(model_local_path):
-        print(f"⚠️ Model '{model_filename}' not found locally.")
-        print(f"⬇️ Starting to download from: {download_url}")
-        print("⏳ Downloading model can take up to multiple minutes...")
-        
-        sys.stdout.flush()
-        time.sleep(0.5)
-        
-        try:
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            
-            with open(model_local_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print(f"✅ Model successfully downloaded to: {model_local_path}")
-        except Exception as e:
-            print(f"❌ ERROR downloading model: {e}")
-            sys.exit(1)
-    else:
-        print(f"✅ Model found locally: {model_local_path}")
-
-    return model_local_path
-
 # --- LOAD CONFIG ---
 try:
     with open(CONFIG_PATH, 'r') as f:
@@ -87,8 +62,21 @@ cc_settings = config.get("cowcatcher_settings", {})
 # Individual camera settings
 CAMERA_NAME = camera.get("name", "Unknown Camera")
 RTSP_URL = camera.get("rtsp_url")
+# Optional dual stream: cheap sub-stream for detection, main stream only for screenshots
+DETECTION_URL = camera.get("detection_rtsp_url") or RTSP_URL
+EVIDENCE_URL = camera.get("evidence_rtsp_url") or RTSP_URL
+CAPTURE_MODE = camera.get("capture_mode", "grab")
+CAPTURE_BACKEND = camera.get("capture_backend", "opencv")
+IMGSZ = camera.get("imgsz", 640)
+# Cascade: low resolution search over the frame, full resolution check of the candidates
+CASCADE = camera.get("cascade", False)
+CASCADE_IMGSZ = camera.get("cascade_imgsz", 320)
+ROI = RegionOfInterest(camera.get("roi"))
 SHOW_LIVE_FEED = camera.get("show_live_feed", False)
 NOTIFY_THRESHOLD = camera.get("notify_threshold", 0.80)
+# Analyzed frames per second: min while idle, max around detections
+MIN_RATE = camera.get("min_rate", 2.0)
+MAX_RATE = camera.get("max_rate", 10.0)
 # PEAK_DETECTION_THRESHOLD removed as requested
 
 # Determine which model to use
@@ -102,59 +90,37 @@ if not camera_model_file:
     camera_model_file = master_model_url.split('/')[-1]
 
 # Global settings mapping
-SOUND_EVERY_N_NOTIFICATIONS = cc_settings.get("sound_every_n_notifications", 5)
-SAVE_THRESHOLD = cc_settings.get("save_threshold", 0.83)
-process_every_n_frames = cc_settings.get("process_every_n_frames", 2)
-MIN_HIGH_CONFIDENCE_DETECTIONS = cc_settings.get("min_high_confidence_detections", 3)
-MAX_SCREENSHOTS = cc_settings.get("max_screenshots", 2)
-SEND_ANNOTATED_IMAGES = cc_settings.get("send_annotated_images", True)
-COLLECTION_TIME = cc_settings.get("collection_time", 50)
-MIN_COLLECTION_TIME = cc_settings.get("min_collection_time", 4)
-INACTIVITY_STOP_TIME = cc_settings.get("inactivity_stop_time", 6)
-cooldown_period = cc_settings.get("cooldown_period", 40)
+# (the event thresholds and timings are read by MountingLogic)
+PRE_TRIGGER_CONFIDENCE = cc_settings.get("pre_trigger_confidence", 0.5)
+FULL_RATE_HOLD_TIME = cc_settings.get("full_rate_hold_time", 10)
+CPU_BACKOFF_PERCENT = cc_settings.get("cpu_backoff_percent", 90)
+# Detect-then-track during events: detector every N frames, optical flow in between
+TRACK_BETWEEN_DETECTIONS = cc_settings.get("track_between_detections", False)
+DETECT_EVERY_N_FRAMES = cc_settings.get("detect_every_n_frames", 3)
+TRACK_CONFIDENCE_DECAY = cc_settings.get("track_confidence_decay", 0.95)
 SEND_STATUS_NOTIFICATIONS = cc_settings.get("send_status_notifications", True)
+# Skip inference on frames without motion (mounting always involves large motion)
+MOTION_GATE = cc_settings.get("motion_gate", True)
+MOTION_SENSITIVITY = cc_settings.get("motion_sensitivity", 0.5)
+MOTION_KEEPALIVE = cc_settings.get("motion_keepalive", 30)
+EVIDENCE_FRAME_TIMEOUT = 0.1 # Max seconds the detection loop waits for an evidence frame
 
-BOT_NAME = camera.get("telegram_bot", "")
-telegram_config = config.get("telegram", {})
-telegram_bots = telegram_config.get("bots", [])
-telegram_users = telegram_config.get("users", [])
-
-TELEGRAM_BOT_TOKEN = None
-TELEGRAM_CHAT_IDS = []
-
-# Try to find Token (Soft check)
-try:
-    if telegram_bots:
-        if not BOT_NAME:
-            # Fallback: take the first enabled bot
-            TELEGRAM_BOT_TOKEN = next(b["token"] for b in telegram_bots if b.get("enabled"))
-        else:
-            TELEGRAM_BOT_TOKEN = next(b["token"] for b in telegram_bots if b["name"] == BOT_NAME and b.get("enabled"))
-except StopIteration:
-    print(f"⚠️ WARNING: No active Telegram bot found (searched for '{BOT_NAME}').")
-    print("   -> Script continues without notifications.")
-    TELEGRAM_BOT_TOKEN = None
-
-# Load Chat IDs only if a token exists
-if TELEGRAM_BOT_TOKEN:
-    TELEGRAM_CHAT_IDS = [u["chat_id"] for u in telegram_users if u.get("enabled")]
-    if not TELEGRAM_CHAT_IDS:
-        print("⚠️ WARNING: Bot found, but no active users (chat_ids) found.")
-
-telegram_users = config.get("telegram", {}).get("users", [])
-TELEGRAM_CHAT_IDS = [u["chat_id"] for u in telegram_users if u.get("enabled")]
+TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS = telegram_settings(config, camera)
 
 # --- INITIALIZATION ---
 
 print("Starting CowCatcherAI...")
 
 # 1. Ensure model exists (download if necessary)
-final_model_path = check_and_download_model(camera_model_file, master_model_url)
+final_model_path = check_and_download_model(camera_model_file, master_model_url, WEIGHTS_DIR)
 
-# 2. Load Model
-print(f"Loading detection model: {final_model_path}")
-model = YOLO(final_model_path, task='detect')
-print("Detection model successfully loaded")
+# 2. Load Model (or use the shared inference server when the application runs one)
+model = load_model(final_model_path, IMGSZ, cc_settings)
+# Cascade uses the same model for the search and for the check of the candidates
+detector = CascadeDetector(model, CASCADE_IMGSZ, cc_settings.get("cascade_candidate_confidence", 0.1),
+                           cc_settings.get("cascade_crop_margin", 0.5), cc_settings.get("cascade_max_crops", 4)) if CASCADE else model
+# Optional tiny gate model: only the frames it flags go to the full model
+gate = load_gate(cc_settings, WEIGHTS_DIR, [0], positive_conf=cc_settings.get("save_threshold", 0.83))
 
 print(f"Connecting to camera: {CAMERA_NAME}")
 
@@ -167,257 +133,144 @@ if not os.path.exists(save_folder):
     os.makedirs(save_folder)
     print(f"Folder '{save_folder}' created")
 
-print(f"Telegram bot active for {len(TELEGRAM_CHAT_IDS)} chat(s)")
-
-# --- THREADING SETUP FOR TELEGRAM ---
-telegram_queue = Queue()
-telegram_stats = {'sent': 0, 'failed': 0}
-
-def telegram_worker():
-    while True:
-        try:
-            task = telegram_queue.get()
-            if task is None: break
-            
-            task_type, *args = task
-            
-            if task_type == 'photo':
-                image_path, caption, disable_notification = args
-                result = _send_telegram_photo_sync(image_path, caption, disable_notification)
-                telegram_stats['sent' if result else 'failed'] += 1
-                    
-            elif task_type == 'message':
-                message = args[0]
-                result = _send_telegram_message_sync(message)
-                telegram_stats['sent' if result else 'failed'] += 1
-            
-            telegram_queue.task_done()
-        except Exception as e:
-            print(f"ERROR in telegram worker: {str(e)}")
-
-def _send_telegram_photo_sync(image_path, caption, disable_notification=False):
-    success_count = 0
-    if not TELEGRAM_CHAT_IDS: return False
-    
-    for chat_id in TELEGRAM_CHAT_IDS:
-        try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-            with open(image_path, 'rb') as photo:
-                files = {'photo': photo}
-                data = {
-                    'chat_id': chat_id,
-                    'caption': caption,
-                    'disable_notification': disable_notification
-                }
-                response = requests.post(url, files=files, data=data, timeout=30)
-                
-            if response.status_code != 200:
-                print(f"ERROR sending Telegram photo to chat {chat_id}: {response.text}")
-            else:
-                success_count += 1
-        except Exception as e:
-            print(f"ERROR sending Telegram photo to chat {chat_id}: {str(e)}")
-    return success_count > 0
-
-def _send_telegram_message_sync(message):
-    success_count = 0
-    if not TELEGRAM_CHAT_IDS: return False
-
-    for chat_id in TELEGRAM_CHAT_IDS:
-        try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            data = {'chat_id': chat_id, 'text': message}
-            response = requests.post(url, data=data, timeout=10)
-            
-            if response.status_code != 200:
-                print(f"ERROR sending Telegram message to chat {chat_id}: {response.text}")
-            else:
-                success_count += 1
-        except Exception as e:
-            print(f"ERROR sending Telegram message to chat {chat_id}: {str(e)}")
-    return success_count > 0
-
-def send_telegram_photo(image_path, caption, disable_notification=False):
-    telegram_queue.put(('photo', image_path, caption, disable_notification))
-    return True
-
-def send_telegram_message(message):
-    telegram_queue.put(('message', message))
-    return True
-
-def test_telegram_connection():
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getMe"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            print("Telegram bot connection successfully tested.")
-            return True
-        else:
-            print(f"ERROR testing Telegram connection: {response.text}")
-            return False
-    except Exception as e:
-        print(f"ERROR testing Telegram connection: {str(e)}")
-        return False
-
-# Test Telegram connection
-if not test_telegram_connection():
-    print("WARNING: Telegram connection failed or not configured. Script continues without alerts.")
-else:
-    # Start Telegram worker thread only if connection works
-    telegram_thread = Thread(target=telegram_worker, daemon=True)
-    telegram_thread.start()
-    print("Telegram worker thread started")
-
-# Open the camera stream
-print("Opening camera stream...")
-cap = cv2.VideoCapture(RTSP_URL)
-if not cap.isOpened():
-    print("ERROR: Cannot open camera stream")
-    exit()
-else:
-    print("Camera stream successfully opened")
+# --- TELEGRAM ---
+notifier = Notifier(CAMERA_ID, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_IDS, DATA_DIR)
+notifier.start()
+
+# Open the camera stream (captured on its own thread, newest frame wins)
+grabber = open_detection_stream(DETECTION_URL, CAPTURE_MODE, CAPTURE_BACKEND, IMGSZ, cascade=CASCADE)
+
+# Evidence stream: only opened while collecting screenshots, closed again when idle.
+# Also used on the detection stream itself when ffmpeg scales it, so screenshots keep the full resolution
+evidence = EvidenceStream(EVIDENCE_URL, backend=CAPTURE_BACKEND) if EVIDENCE_URL != DETECTION_URL or grabber.scaled else None
+
+motion_gate = MotionGate(MOTION_SENSITIVITY, MOTION_KEEPALIVE) if MOTION_GATE else None
+sampler = AdaptiveSampler(MIN_RATE, MAX_RATE, PRE_TRIGGER_CONFIDENCE, FULL_RATE_HOLD_TIME, CPU_BACKOFF_PERCENT)
+tracker = OpticalFlowTracker(DETECT_EVERY_N_FRAMES, TRACK_CONFIDENCE_DECAY) if TRACK_BETWEEN_DETECTIONS else None
 
 frame_count = 0
-last_detection_time = None
-notification_counter = 0
-confidence_history = deque(maxlen=10)
-frame_history = deque(maxlen=10)
-timestamp_history = deque(maxlen=10)
-collecting_screenshots = False
-collection_start_time = None
-event_detections = []
-inactivity_period = 0
-
-print(f"Processing started, every {process_every_n_frames} frames will be analyzed")
+last_log_frame = 0
+live_frame = None # Newest annotated frame for the live feed, shown by the main thread
+
+# Mounting event state machine (history, screenshot collection, notifications).
+# Its disk writes and Telegram sends are collected here and run on the persist stage.
+# Screenshots are encoded and written by the image writer pool, off the detection path.
+persist_jobs = []
+writer = ImageWriter()
+mounting = MountingLogic(cc_settings, NOTIFY_THRESHOLD, save_folder, notifier.send_photo,
+                         evidence=evidence, evidence_timeout=EVIDENCE_FRAME_TIMEOUT, persist=persist_jobs.append,
+                         writer=writer, max_rate=MAX_RATE, send_album=notifier.send_album)
+
+# --- PIPELINE STAGES (each on its own thread) ---
+def capture_stage():
+    # Only ask for a frame when the sampler wants one; in grab mode the ones in between are never decoded.
+    # Reconnecting is handled by the capture thread.
+    wait = sampler.wait_time()
+    if wait > 0:
+        time.sleep(min(wait, 0.5))
+        return None
+    ret, frame, capture_time = grabber.read()
+    if not ret:
+        return None
+    sampler.taken()
+    return {'frame': frame, 'time': capture_time}
+
+def preprocess_stage(item):
+    global live_frame
+    # Only the region of interest goes to the model (and counts for motion)
+    item['roi'], item['offset'] = ROI.crop(item['frame'])
+
+    # Motion gate: nothing moved, no need to run the model (always run while collecting an event)
+    if motion_gate:
+        if mounting.collecting:
+            motion_gate.force(item['roi'], item['time'])
+        elif not motion_gate.check(item['roi'], item['time']):
+            if SHOW_LIVE_FEED:
+                live_frame = item['frame']
+            return None
+    return item
+
+def gate_stage(item):
+    # Frames the gate model does not flag skip the full model (except the periodic check and while collecting)
+    run, item['gate_sample'] = gate.check(item['roi'], item['time'], force=mounting.collecting)
+    return item if run else None
+
+def inference_stage(item):
+    frame = item['frame']
+    # While collecting, the boxes of the last detector run are followed with optical flow in between
+    if tracker and mounting.collecting and not tracker.detection_due():
+        tracked = tracker.track(frame)
+        if tracked is not None:
+            item['result'] = tracked
+            return item
+        # Track lost: run the detector on this frame right away
+
+    results = detector.predict(source=item['roi'], classes=[0], conf=0.2, imgsz=ROI.imgsz(IMGSZ, frame.shape), verbose=False)
+    # Only a compact record in full-frame coordinates is kept (screenshots are annotated on the whole image),
+    # the Results object with its image and tensors is dropped here
+    item['result'] = Detections.from_result(results[0], frame.shape, item['offset'])
+    if tracker:
+        if mounting.collecting:
+            tracker.start(frame, item['result'])
+        else:
+            tracker.reset()
+    if item.get('gate_sample') is not None:
+        # Periodic pass: compare the gate verdict with the full model (recall in the log)
+        gate.record(item['gate_sample'], item['result'].max_conf())
+    return item
+
+def event_stage(item):
+    mounting.update(item['result'], item['frame'], item['time'])
+    # Full rate as soon as something that could become a mounting is seen, and while collecting
+    sampler.report(mounting.last_conf, active=mounting.collecting)
+    item['jobs'] = persist_jobs[:]
+    persist_jobs.clear()
+    return item if item['jobs'] or SHOW_LIVE_FEED else None
+
+def persist_stage(item):
+    global live_frame
+    for job in item['jobs']:
+        job()
+    if SHOW_LIVE_FEED:
+        # The frame is still referenced by the mounting history, draw on a copy
+        live_frame = draw_detections(item['frame'].copy(), item['result'])
+
+pipeline = Pipeline(capture_stage, [
+    ("preprocess", preprocess_stage),
+    *([("gate", gate_stage)] if gate else []),
+    ("inference", inference_stage),
+    ("events", event_stage),
+    ("persist", persist_stage),
+])
+
+print(f"Processing started, {MIN_RATE}-{MAX_RATE} frames per second will be analyzed")
 
 start_message = f"📋 Cowcatcher detection script started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
 if SEND_STATUS_NOTIFICATIONS:
-    send_telegram_message(start_message)
-
-def format_timestamp_for_display(ts):
-    return f"{ts[6:8]}-{ts[4:6]}-{ts[:4]}"
+    notifier.send_message(start_message)
 
 try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("ERROR: Cannot read frame from camera")
-            cap.release()
-            time.sleep(5)
-            cap = cv2.VideoCapture(RTSP_URL)
-            continue
-            
-        frame_count += 1
-        
-        if frame_count % 100 == 0:
-            print(f"Frames processed: {frame_count} | Queue: {telegram_queue.qsize()} | Sent: {telegram_stats['sent']}", flush=True)
-        
-        if frame_count % process_every_n_frames == 0:
-            results = model.predict(source=frame, classes=[0], conf=0.2, verbose=False)
-            
-            highest_conf_detection = None
-            highest_conf = 0.0
-            if len(results[0].boxes) > 0:
-                sorted_detections = sorted(results[0].boxes, key=lambda x: float(x.conf), reverse=True)
-                if len(sorted_detections) > 0:
-                    highest_conf_detection = sorted_detections[0]
-                    highest_conf = float(highest_conf_detection.conf)
-            
-            current_time = datetime.now()
-            timestamp = current_time.strftime("%Y%m%d_%H%M%S")
-            
-            # Maintain history
-            confidence_history.append(highest_conf if highest_conf_detection else 0.0)
-            frame_history.append(frame.copy())
-            timestamp_history.append(timestamp)
-                
-            can_send_notification = (last_detection_time is None or 
-                                    (current_time - last_detection_time).total_seconds() > cooldown_period)
-            
-            # Start condition
-            if highest_conf >= SAVE_THRESHOLD and not collecting_screenshots and can_send_notification:
-                print(f"Starting screenshot collection for {COLLECTION_TIME} seconds")
-                collecting_screenshots = True
-                collection_start_time = current_time
-                event_detections = []
-                
-                # Add history to event
-                for i in range(len(confidence_history)):
-                    if confidence_history[i] >= SAVE_THRESHOLD:
-                        hist_frame = frame_history[i]
-                        hist_ts = timestamp_history[i]
-                        hist_conf = confidence_history[i]
-                        
-                        hist_path = os.path.join(save_folder, f"mounting_detected_{hist_ts}_conf{hist_conf:.2f}_history.jpg")
-                        cv2.imwrite(hist_path, hist_frame)
-                        event_detections.append((hist_conf, None, hist_ts, hist_path, None))
-                
-            if collecting_screenshots:
-                # During collection
-                if highest_conf >= SAVE_THRESHOLD:
-                    orig_path = os.path.join(save_folder, f"mounting_detected_{timestamp}_conf{highest_conf:.2f}.jpg")
-                    cv2.imwrite(orig_path, frame)
-                    
-                    # Save result object for later annotation
-                    event_detections.append((highest_conf, None, timestamp, orig_path, results[0]))
-                    
-                    inactivity_period = 0
-                    last_detection_time = current_time
-                    
-                    # Logic regarding PEAK detection removed here.
-                    # Collection continues until time runs out or inactivity threshold is met.
-                else:
-                    if last_detection_time is not None:
-                        inactivity_period = (current_time - last_detection_time).total_seconds()
-                
-                collection_duration = (current_time - collection_start_time).total_seconds()
-                
-                # Stop conditions (Updated: Removed Peak check)
-                stop_collection = False
-                # Original peak check line removed
-                if collection_duration >= COLLECTION_TIME: stop_collection = True
-                elif inactivity_period >= INACTIVITY_STOP_TIME: stop_collection = True
-                
-                if stop_collection:
-                    print(f"Collection stopped. Detections: {len(event_detections)}")
-                    
-                    # Filter relevant detections based on notify_threshold
-                    valid_detections = [d for d in event_detections if d[0] >= NOTIFY_THRESHOLD]
-                    
-                    if len(valid_detections) >= MIN_HIGH_CONFIDENCE_DETECTIONS:
-                        # Sort by confidence
-                        event_detections.sort(key=lambda x: x[0], reverse=True)
-                        top_selection = event_detections[:MAX_SCREENSHOTS]
-                        
-                        notification_counter += 1
-                        play_sound = (notification_counter % SOUND_EVERY_N_NOTIFICATIONS == 0)
-                        
-                        for idx, (conf, _, ts, orig_path, res_obj) in enumerate(top_selection):
-                            final_send_path = orig_path
-                            
-                            # Annotate if desired
-                            if SEND_ANNOTATED_IMAGES and res_obj is not None:
-                                annotated_path = orig_path.replace(".jpg", "_annotated.jpg")
-                                annotated_img = res_obj.plot()
-                                cv2.imwrite(annotated_path, annotated_img)
-                                final_send_path = annotated_path
-                            
-                            sound_icon = "🔊" if play_sound else "🔇"
-                            msg = f"{sound_icon} Mounting detected {format_timestamp_for_display(ts)} - Conf: {conf:.2f}\nCapture {idx+1}/{len(top_selection)}"
-                            
-                            send_telegram_photo(final_send_path, msg, disable_notification=not play_sound)
-                            print(f"Telegram queued: {conf:.2f}")
-                            
-                        last_detection_time = current_time
-                    
-                    collecting_screenshots = False
-            
-            if SHOW_LIVE_FEED and len(results) > 0:
-                annotated_frame = results[0].plot()
-                cv2.imshow(f"Cam {CAMERA_ID}", annotated_frame)
-        
-        if SHOW_LIVE_FEED and (cv2.waitKey(1) & 0xFF == ord('q')):
-            break
+    pipeline.start()
+    # The main thread only logs and shows the live feed; check() re-raises errors of the stages
+    while pipeline.check():
+        # Count captured frames, including the ones dropped while we were busy
+        frame_count = grabber.last_read_id
+
+        if frame_count - last_log_frame >= 100:
+            last_log_frame = frame_count
+            motion_info = f" | {motion_gate.stats_line()}" if motion_gate else ""
+            if CASCADE: motion_info += f" | {detector.stats_line()}"
+            if gate: motion_info += f" | {gate.stats_line()}"
+            if tracker: motion_info += f" | {tracker.stats_line()}"
+            print(f"Frames processed: {frame_count} | {grabber.stats_line()}{motion_info} | {sampler.stats_line()} | {pipeline.stats_line()} | {writer.stats_line()} | {notifier.stats_line()}", flush=True)
+
+        if SHOW_LIVE_FEED:
+            if live_frame is not None:
+                cv2.imshow(f"Cam {CAMERA_ID}", live_frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        else:
+            time.sleep(0.1)
 
 except KeyboardInterrupt:
     print("Script stopped by user")
@@ -428,12 +281,11 @@ except Exception as e:
     
 finally:
     print("Cleaning up...")
-    telegram_queue.put(None)
-    if 'telegram_thread' in locals() and telegram_thread.is_alive():
-        telegram_thread.join(timeout=5)
-    
-    cap.release()
+    pipeline.stop()
+    writer.close()
+    grabber.stop()
+    if evidence: evidence.close()
     if SHOW_LIVE_FEED: cv2.destroyAllWindows()
-    
-    if SEND_STATUS_NOTIFICATIONS and 'stop_reason' in locals():
-        _send_telegram_message_sync(f"⚠️ Script Stopped: {stop_reason}")
\ No newline at end of file
+
+    stop_message = f"⚠️ Script Stopped: {stop_reason}" if SEND_STATUS_NOTIFICATIONS and 'stop_reason' in locals() else None
+    notifier.close(final_message=stop_message)
\ No newline at end of file
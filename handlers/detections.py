@@ -0,0 +1,89 @@
+"""
+Compact detection records and a minimal box renderer.
+
+An ultralytics Results object keeps the whole input image and its tensors alive, and
+Results.plot() copies the frame and goes through the generic plotting code. The
+handlers convert the result to a Detections record right after inference (a few small
+NumPy arrays in full-frame coordinates) and draw it with draw_detections(), in place
+on an image they own.
+"""
+
+import cv2
+import numpy as np
+
+# BGR colors per class number
+CLASS_COLORS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72)]
+
+
+def _to_numpy(data):
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+
+class Detections:
+    __slots__ = ("boxes", "conf", "cls", "names", "shape")
+
+    def __init__(self, boxes, conf, cls, names, shape):
+        """
+        boxes: N x 4 (x0, y0, x1, y1), conf and cls: N, all in a frame of `shape` (h, w).
+        names: class number -> class name.
+        """
+        self.boxes = boxes
+        self.conf = conf
+        self.cls = cls
+        self.names = names
+        self.shape = tuple(shape[:2])
+
+    @classmethod
+    def from_data(cls, data, names, shape):
+        """From rows of (x0, y0, x1, y1, conf, cls)."""
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        return cls(data[:, :4].copy(), data[:, 4].copy(), data[:, 5].astype(np.int32), names, shape)
+
+    @classmethod
+    def from_result(cls, result, frame_shape=None, offset=(0, 0)):
+        """
+        From an ultralytics Results object. The boxes are taken to lie at `offset` inside a
+        frame of `frame_shape` (default: the image the result was computed on), e.g. when
+        the model only saw the region of interest.
+        """
+        data = _to_numpy(result.boxes.data)[:, :6].astype(np.float32)
+        data[:, [0, 2]] += offset[0]
+        data[:, [1, 3]] += offset[1]
+        return cls.from_data(data, result.names, frame_shape or result.orig_shape)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def max_conf(self):
+        return float(self.conf.max()) if len(self.conf) else 0.0
+
+    def select(self, cls, min_conf=0.0):
+        """Only the boxes of class `cls` with at least `min_conf`."""
+        keep = (self.cls == cls) & (self.conf >= min_conf)
+        return Detections(self.boxes[keep], self.conf[keep], self.cls[keep], self.names, self.shape)
+
+
+def draw_detections(image, detections):
+    """
+    Draws the boxes and labels on `image` (in place, also returned). The boxes are scaled
+    from the detection frame to the size of `image`, e.g. a high resolution evidence frame.
+    """
+    h, w = image.shape[:2]
+    scale = np.array([w / detections.shape[1], h / detections.shape[0]] * 2, dtype=np.float32)
+    line = max(round((h + w) / 2 * 0.003), 2)
+    font_scale = line / 3
+
+    for box, conf, cls in zip(detections.boxes * scale, detections.conf, detections.cls):
+        x0, y0, x1, y1 = (int(v) for v in box)
+        cls = int(cls)
+        color = CLASS_COLORS[cls % len(CLASS_COLORS)]
+        cv2.rectangle(image, (x0, y0), (x1, y1), color, line, cv2.LINE_AA)
+
+        label = f"{detections.names.get(cls, cls)} {conf:.2f}"
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, max(line - 1, 1))
+        top = y0 - th - 3 >= 0 # Label above the box if it fits, else inside
+        ty = y0 - 3 if top else y0 + th + 3
+        cv2.rectangle(image, (x0, ty - th - 3), (x0 + tw, ty + 3), color, -1, cv2.LINE_AA)
+        cv2.putText(image, label, (x0, ty), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255),
+                    max(line - 1, 1), cv2.LINE_AA)
+    return image
@@ -0,0 +1,102 @@
+"""
+Optional tiny "gate" model in front of the full detector.
+
+Most analyzed frames show nothing. A nano model (classifier or detector, trained on the
+same class numbers as the full model) looks at every frame first; only frames it flags
+go to the full model. Every `full_pass_interval` seconds one frame goes to the full
+model regardless of the gate. On those periodic frames the gate's own verdict is
+compared with the full model, which gives an unbiased recall figure for tuning the
+gate confidence.
+
+The gate runs in the handler itself (the inference server only returns boxes, a
+classifier has none); a nano model is cheap enough for that.
+"""
+
+import os
+
+import numpy as np
+from ultralytics import YOLO
+
+
+def _to_numpy(data):
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+
+class ModelGate:
+    def __init__(self, model, classes, imgsz=320, conf=0.25, full_pass_interval=30, positive_conf=0.5):
+        """
+        classes: class numbers of the events (for a classifier: the indices of its event classes).
+        positive_conf: confidence of the full model that counts as an event for the recall figure.
+        """
+        self.model = model
+        self.classes = classes
+        self.imgsz = imgsz
+        self.conf = conf
+        self.full_pass_interval = full_pass_interval
+        self.positive_conf = positive_conf
+        self.last_full_pass = 0.0
+        self.stats = {'checked': 0, 'flagged': 0, 'forced': 0, 'periodic': 0, 'positives': 0, 'caught': 0}
+
+    def score(self, image):
+        """Gate confidence that `image` shows one of the classes."""
+        result = self.model.predict(source=image, imgsz=self.imgsz, verbose=False)[0]
+        if getattr(result, "probs", None) is not None:
+            probs = _to_numpy(result.probs.data)
+            return float(max(probs[c] for c in self.classes if c < len(probs)))
+        boxes = _to_numpy(result.boxes.data)
+        boxes = boxes[np.isin(boxes[:, 5], self.classes)]
+        return float(boxes[:, 4].max()) if len(boxes) else 0.0
+
+    def check(self, image, now, force=False):
+        """
+        Returns (run_full_model, sample). `sample` is the gate verdict on a periodic frame
+        (pass it to record() with the full model's confidence), otherwise None.
+        With `force` (an event is running) the gate is skipped and the full model always runs.
+        """
+        if force:
+            self.stats['forced'] += 1
+            return True, None
+
+        self.stats['checked'] += 1
+        flagged = self.score(image) >= self.conf
+        self.stats['flagged'] += flagged
+
+        if now - self.last_full_pass >= self.full_pass_interval:
+            self.last_full_pass = now
+            self.stats['periodic'] += 1
+            return True, flagged
+        return flagged, None
+
+    def record(self, flagged, full_conf):
+        """Compares the gate verdict of a periodic frame with the full model."""
+        if full_conf >= self.positive_conf:
+            self.stats['positives'] += 1
+            self.stats['caught'] += flagged
+
+    def stats_line(self):
+        checked = self.stats['checked'] or 1
+        line = f"Gate: {self.stats['flagged'] / checked:.0%} flagged"
+        if self.stats['positives']:
+            recall = self.stats['caught'] / self.stats['positives']
+            line += f" | Gate recall {recall:.0%} ({self.stats['caught']}/{self.stats['positives']} periodic checks)"
+        else:
+            line += f" | Gate recall n/a (0 events in {self.stats['periodic']} periodic checks)"
+        return line
+
+
+def load_gate(settings, weights_dir, classes, positive_conf):
+    """ModelGate from the 'gate_model' setting of a handler type, or None when it is off or missing."""
+    gate_file = settings.get("gate_model", "")
+    if not gate_file:
+        return None
+    gate_path = os.path.join(weights_dir, gate_file)
+    if not os.path.exists(gate_path):
+        print(f"⚠️ Gate model '{gate_file}' not found in {weights_dir}, running without gate.")
+        return None
+
+    print(f"Loading gate model: {gate_path}")
+    return ModelGate(YOLO(gate_path), classes,
+                     imgsz=settings.get("gate_imgsz", 320),
+                     conf=settings.get("gate_confidence", 0.25),
+                     full_pass_interval=settings.get("gate_full_pass_interval", 30),
+                     positive_conf=positive_conf)
@@ -0,0 +1,112 @@
+"""
+Pre-event frame history of the mounting logic.
+
+The last few seconds of analyzed frames are kept so an event can include the frames
+just before it started. Frames are copied into one preallocated NumPy ring buffer
+(sized from the history depth, at most `max_bytes` large), so keeping the history
+allocates nothing per frame. Above JPEG_AUTO_PIXELS (or when asked) the history is
+kept as JPEG bytes instead, encoded on a background thread: much less memory for
+high resolution streams, at the cost of some CPU.
+
+The history is only read when a collection starts.
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+MAX_HISTORY_BYTES = 64 * 1024 * 1024 # Default upper bound of the raw ring buffer
+JPEG_AUTO_PIXELS = 1280 * 720 # as_jpeg="auto": frames larger than this are kept as JPEG
+
+
+class FrameHistory:
+    def __init__(self, seconds, max_rate, as_jpeg="auto", jpeg_quality=95, max_bytes=MAX_HISTORY_BYTES):
+        """
+        seconds: history depth. max_rate: highest analyzed frames per second (sizes the buffer).
+        as_jpeg: keep the frames JPEG encoded (off-thread) instead of raw; "auto" decides on the
+        first frame (JPEG above JPEG_AUTO_PIXELS).
+        max_bytes: upper bound of the raw ring buffer, fewer frames are kept when it does not fit.
+        """
+        self.seconds = seconds
+        self.depth = max(math.ceil(seconds * max_rate) + 1, 2) # Frames the history depth needs at max_rate
+        self.capacity = self.depth
+        self.max_bytes = max_bytes
+        self.as_jpeg = as_jpeg
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.encoder = None
+
+        self.frames = None # (capacity, h, w, 3), allocated on the first frame
+        self.slots = [None] * self.capacity # (capture_time, info, image or Future or None)
+        self.next = 0
+
+    def _encode(self, frame):
+        ok, jpeg = cv2.imencode(".jpg", frame, self.jpeg_params)
+        return jpeg.tobytes() if ok else None
+
+    def append(self, capture_time, frame, info):
+        """Adds a frame with its `info`. With frame=None only the info is kept (a frame that is never needed)."""
+        index = self.next % self.capacity
+        self.next += 1
+        image = None
+        if frame is not None and self.as_jpeg == "auto":
+            self._choose_mode(frame)
+            index = 0
+        if frame is not None:
+            if self.as_jpeg:
+                # The captured frame is never written to, the encoder can read it later
+                image = self.encoder.submit(self._encode, frame)
+            else:
+                if self.frames is None or self.frames.shape[1:] != frame.shape or self.frames.dtype != frame.dtype:
+                    self._allocate(frame)
+                    index = 0
+                np.copyto(self.frames[index], frame)
+                image = index
+        self.slots[index] = (capture_time, info, image)
+
+    def _choose_mode(self, frame):
+        self.as_jpeg = frame.shape[0] * frame.shape[1] > JPEG_AUTO_PIXELS
+        if self.as_jpeg:
+            print(f"History kept as JPEG ({frame.shape[1]}x{frame.shape[0]} stream)", flush=True)
+        self._reset(self.depth)
+
+    def _allocate(self, frame):
+        # Fewer frames (a shorter history at the highest rate) rather than more than max_bytes
+        capacity = min(self.depth, max(self.max_bytes // frame.nbytes, 2))
+        if capacity < self.depth:
+            print(f"⚠️ History limited to {capacity} frames ({self.max_bytes // 2**20}MB)", flush=True)
+        self.frames = np.empty((capacity,) + frame.shape, dtype=frame.dtype)
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        """Starts over with `capacity` slots (the entries so far hold no image or one of the old size)."""
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.next = 1
+        if self.as_jpeg and self.encoder is None:
+            self.encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-jpeg")
+
+    def entries(self, skip_newest=0):
+        """
+        (capture_time, image, info) of the frames in the history depth, oldest first.
+        image is a view into the ring buffer (valid until the next append), JPEG bytes,
+        or None. `skip_newest` leaves out the most recent entries.
+        """
+        if self.next == 0:
+            return []
+        count = min(self.next, self.capacity) - skip_newest
+        newest = self.slots[(self.next - 1) % self.capacity]
+        result = []
+        for i in range(self.next - skip_newest - count, self.next - skip_newest):
+            slot = self.slots[i % self.capacity]
+            if slot is None or slot[0] < newest[0] - self.seconds:
+                continue
+            capture_time, info, image = slot
+            if isinstance(image, int):
+                image = self.frames[image]
+            elif image is not None:
+                image = image.result()
+            result.append((capture_time, image, info))
+        return result
+
@@ -0,0 +1,96 @@
+"""
+Asynchronous image writer for all screenshots of a handler.
+
+cv2.imwrite on a slow SD card or network share can take longer than a whole model
+run. ImageWriter encodes and writes images on a small thread pool; write() returns
+a Future right away, so the detection path never waits for the disk. Jobs that need
+the file (annotating it, sending it to Telegram) wait on that Future instead.
+
+The number of pending writes is bounded. When the pool is saturated, a normal write
+is dropped and counted instead of stalling detection; writes that must not be lost
+(alarms, the images that are sent) pass block=True and wait for a free slot.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import cv2
+
+WRITER_THREADS = 2
+MAX_PENDING = 32 # Images waiting to be written before new ones are dropped
+SATURATION_WARN_INTERVAL = 10 # Seconds between two "writer saturated" warnings
+
+
+def _save(path, image, params):
+    """Writes an image, or an already encoded image file (bytes) as is."""
+    if isinstance(image, bytes):
+        with open(path, "wb") as f:
+            f.write(image)
+        return True
+    return cv2.imwrite(path, image, params or [])
+
+
+def write_now(path, image, params=None, block=False):
+    """Synchronous stand-in for ImageWriter.write()."""
+    future = Future()
+    future.set_result(path if _save(path, image, params) else None)
+    return future
+
+
+class ImageWriter:
+    def __init__(self, threads=WRITER_THREADS, max_pending=MAX_PENDING):
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="image-writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.last_warning = 0.0
+        self.lock = threading.Lock()
+        self.stats = {'written': 0, 'failed': 0, 'dropped': 0, 'write_time': 0.0}
+
+    def write(self, path, image, params=None, block=False):
+        """
+        Queues `image` (an image, or the bytes of an encoded image file) to be written
+        to `path` (with cv2.imwrite `params`).
+        Returns a Future with the path, or None when the write failed or was dropped.
+        """
+        if not self.slots.acquire(blocking=block):
+            with self.lock:
+                self.stats['dropped'] += 1
+                warn = time.time() - self.last_warning >= SATURATION_WARN_INTERVAL
+                if warn:
+                    self.last_warning = time.time()
+            if warn:
+                print(f"⚠️ Image writer saturated ({self.max_pending} pending), screenshot dropped: {path}", flush=True)
+            future = Future()
+            future.set_result(None)
+            return future
+
+        with self.lock:
+            self.pending += 1
+        return self.pool.submit(self._write, path, image, params)
+
+    def _write(self, path, image, params):
+        start = time.perf_counter()
+        try:
+            ok = _save(path, image, params)
+        except Exception as e:
+            print(f"ERROR writing {path}: {e}", flush=True)
+            ok = False
+        finally:
+            self.slots.release()
+        with self.lock:
+            self.pending -= 1
+            self.stats['written' if ok else 'failed'] += 1
+            self.stats['write_time'] += time.perf_counter() - start
+        return path if ok else None
+
+    def close(self):
+        """Finishes the queued writes."""
+        self.pool.shutdown(wait=True)
+
+    def stats_line(self):
+        written = self.stats['written'] or 1
+        ms = self.stats['write_time'] * 1000 / written
+        return (f"Writer: {self.stats['written']} written ({ms:.0f}ms) | Pending: {self.pending}/{self.max_pending}"
+                f" | Dropped: {self.stats['dropped']} | Failed: {self.stats['failed']}")
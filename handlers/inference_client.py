@@ -0,0 +1,118 @@
+"""
+Client side of the shared inference server (see inference_server.py).
+
+The ProcessManager passes the server address and auth key to the camera workers
+through environment variables. A worker writes its frame into its own shared memory
+block and only sends the block name and a few options over the socket; the server
+answers with the detection boxes. InferenceClient.predict() returns the same kind of
+Results list as YOLO.predict(), so the handlers can use either.
+"""
+
+import os
+import time
+import atexit
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client
+
+import numpy as np
+from ultralytics.engine.results import Results
+
+ADDRESS_ENV = "COWCATCHER_INFERENCE_ADDRESS"
+AUTHKEY_ENV = "COWCATCHER_INFERENCE_AUTHKEY"
+CONNECT_TIMEOUT = 60 # The server may still be loading torch when the first cameras start
+CONNECT_RETRY_DELAY = 1
+
+
+def server_address():
+    """Returns ((host, port), authkey) from the environment, or None when no server is configured."""
+    address = os.environ.get(ADDRESS_ENV)
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not address or not authkey:
+        return None
+    host, port = address.rsplit(":", 1)
+    return (host, int(port)), authkey.encode()
+
+
+class InferenceClient:
+    def __init__(self, model_path, address, authkey, timeout=CONNECT_TIMEOUT):
+        self.model_path = os.path.abspath(model_path)
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.block = None
+        self.conn = None
+        self.names = {}
+        self._connect()
+        atexit.register(self.close)
+
+    def _connect(self):
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                self.conn = Client(self.address, authkey=self.authkey)
+                break
+            except (ConnectionRefusedError, OSError):
+                if time.time() >= deadline:
+                    raise
+                time.sleep(CONNECT_RETRY_DELAY)
+
+        # The server loads the model (once for all cameras) and returns the class names
+        self.conn.send(("load", self.model_path))
+        kind, data = self.conn.recv()
+        if kind == "error":
+            raise RuntimeError(data)
+        self.names = data
+
+    def _shared_frame(self, frame):
+        """Copies the frame into the shared memory block, growing the block when needed."""
+        if self.block is None or self.block.size < frame.nbytes:
+            self._release_block()
+            self.block = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.block.buf)[...] = frame
+
+    def predict(self, source, **options):
+        frame = np.ascontiguousarray(source)
+        self._shared_frame(frame)
+        request = ("predict", self.block.name, frame.shape, frame.dtype.str, self.model_path, options)
+        try:
+            self.conn.send(request)
+            kind, data = self.conn.recv()
+        except (EOFError, OSError):
+            # Server restarted: connect once more, a second failure goes to the caller
+            self._connect()
+            self.conn.send(request)
+            kind, data = self.conn.recv()
+
+        if kind == "error":
+            raise RuntimeError(f"Inference server: {data}")
+        return [Results(orig_img=source, path="", names=self.names, boxes=data)]
+
+    def _release_block(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def close(self):
+        self._release_block()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def connect_inference_server(model_path):
+    """
+    Returns an InferenceClient when the ProcessManager runs a shared inference server,
+    or None so the handler loads the model itself.
+    """
+    config = server_address()
+    if config is None:
+        return None
+    address, authkey = config
+    try:
+        client = InferenceClient(model_path, address, authkey)
+    except Exception as e:
+        print(f"⚠️ Inference server not available ({e}), loading the model in this process")
+        return None
+    print(f"Using shared inference server at {address[0]}:{address[1]}")
+    return client
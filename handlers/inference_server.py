@@ -0,0 +1,204 @@
+"""
+Shared inference server.
+
+Started once by the ProcessManager instead of every camera worker loading its own
+copy of the weights. Each model is loaded once. Workers put their frame in a shared
+memory block and send a small request (see inference_client.py); frames that arrive
+from different cameras within 'max_wait_ms' and use the same model and settings are
+run as one batch through model.predict().
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import namedtuple
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener
+from queue import Queue, Empty
+
+import numpy as np
+from ultralytics import YOLO
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.inference_client import server_address
+
+# --- PATH SETUP ---
+BASE_DIR = os.getcwd()
+CONFIG_PATH = os.path.join(BASE_DIR, "settings", "config.json")
+
+STATS_INTERVAL = 60 # Seconds between the statistics lines
+
+# --- LOAD CONFIG ---
+try:
+    with open(CONFIG_PATH, 'r') as f:
+        settings = json.load(f).get("inference_server", {})
+except Exception as e:
+    print(f"WARNING: Loading config failed ({CONFIG_PATH}): {e}, using defaults")
+    settings = {}
+
+MAX_BATCH_SIZE = max(1, settings.get("max_batch_size", 8))
+MAX_WAIT = settings.get("max_wait_ms", 15) / 1000
+DEVICE = settings.get("device") or None
+
+Request = namedtuple("Request", ["conn", "frame", "model_path", "options", "key"])
+
+models = {}
+models_lock = threading.Lock()
+pending = Queue()
+send_locks = {}
+stats = {'frames': 0, 'batches': 0, 'clients': 0, 'errors': 0}
+
+
+def get_model(model_path):
+    with models_lock:
+        if model_path not in models:
+            print(f"Loading detection model: {model_path}")
+            models[model_path] = YOLO(model_path, task='detect')
+            print(f"✅ Model loaded ({len(models)} in memory)")
+        return models[model_path]
+
+
+def attach_block(name):
+    """Opens a worker's shared memory block without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Otherwise our resource tracker unlinks the worker's block when we exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+def release_block(block):
+    try:
+        block.close()
+    except BufferError:
+        pass # A frame still points into it, it is freed together with that frame
+
+
+def reply(conn, message):
+    try:
+        with send_locks[conn]:
+            conn.send(message)
+    except (KeyError, OSError):
+        pass # Worker is gone
+
+
+def serve_client(conn):
+    """Reads the requests of one camera worker and queues them for the batch loop."""
+    send_locks[conn] = threading.Lock()
+    stats['clients'] += 1
+    block = None
+    try:
+        while True:
+            message = conn.recv()
+            kind = message[0]
+
+            if kind == "load":
+                try:
+                    reply(conn, ("names", get_model(message[1]).names))
+                except Exception as e:
+                    reply(conn, ("error", f"Could not load model: {e}"))
+
+            elif kind == "predict":
+                _, block_name, shape, dtype, model_path, options = message
+                if block is None or block.name != block_name:
+                    if block is not None:
+                        release_block(block)
+                    block = attach_block(block_name)
+                # The worker waits for the answer, so the frame can be read in place
+                frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+                key = (model_path, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in options.items())))
+                pending.put(Request(conn, frame, model_path, options, key))
+    except (EOFError, OSError):
+        pass
+    finally:
+        stats['clients'] -= 1
+        send_locks.pop(conn, None)
+        conn.close()
+        if block is not None:
+            release_block(block)
+
+
+def run_batch(requests):
+    """One forward pass for frames that share model and options."""
+    try:
+        model = get_model(requests[0].model_path)
+        results = model.predict(source=[r.frame for r in requests], device=DEVICE, verbose=False, **requests[0].options)
+        boxes = [result.boxes.data.cpu().numpy() for result in results]
+    except Exception as e:
+        stats['errors'] += 1
+        print(f"ERROR during inference: {e}")
+        for r in requests:
+            reply(r.conn, ("error", str(e)))
+        return
+
+    stats['frames'] += len(requests)
+    stats['batches'] += 1
+    for r, data in zip(requests, boxes):
+        reply(r.conn, ("result", data))
+
+
+def batch_loop():
+    last_stats = time.time()
+    while True:
+        try:
+            batch = [pending.get(timeout=STATS_INTERVAL)]
+        except Empty:
+            batch = []
+
+        # Wait a little for frames of other cameras
+        deadline = time.time() + MAX_WAIT
+        while batch and len(batch) < MAX_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except Empty:
+                break
+
+        groups = {}
+        for r in batch:
+            groups.setdefault(r.key, []).append(r)
+        for requests in groups.values():
+            run_batch(requests)
+
+        if time.time() - last_stats >= STATS_INTERVAL:
+            last_stats = time.time()
+            avg = stats['frames'] / stats['batches'] if stats['batches'] else 0
+            print(f"Inference server: {stats['frames']} frames in {stats['batches']} batches (avg {avg:.1f}) | "
+                  f"Clients: {stats['clients']} | Models: {len(models)} | Errors: {stats['errors']}", flush=True)
+
+
+def main():
+    config = server_address()
+    if config is None:
+        print("ERROR: Inference server address not set, it is started by the application.")
+        sys.exit(1)
+    address, authkey = config
+
+    listener = Listener(address, authkey=authkey)
+    print(f"Inference server listening on {address[0]}:{address[1]} (batch <= {MAX_BATCH_SIZE}, wait <= {MAX_WAIT * 1000:.0f} ms)", flush=True)
+    threading.Thread(target=batch_loop, daemon=True).start()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # Wrong auth key or a client that disconnected during the handshake
+            print(f"WARNING: Rejected connection: {e}")
+            continue
+        threading.Thread(target=serve_client, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Inference server stopped")
@@ -0,0 +1,266 @@
+"""
+Picks the fastest way to run a .pt model on this machine.
+
+On first use the model is exported to ONNX and OpenVINO. The exports are cached in
+weights/<model>_<hash>_<imgsz>/, so a new model file or input size gets new exports.
+A short benchmark decides which format is used; the result is stored next to the
+exports and reused on the next start. INT8 versions made with quantize_model.py live
+in the same folder and are used instead when 'use_int8_model' is on.
+
+Also downloads missing models and loads the model of a handler.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+import requests
+from ultralytics import YOLO
+
+from handlers.inference_client import connect_inference_server
+
+EXPORT_FORMATS = ["onnx", "openvino"]
+BENCHMARK_WARMUP = 2
+BENCHMARK_RUNS = 10
+HEARTBEAT_INTERVAL = 30 # Seconds between "Optimizing model" lines while exporting (watchdog timeout is 90)
+LOCK_TIMEOUT = 120 # Seconds without a heartbeat before the lock of a killed export is considered stale
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:12]
+
+
+def cache_dir(model_path, imgsz):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(os.path.dirname(model_path), f"{stem}_{file_hash(model_path)}_{imgsz}")
+
+
+def exported_path(folder, stem, fmt):
+    """Where ultralytics puts the export of <folder>/<stem>.pt."""
+    if fmt == "openvino":
+        return os.path.join(folder, f"{stem}_openvino_model")
+    return os.path.join(folder, f"{stem}.{fmt}")
+
+
+def int8_path(folder, stem, fmt):
+    """Where quantize_model.py puts the INT8 version."""
+    if fmt == "openvino":
+        return os.path.join(folder, f"{stem}_int8_openvino_model")
+    return os.path.join(folder, f"{stem}_int8.{fmt}")
+
+
+class _CacheLock:
+    """Lock file, so cameras that start together do not export the same model twice."""
+
+    def __init__(self, folder):
+        self.path = os.path.join(folder, ".lock")
+        self.done = threading.Event()
+
+    def __enter__(self):
+        waited = 0
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL))
+                atexit.register(self._release)
+                threading.Thread(target=self._heartbeat, daemon=True).start()
+                return self
+            except FileExistsError:
+                # Keep the watchdog informed while another camera is exporting
+                if waited % 30 == 0:
+                    print("Optimizing model: waiting for another camera to finish the export...", flush=True)
+                waited += 1
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_TIMEOUT:
+                        os.remove(self.path)
+                except OSError:
+                    pass
+                time.sleep(1)
+
+    def _heartbeat(self):
+        """
+        An export (ultralytics may pip-install the exporter first) and the benchmark can take
+        longer than the watchdog timeout: keep the watchdog informed and the lock fresh.
+        """
+        while not self.done.wait(HEARTBEAT_INTERVAL):
+            print("Optimizing model: still working...", flush=True)
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    def _release(self):
+        self.done.set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __exit__(self, *exc):
+        self._release()
+        atexit.unregister(self._release)
+
+
+def benchmark(model_file, imgsz):
+    """Average inference time in ms on a dummy frame, or None when the model does not run."""
+    try:
+        model = YOLO(model_file, task='detect')
+        frame = np.random.default_rng(0).integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8)
+        for _ in range(BENCHMARK_WARMUP):
+            model.predict(source=frame, imgsz=imgsz, verbose=False)
+        start = time.perf_counter()
+        for _ in range(BENCHMARK_RUNS):
+            model.predict(source=frame, imgsz=imgsz, verbose=False)
+        return (time.perf_counter() - start) * 1000 / BENCHMARK_RUNS
+    except Exception as e:
+        print(f"⚠️ Benchmark of {os.path.basename(model_file)} failed: {e}")
+        return None
+
+
+def find_int8_model(model_path, imgsz):
+    """Returns the INT8 version made by quantize_model.py (OpenVINO first), or None."""
+    folder = cache_dir(model_path, imgsz)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    for fmt in EXPORT_FORMATS[::-1]:
+        path = int8_path(folder, stem, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def select_model(model_path, imgsz=640, use_int8=False, optimize=True):
+    """
+    Returns the path of the fastest variant of `model_path` for this machine
+    (or its INT8 version when `use_int8` is set and one exists).
+    Models that are not .pt (already exported by the user) are returned unchanged,
+    just like .pt models on a machine with a CUDA GPU, where PyTorch is the fastest.
+    """
+    if not model_path.endswith(".pt"):
+        return model_path
+
+    if use_int8:
+        int8_model = find_int8_model(model_path, imgsz)
+        if int8_model:
+            print(f"✅ Using INT8 model: {int8_model}")
+            return int8_model
+        print(f"⚠️ No INT8 version of {os.path.basename(model_path)} (imgsz {imgsz}) found, "
+              f"create it with: python handlers/quantize_model.py {os.path.basename(model_path)} --imgsz {imgsz}")
+
+    if not optimize:
+        return model_path
+
+    import torch
+    if torch.cuda.is_available():
+        return model_path
+
+    folder = cache_dir(model_path, imgsz)
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    choice_file = os.path.join(folder, "benchmark.json")
+
+    with _CacheLock(folder):
+        if os.path.exists(choice_file):
+            with open(choice_file, 'r') as f:
+                backend = json.load(f).get("backend")
+            best = model_path if backend == "pytorch" else exported_path(folder, stem, backend)
+            if backend and os.path.exists(best):
+                print(f"✅ Using {backend} model: {best}")
+                return best
+
+        # Export next to a copy of the weights, so all files of this version stay together
+        local_pt = os.path.join(folder, os.path.basename(model_path))
+        if not os.path.exists(local_pt):
+            shutil.copy2(model_path, local_pt)
+
+        candidates = {"pytorch": model_path}
+        for fmt in EXPORT_FORMATS:
+            target = exported_path(folder, stem, fmt)
+            if not os.path.exists(target):
+                print(f"Optimizing model: exporting {stem} to {fmt} (imgsz {imgsz}), this happens only once...", flush=True)
+                try:
+                    # dynamic: the batches of the inference server and ROI crops change the input shape
+                    YOLO(local_pt, task='detect').export(format=fmt, imgsz=imgsz, dynamic=True)
+                except Exception as e:
+                    print(f"⚠️ Export to {fmt} failed: {e}")
+                    continue
+            if os.path.exists(target):
+                candidates[fmt] = target
+
+        print(f"Optimizing model: benchmarking {', '.join(candidates)}...", flush=True)
+        timings = {}
+        for name, path in candidates.items():
+            ms = benchmark(path, imgsz)
+            if ms is not None:
+                timings[name] = ms
+                print(f"   {name}: {ms:.1f} ms")
+
+        best_name = min(timings, key=timings.get) if timings else "pytorch"
+        best = candidates[best_name]
+        # Without any export there is nothing to choose from, try again on the next start
+        if len(timings) > 1:
+            with open(choice_file, 'w') as f:
+                json.dump({"backend": best_name, "timings_ms": timings}, f, indent=2)
+
+    print(f"✅ Fastest backend on this machine: {best_name}")
+    return best
+
+
+def check_and_download_model(model_filename, download_url, weights_dir):
+    """Checks if the model exists in `weights_dir`, downloads it otherwise. Exits the worker when that fails."""
+    os.makedirs(weights_dir, exist_ok=True)
+    model_local_path = os.path.join(weights_dir, model_filename)
+
+    if os.path.exists(model_local_path):
+        print(f"✅ Model found locally: {model_local_path}")
+        return model_local_path
+
+    print(f"⚠️ Model '{model_filename}' not found locally.")
+    if not download_url:
+        print("❌ Error: No download URL available in settings.")
+        sys.exit(1)
+
+    print(f"⬇️ Starting to download from: {download_url}")
+    print("⏳ Downloading model can take up to multiple minutes...")
+    sys.stdout.flush()
+
+    try:
+        response = requests.get(download_url, stream=True, timeout=30)
+        response.raise_for_status()
+        with open(model_local_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+        print(f"✅ Model successfully downloaded to: {model_local_path}")
+    except Exception as e:
+        print(f"❌ ERROR downloading model: {e}")
+        sys.exit(1)
+    return model_local_path
+
+
+def load_model(model_path, imgsz, settings):
+    """
+    The detection model of a handler: the fastest variant of `model_path` (see select_model(),
+    'auto_optimize_model' and 'use_int8_model' in `settings`), run by the shared inference
+    server when the application has one. Exits the worker when the model cannot be loaded.
+    """
+    use_int8 = settings.get("use_int8_model", False)
+    optimize = settings.get("auto_optimize_model", True)
+    if optimize or use_int8:
+        model_path = select_model(model_path, imgsz, use_int8=use_int8, optimize=optimize)
+
+    print(f"Loading detection model: {model_path}")
+    try:
+        model = connect_inference_server(model_path) or YOLO(model_path, task='detect')
+    except Exception as e:
+        print(f"❌ FATAL ERROR: Could not load model. {e}")
+        sys.exit(1)
+    print("Detection model successfully loaded")
+    return model
@@ -0,0 +1,87 @@
+"""
+Cheap motion pre-filter that decides whether a frame is worth running the model on.
+
+Each frame is shrunk to a small grayscale image and compared against a running
+background average. When hardly any pixels changed, inference can be skipped.
+A keep-alive still lets a frame through every `keepalive` seconds so slow changes
+(a cow lying down for hours) are never missed completely.
+"""
+
+import time
+
+import cv2
+
+MOTION_WIDTH = 160 # Width of the grayscale copy used for differencing
+BACKGROUND_ALPHA = 0.05 # How fast the background average follows the scene
+
+
+class MotionGate:
+    """
+    Frame differencing against a running background on a downscaled grayscale copy.
+
+    `sensitivity` runs from 0.0 (only large motion counts) to 1.0 (almost any change counts).
+    """
+
+    def __init__(self, sensitivity=0.5, keepalive=30):
+        self.sensitivity = min(max(float(sensitivity), 0.0), 1.0)
+        self.keepalive = keepalive
+
+        # Higher sensitivity: smaller pixel difference and smaller changed area needed
+        self.pixel_threshold = int(10 + 40 * (1.0 - self.sensitivity))
+        self.area_threshold = 0.001 + 0.02 * (1.0 - self.sensitivity)
+
+        self.background = None
+        self.last_pass_time = 0
+        self.last_motion = 0.0 # Changed fraction of the last checked frame
+
+        self.stats = {'checked': 0, 'skipped': 0, 'keepalive': 0}
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_WIDTH, max(1, int(h * MOTION_WIDTH / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion(self, frame):
+        """Returns the fraction of pixels that differ from the background, and updates the background."""
+        gray = self._prepare(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype("float32")
+            return 1.0
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(gray, self.background, BACKGROUND_ALPHA)
+        return cv2.countNonZero(mask) / mask.size
+
+    def check(self, frame, now=None):
+        """
+        Returns True when the frame should go to the model: motion was seen,
+        or the keep-alive interval has passed since the last frame let through.
+        """
+        now = time.time() if now is None else now
+        self.stats['checked'] += 1
+        self.last_motion = self.motion(frame)
+
+        if self.last_motion >= self.area_threshold:
+            self.last_pass_time = now
+            return True
+        if now - self.last_pass_time >= self.keepalive:
+            self.last_pass_time = now
+            self.stats['keepalive'] += 1
+            return True
+
+        self.stats['skipped'] += 1
+        return False
+
+    def force(self, frame, now=None):
+        """Keeps the background up to date for a frame that goes to the model regardless (e.g. during an event)."""
+        self.last_motion = self.motion(frame)
+        self.last_pass_time = time.time() if now is None else now
+
+    def skip_ratio(self):
+        checked = self.stats['checked']
+        return self.stats['skipped'] / checked if checked else 0.0
+
+    def stats_line(self):
+        return f"Motion skipped: {self.stats['skipped']}/{self.stats['checked']} ({self.skip_ratio():.0%})"
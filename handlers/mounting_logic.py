@@ -0,0 +1,244 @@
+"""
+Mounting (heat) event logic of the CowCatcher handler.
+
+Takes the detections of every analyzed frame and runs the state machine:
+keep a short history (handlers/history.py), start collecting screenshots when a detection passes the
+save threshold, stop after the collection time or a period of inactivity, and send
+the best screenshots when enough detections passed the notify threshold.
+Used by cowcatcher_handler.py and combined_handler.py.
+
+While an event is collected nothing is written to disk. The event keeps a bounded
+heap of its best `max_screenshots` candidates (JPEG encoded in memory, with their
+detections) and optionally a random archive sample of `event_archive_frames` more. Only
+those are written when the event closes; an event that does not reach
+`min_high_confidence_detections` leaves no files unless `save_rejected_events` is on.
+"""
+
+import os
+import heapq
+import random
+from functools import partial
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from handlers.detections import draw_detections
+from handlers.history import FrameHistory
+from handlers.image_writer import write_now
+
+EVENT_JPEG_QUALITY = 95 # Quality of the candidate frames kept in memory during an event
+
+
+class MountingLogic:
+    def __init__(self, settings, notify_threshold, save_folder, send_photo, evidence=None, evidence_timeout=0.1,
+                 persist=None, writer=None, max_rate=10.0, send_album=None):
+        """
+        settings: the 'cowcatcher_settings' of config.json.
+        send_photo(path, caption, disable_notification): queues a Telegram photo.
+        evidence: optional EvidenceStream, screenshots are taken from it while collecting.
+        persist(job): runs the disk writes, annotation and sending of a closed event (a callable
+        without arguments) in order, e.g. on the persist stage of the pipeline. Default: right away.
+        writer: optional ImageWriter for the screenshots (default: written right away).
+        max_rate: highest analyzed frames per second, sizes the history buffer.
+        send_album(paths, caption, disable_notification): queues the captures of an event as one
+        Telegram album (default: one send_photo per capture).
+        """
+        self.notify_threshold = notify_threshold
+        self.save_folder = save_folder
+        self.send_photo = send_photo
+        self.send_album = send_album
+        self.evidence = evidence
+        self.evidence_timeout = evidence_timeout
+        self.persist = persist or (lambda job: job())
+        self.write_image = writer.write if writer else write_now
+
+        self.sound_every_n_notifications = settings.get("sound_every_n_notifications", 5)
+        self.save_threshold = settings.get("save_threshold", 0.83)
+        self.min_high_confidence_detections = settings.get("min_high_confidence_detections", 3)
+        self.max_screenshots = settings.get("max_screenshots", 2)
+        self.archive_frames = settings.get("event_archive_frames", 0)
+        self.save_rejected_events = settings.get("save_rejected_events", False)
+        self.send_annotated_images = settings.get("send_annotated_images", True)
+        self.collection_time = settings.get("collection_time", 50)
+        self.inactivity_stop_time = settings.get("inactivity_stop_time", 6)
+        self.cooldown_period = settings.get("cooldown_period", 40)
+
+        self.last_detection_time = None
+        self.notification_counter = 0
+        self.last_conf = 0.0 # Highest confidence of the last analyzed frame
+        # history_as_jpeg forces JPEG, otherwise only streams above JPEG_AUTO_PIXELS are kept as JPEG
+        self.history = FrameHistory(settings.get("history_seconds", 2), max_rate,
+                                    as_jpeg=settings.get("history_as_jpeg", False) or "auto", jpeg_quality=EVENT_JPEG_QUALITY,
+                                    max_bytes=settings.get("history_max_mb", 64) * 1024 * 1024)
+        self.collecting = False
+        self.collection_start_time = None
+        self.event_top = [] # Min-heap of (conf, seq, candidate), the best max_screenshots of the event
+        self.event_archive = [] # Random sample of event_archive_frames candidates
+        self.event_count = 0 # Detections above the save threshold in this event
+        self.event_valid = 0 # Of which above the notify threshold
+        self.inactivity_period = 0
+
+    @staticmethod
+    def format_timestamp_for_display(ts):
+        return f"{ts[6:8]}-{ts[4:6]}-{ts[:4]}"
+
+    def update(self, detections, frame, capture_time):
+        """Processes the mounting Detections (class 0) of one analyzed frame."""
+        highest_conf = detections.max_conf()
+        self.last_conf = highest_conf
+
+        current_time = datetime.fromtimestamp(capture_time)
+        timestamp = current_time.strftime("%Y%m%d_%H%M%S")
+
+        # Maintain history. Only frames above the save threshold can ever join an event, the others keep no image.
+        self.history.append(capture_time, frame if highest_conf >= self.save_threshold else None,
+                            (highest_conf, timestamp, detections))
+
+        can_send_notification = (self.last_detection_time is None or
+                                 (current_time - self.last_detection_time).total_seconds() > self.cooldown_period)
+
+        # Start condition
+        if highest_conf >= self.save_threshold and not self.collecting and can_send_notification:
+            self._start_collection(current_time)
+
+        if self.collecting:
+            self._collect(detections, frame, highest_conf, current_time, timestamp)
+
+        if self.evidence and not self.collecting:
+            self.evidence.close_if_idle()
+
+    def _start_collection(self, current_time):
+        print(f"Starting screenshot collection for {self.collection_time} seconds")
+        self.collecting = True
+        self.collection_start_time = current_time
+        self.event_top = []
+        self.event_archive = []
+        self.event_count = 0
+        self.event_valid = 0
+        if self.evidence: self.evidence.open()
+
+        # Add history to event. The current frame is in the history too, but is added by _collect().
+        for _, hist_image, (hist_conf, hist_ts, hist_detections) in self.history.entries(skip_newest=1):
+            if hist_image is not None:
+                self._add_candidate(hist_conf, hist_image, hist_ts, hist_detections, "_history")
+
+    def _add_candidate(self, conf, image, ts, detections, suffix=""):
+        """Keeps the detection if it is among the best of the event or drawn for the archive sample."""
+        self.event_count += 1
+        self.event_valid += conf >= self.notify_threshold
+
+        # max_screenshots 0 keeps no top screenshots, the heap stays empty
+        in_top = len(self.event_top) < self.max_screenshots or (self.max_screenshots > 0 and conf > self.event_top[0][0])
+        # Reservoir sampling: every detection of the event has the same chance to be archived
+        archive_slot = None
+        if len(self.event_archive) < self.archive_frames:
+            archive_slot = len(self.event_archive)
+            self.event_archive.append(None)
+        elif self.archive_frames:
+            slot = random.randrange(self.event_count)
+            archive_slot = slot if slot < self.archive_frames else None
+        if not in_top and archive_slot is None:
+            return
+
+        # Encoded only when kept, a detection that is not among the best costs nothing
+        if isinstance(image, bytes):
+            jpeg = image # Already encoded in the history
+        else:
+            ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, EVENT_JPEG_QUALITY])
+            if not ok:
+                return
+            jpeg = jpeg.tobytes()
+        candidate = {'conf': conf, 'ts': ts, 'jpeg': jpeg, 'detections': detections, 'suffix': suffix}
+        if in_top:
+            entry = (conf, self.event_count, candidate)
+            if len(self.event_top) < self.max_screenshots:
+                heapq.heappush(self.event_top, entry)
+            else:
+                heapq.heapreplace(self.event_top, entry)
+        if archive_slot is not None:
+            self.event_archive[archive_slot] = candidate
+
+    def _collect(self, detections, frame, highest_conf, current_time, timestamp):
+        if highest_conf >= self.save_threshold:
+            ev_frame = self.evidence.frame(timeout=self.evidence_timeout) if self.evidence else None
+            self._add_candidate(highest_conf, ev_frame if ev_frame is not None else frame, timestamp, detections)
+
+            self.inactivity_period = 0
+            self.last_detection_time = current_time
+            # Collection continues until time runs out or inactivity threshold is met.
+        elif self.last_detection_time is not None:
+            self.inactivity_period = (current_time - self.last_detection_time).total_seconds()
+
+        collection_duration = (current_time - self.collection_start_time).total_seconds()
+        if collection_duration >= self.collection_time or self.inactivity_period >= self.inactivity_stop_time:
+            self._stop_collection(current_time)
+
+    def _stop_collection(self, current_time):
+        print(f"Collection stopped. Detections: {self.event_count}")
+
+        # Best first
+        top_selection = [c for _, _, c in sorted(self.event_top, key=lambda x: (x[0], x[1]), reverse=True)]
+        archive = [c for c in self.event_archive if c is not None and not any(c is t for t in top_selection)]
+
+        if self.event_valid >= self.min_high_confidence_detections:
+            self.notification_counter += 1
+            play_sound = (self.notification_counter % self.sound_every_n_notifications == 0)
+            # Writes and sends on the persist stage, off the detection path
+            self.persist(partial(self._send_event, top_selection, archive, play_sound))
+
+            self.last_detection_time = current_time
+        elif self.save_rejected_events and (top_selection or archive):
+            self.persist(partial(self._write_candidates, top_selection + archive))
+            print(f"Event rejected, {len(top_selection) + len(archive)} screenshots kept")
+
+        self.event_top = []
+        self.event_archive = []
+        self.collecting = False
+
+    def _path(self, candidate):
+        return os.path.join(self.save_folder,
+                            f"mounting_detected_{candidate['ts']}_conf{candidate['conf']:.2f}{candidate['suffix']}.jpg")
+
+    def _write_candidates(self, candidates):
+        for candidate in candidates:
+            self.write_image(self._path(candidate), candidate['jpeg'])
+
+    def _send_event(self, top_selection, archive, play_sound):
+        self._write_candidates(archive)
+        captures = []
+        for candidate in top_selection:
+            conf, ts = candidate['conf'], candidate['ts']
+            orig_path = self._path(candidate)
+            # The screenshots that are sent must not be dropped
+            if self.write_image(orig_path, candidate['jpeg'], block=True).result() is None:
+                print(f"⚠️ Screenshot was not saved, not sending it: {orig_path}")
+                continue
+            final_send_path = orig_path
+
+            # Annotate if desired
+            if self.send_annotated_images and len(candidate['detections']):
+                annotated_path = orig_path.replace(".jpg", "_annotated.jpg")
+                # Saved image may come from the evidence stream, the boxes are drawn at its resolution.
+                # The decoded image is ours, so they are drawn on it directly.
+                saved_img = cv2.imdecode(np.frombuffer(candidate['jpeg'], np.uint8), cv2.IMREAD_COLOR)
+                annotated_img = draw_detections(saved_img, candidate['detections'])
+                if self.write_image(annotated_path, annotated_img, block=True).result():
+                    final_send_path = annotated_path
+
+            captures.append((final_send_path, conf, ts))
+
+        sound_icon = "🔊" if play_sound else "🔇"
+        if self.send_album and len(captures) > 1:
+            # One album per chat, the caption on the first (best) capture
+            paths, confs, timestamps = zip(*captures)
+            msg = (f"{sound_icon} Mounting detected {self.format_timestamp_for_display(timestamps[0])} - Conf: {confs[0]:.2f}\n"
+                   f"{len(captures)} captures ({', '.join(f'{c:.2f}' for c in confs)})")
+            self.send_album(list(paths), msg, disable_notification=not play_sound)
+            print(f"Telegram album queued: {len(captures)} captures")
+            return
+
+        for idx, (final_send_path, conf, ts) in enumerate(captures):
+            msg = f"{sound_icon} Mounting detected {self.format_timestamp_for_display(ts)} - Conf: {conf:.2f}\nCapture {idx+1}/{len(captures)}"
+            self.send_photo(final_send_path, msg, disable_notification=not play_sound)
+            print(f"Telegram queued: {conf:.2f}")
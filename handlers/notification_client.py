@@ -0,0 +1,105 @@
+"""
+Client side of the notification gateway (see notification_gateway.py).
+
+The ProcessManager passes the gateway address and auth key to the camera workers
+through environment variables. A worker hands its notifications (the image paths
+are already on disk) to the gateway instead of sending them to Telegram itself; the
+gateway stores them and does the rate limiting, deduplication and fan-out to the
+chats for all cameras. Each notification carries an id that is unique per worker
+(its outbox item), so the gateway can drop one that is handed over twice.
+Telegram commands are polled by the gateway as well (one poller per bot), the
+workers fetch the ones meant for them with commands().
+"""
+
+import os
+import threading
+from multiprocessing.connection import Client
+
+ADDRESS_ENV = "COWCATCHER_GATEWAY_ADDRESS"
+AUTHKEY_ENV = "COWCATCHER_GATEWAY_AUTHKEY"
+REPLY_TIMEOUT = 10 # Seconds, the gateway only stores the notification before it answers
+
+
+def gateway_address():
+    """Returns ((host, port), authkey) from the environment, or None when no gateway is configured."""
+    address = os.environ.get(ADDRESS_ENV)
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not address or not authkey:
+        return None
+    host, port = address.rsplit(":", 1)
+    return (host, int(port)), authkey.encode()
+
+
+class GatewayClient:
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.conn = None
+        self.lock = threading.Lock()
+        self.rejected = False # The last notification was refused by the gateway (not just unreachable)
+
+    def notify(self, token, chat_ids, priority, kind, args, key=None):
+        """
+        Hands a notification to the gateway: `kind` 'photo' (path, caption, silent),
+        'album' (paths, caption, silent) or 'message' (text[, silent]). `key` identifies it
+        for the deduplication (the same key within the window is sent once), None sends it anyway.
+        Returns True once the gateway has stored it, False when it is not reachable
+        or refused it (`rejected`).
+        """
+        self.rejected = False
+        reply = self._request(("notify", token, list(chat_ids), priority, kind, list(args), key))
+        if reply is None:
+            return False
+        if reply[0] == "error":
+            print(f"ERROR from notification gateway: {reply[1]}", flush=True)
+            self.rejected = True
+            return False
+        return True
+
+    def commands(self, token, camera_id, camera_name, chat_ids):
+        """
+        Telegram commands for this camera that the gateway received since the last call
+        (a list of texts), or None when the gateway is not reachable. The first call
+        subscribes the camera: commands arrive only from then on.
+        """
+        reply = self._request(("commands", token, camera_id, camera_name, list(chat_ids)))
+        if reply is None or reply[0] == "error":
+            return None
+        return reply[1]
+
+    def _request(self, message):
+        """Sends `message` and returns the reply, or None when the gateway is not reachable."""
+        with self.lock:
+            try:
+                # Connected on first use, and again after a gateway restart
+                if self.conn is None:
+                    self.conn = Client(self.address, authkey=self.authkey)
+                self.conn.send(message)
+                if not self.conn.poll(REPLY_TIMEOUT):
+                    raise OSError("no reply")
+                return self.conn.recv()
+            except (EOFError, OSError) as e:
+                print(f"⚠️ Notification gateway not reachable: {e}", flush=True)
+                self.close()
+                return None
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+
+
+def connect_gateway():
+    """
+    Returns a GatewayClient when the ProcessManager runs a notification gateway,
+    or None so the handler sends to Telegram itself.
+    """
+    config = gateway_address()
+    if config is None:
+        return None
+    address, authkey = config
+    print(f"Using notification gateway at {address[0]}:{address[1]}")
+    return GatewayClient(address, authkey)
@@ -0,0 +1,243 @@
+"""
+Notification gateway.
+
+Started once by the ProcessManager instead of every camera worker testing the bot and
+sending to Telegram on its own threads. Workers hand over their notifications over a
+local connection (see notification_client.py); images are passed as paths, they are
+already on disk. Per bot the gateway keeps one outbox and one sender thread, so the
+rate limiter of the bot covers all cameras, the same notification handed over twice
+(e.g. sent again by a worker that missed the reply) is sent once, and every photo is
+uploaded once and sent to the other chats by file_id. Duplicates are recognized by the
+id the worker sends along, never by the content: the same status text from two cameras
+is two notifications.
+
+The Telegram commands (manual calving check) are polled here too, once per bot:
+several cameras polling getUpdates with the same token take each other's updates.
+A command goes to every subscribed camera of the bot that sends to the chat it
+came from, or only to the cameras whose name it mentions.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from multiprocessing.connection import Listener
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.notification_client import gateway_address
+from logic.telegram_client import TelegramClient
+from logic.outbox import Outbox, PRIORITIES
+
+# --- PATH SETUP ---
+BASE_DIR = os.getcwd()
+CONFIG_PATH = os.path.join(BASE_DIR, "settings", "config.json")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+STATS_INTERVAL = 60 # Seconds between the statistics lines
+MAX_PENDING_COMMANDS = 20 # Per camera, for a camera that stopped fetching them
+
+# --- LOAD CONFIG ---
+try:
+    with open(CONFIG_PATH, 'r') as f:
+        config = json.load(f)
+except Exception as e:
+    print(f"WARNING: Loading config failed ({CONFIG_PATH}): {e}, using defaults")
+    config = {}
+settings = config.get("notification_gateway", {})
+
+DEDUP_WINDOW = settings.get("dedup_window", 60) # Seconds a notification counts as a duplicate
+
+outboxes = {}
+recent = {}
+subscribers = {} # token -> {camera_id: {'name', 'chat_ids', 'commands'}}
+lock = threading.Lock()
+stats = {'received': 0, 'duplicates': 0, 'sent': 0, 'failed': 0, 'bytes_saved': 0, 'clients': 0, 'commands': 0}
+
+
+def bot_outbox(token):
+    """Outbox of a bot, with its sender thread started on first use."""
+    with lock:
+        if token not in outboxes:
+            name = hashlib.sha1(token.encode()).hexdigest()[:12]
+            outboxes[token] = Outbox(os.path.join(DATA_DIR, "outbox", f"gateway_{name}.sqlite3"))
+            threading.Thread(target=sender, args=(token, outboxes[token]), daemon=True).start()
+        return outboxes[token]
+
+
+def is_duplicate(token, key):
+    """True when the bot got a notification with this id (camera and outbox item) within DEDUP_WINDOW."""
+    if key is None:
+        return False
+    key = (token, key)
+    now = time.time()
+    with lock:
+        for old_key in [k for k, t in recent.items() if now - t > DEDUP_WINDOW]:
+            del recent[old_key]
+        if key in recent:
+            return True
+        recent[key] = now
+    return False
+
+
+def send(telegram, chat_ids, kind, args):
+    """Sends one notification to all chats. Returns True when at least one chat got it."""
+    saved = 0
+    if kind == 'photo':
+        path, caption, silent = args
+        sent, saved = telegram.send_photo_to_chats(chat_ids, path, caption, silent)
+    elif kind == 'album':
+        paths, caption, silent = args
+        sent, saved = telegram.send_album_to_chats(chat_ids, paths, caption, silent)
+    elif kind == 'message':
+        text, silent = args[0], args[1] if len(args) > 1 else False
+        sent = sum(bool(telegram.send_message(chat_id, text, disable_notification=silent)) for chat_id in chat_ids)
+        if sent < len(chat_ids):
+            print(f"ERROR sending Telegram message: {telegram.last_error}")
+    else:
+        print(f"WARNING: Unknown notification '{kind}' dropped")
+        return True
+    stats['bytes_saved'] += saved
+    return sent > 0
+
+
+def sender(token, outbox):
+    telegram = TelegramClient.for_token(token)
+    if telegram.call("getMe", timeout=10, attempts=1):
+        print("Telegram bot connection successfully tested.", flush=True)
+    else:
+        print(f"⚠️ Telegram connection test failed: {telegram.last_error}", flush=True)
+
+    while True:
+        task = outbox.get()
+        if task is None: break
+        item_id, _, kind, (chat_ids, args) = task
+        try:
+            result = send(telegram, chat_ids, kind, args)
+            permanent = telegram.last_error_permanent
+        except Exception as e:
+            print(f"ERROR in notification sender: {e}")
+            result, permanent = False, True
+
+        stats['sent' if result else 'failed'] += 1
+        # Failed sends stay in the outbox and are tried again later, an outage does not use up the attempts
+        if result:
+            outbox.done(item_id)
+        else:
+            outbox.retry(item_id, permanent=permanent)
+
+
+def command_poller(token):
+    """Polls the Telegram commands of a bot and queues each for the cameras it is meant for."""
+    telegram = TelegramClient.for_token(token)
+    last_id = 0
+    while True:
+        try:
+            updates = telegram.call("getUpdates", data={'offset': last_id + 1, 'timeout': 10}, timeout=15, attempts=1)
+            for u in updates or []:
+                last_id = u["update_id"]
+                message = u.get("message", {})
+                route_command(token, str(message.get("chat", {}).get("id")), message.get("text", ""))
+        except Exception as e:
+            print(f"ERROR in command poller: {e}")
+        time.sleep(2)
+
+
+def route_command(token, chat_id, text):
+    with lock:
+        cameras = [c for c in subscribers.get(token, {}).values() if chat_id in c['chat_ids']]
+        named = [c for c in cameras if c['name'] and c['name'].lower() in text.lower()]
+        for camera in named or cameras:
+            camera['commands'].append(text)
+    stats['commands'] += 1
+
+
+def fetch_commands(token, camera_id, camera_name, chat_ids):
+    """Pending commands of a camera. The first call subscribes it (and starts the poller of the bot)."""
+    with lock:
+        if token not in subscribers:
+            subscribers[token] = {}
+            threading.Thread(target=command_poller, args=(token,), daemon=True).start()
+        camera = subscribers[token].setdefault(camera_id, {'commands': deque(maxlen=MAX_PENDING_COMMANDS)})
+        # A restarted worker may come back with other settings
+        camera['name'] = camera_name
+        camera['chat_ids'] = {str(chat_id) for chat_id in chat_ids}
+        commands = list(camera['commands'])
+        camera['commands'].clear()
+    return commands
+
+
+def serve_client(conn):
+    """Stores the notifications of one camera worker in the outbox of its bot, hands it its commands."""
+    stats['clients'] += 1
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == "commands":
+                _, token, camera_id, camera_name, chat_ids = message
+                conn.send(("ok", fetch_commands(token, camera_id, camera_name, chat_ids)))
+                continue
+            if message[0] != "notify":
+                conn.send(("error", f"Unknown request '{message[0]}'"))
+                continue
+
+            _, token, chat_ids, priority, kind, args, key = message
+            if not token or priority not in PRIORITIES:
+                conn.send(("error", "Notification without bot token or with unknown priority"))
+                continue
+            stats['received'] += 1
+            if is_duplicate(token, key):
+                stats['duplicates'] += 1
+            else:
+                bot_outbox(token).put(priority, kind, chat_ids, args)
+            conn.send(("ok",))
+    except (EOFError, OSError):
+        pass
+    finally:
+        stats['clients'] -= 1
+        conn.close()
+
+
+def stats_loop():
+    while True:
+        time.sleep(STATS_INTERVAL)
+        with lock:
+            pending = sum(outbox.pending() for outbox in outboxes.values())
+        print(f"Notification gateway: {stats['received']} received | Duplicates: {stats['duplicates']} | "
+              f"Sent: {stats['sent']} (upload saved {stats['bytes_saved'] / 1e6:.1f}MB) | Failed: {stats['failed']} | "
+              f"Pending: {pending} | Clients: {stats['clients']} | Bots: {len(outboxes)} | Commands: {stats['commands']}", flush=True)
+
+
+def main():
+    gateway = gateway_address()
+    if gateway is None:
+        print("ERROR: Notification gateway address not set, it is started by the application.")
+        sys.exit(1)
+    address, authkey = gateway
+
+    listener = Listener(address, authkey=authkey)
+    print(f"Notification gateway listening on {address[0]}:{address[1]} (duplicates within {DEDUP_WINDOW}s dropped)", flush=True)
+    threading.Thread(target=stats_loop, daemon=True).start()
+    # Notifications left from before a restart are sent without waiting for a camera
+    for bot in config.get("telegram", {}).get("bots", []):
+        if bot.get("enabled") and bot.get("token"):
+            bot_outbox(bot["token"])
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            # Wrong auth key or a client that disconnected during the handshake
+            print(f"WARNING: Rejected connection: {e}")
+            continue
+        threading.Thread(target=serve_client, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Notification gateway stopped")
@@ -0,0 +1,198 @@
+"""
+Telegram notifications of a camera worker, shared by the three handlers.
+
+Notifications are stored in the persistent outbox of the camera (logic/outbox.py)
+and sent by one thread: handed to the notification gateway when the application
+runs one, otherwise sent straight to Telegram with the shared client of the bot.
+The calving handlers also get the manual check commands: from the gateway, which
+polls the bot once for all cameras, or by polling the bot themselves.
+"""
+
+import os
+import time
+import threading
+
+from handlers.notification_client import connect_gateway
+from logic.telegram_client import TelegramClient
+from logic.outbox import Outbox
+
+
+def telegram_settings(config, camera):
+    """
+    Bot token and chat ids of a camera: its 'telegram_bot', or the first enabled bot
+    when it has none. Returns (None, []) when there is no enabled bot.
+    """
+    bot_name = camera.get("telegram_bot", "")
+    telegram_config = config.get("telegram", {})
+    bots = [b for b in telegram_config.get("bots", []) if b.get("enabled")]
+    token = next((b["token"] for b in bots if not bot_name or b["name"] == bot_name), None)
+    if token is None:
+        print(f"⚠️ WARNING: No active Telegram bot found (searched for '{bot_name}').")
+        print("   -> Script continues without notifications.")
+        return None, []
+
+    chat_ids = [u["chat_id"] for u in telegram_config.get("users", []) if u.get("enabled")]
+    if not chat_ids:
+        print("⚠️ WARNING: Bot found, but no active users (chat_ids) found.")
+    return token, chat_ids
+
+
+class Notifier:
+    def __init__(self, camera_id, token, chat_ids, data_dir, camera_name=None):
+        self.camera_id = camera_id
+        self.camera_name = camera_name # Commands that mention it are only for this camera (with the gateway)
+        self.token = token
+        self.chat_ids = chat_ids
+        # Without a bot or chats nothing is queued: the send_* methods do nothing
+        enabled = bool(token and chat_ids)
+        # Shared client of the bot: keep-alive connection, retries and rate limiting
+        self.telegram = TelegramClient.for_token(token) if enabled else None
+        # Pending notifications are kept on disk, sent by priority and replayed after a restart
+        self.outbox = Outbox(os.path.join(data_dir, "outbox", f"{camera_id}.sqlite3")) if enabled else None
+        # When the application runs a notification gateway, it sends for all cameras
+        self.gateway = connect_gateway() if enabled else None
+        self.thread = None
+        self.stats = {'sent': 0, 'failed': 0, 'bytes_saved': 0}
+        if enabled:
+            print(f"Telegram bot active for {len(chat_ids)} chat(s)")
+
+    def start(self, handle_command=None):
+        """
+        Starts the sender thread, and with `handle_command(text)` -> reply or None also
+        the listener for Telegram commands. Returns False when no bot is configured.
+        """
+        if self.telegram is None:
+            return False
+        # The gateway tests the bot once for all cameras. A failed test is only reported:
+        # the notifications wait in the outbox until Telegram can be reached
+        if not self.gateway:
+            self.test_connection()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        if handle_command:
+            threading.Thread(target=self._command_listener, args=(handle_command,), daemon=True).start()
+        print("Telegram worker thread started")
+        return True
+
+    def test_connection(self):
+        if self.telegram.call("getMe", timeout=10, attempts=1):
+            print("Telegram bot connection successfully tested.")
+            return True
+        print(f"⚠️ Telegram connection test failed: {self.telegram.last_error}")
+        return False
+
+    def _worker(self):
+        while True:
+            task = self.outbox.get()
+            if task is None: break
+            item_id, priority, kind, args = task
+            try:
+                if self.gateway:
+                    # Rate limiting, deduplication and fan-out to the chats happen in the gateway
+                    # The outbox id makes a notification handed over twice recognizable
+                    result = self.gateway.notify(self.token, self.chat_ids, priority, kind, args,
+                                                 key=f"{self.camera_id}:{item_id}")
+                    permanent = self.gateway.rejected
+                else:
+                    result = self.send_now(kind, args)
+                    permanent = self.telegram.last_error_permanent
+            except Exception as e:
+                print(f"ERROR in telegram worker: {str(e)}")
+                result, permanent = False, True
+
+            self.stats['sent' if result else 'failed'] += 1
+            # Failed sends stay in the outbox and are tried again later,
+            # an outage (gateway or Telegram not reachable) does not use up the attempts
+            if result:
+                self.outbox.done(item_id)
+            else:
+                self.outbox.retry(item_id, permanent=permanent)
+
+    def send_now(self, kind, args):
+        """Sends a notification straight to Telegram. Returns True when at least one chat got it."""
+        # No bot configured: nothing to send with
+        if self.telegram is None or not self.chat_ids:
+            return False
+
+        saved = 0
+        if kind == 'photo':
+            # Uploaded once, the other chats get it by file_id
+            path, caption, silent = args
+            sent, saved = self.telegram.send_photo_to_chats(self.chat_ids, path, caption, silent)
+        elif kind == 'album':
+            # One sendMediaGroup per chat (split at Telegram's album limit), uploaded once
+            paths, caption, silent = args
+            sent, saved = self.telegram.send_album_to_chats(self.chat_ids, paths, caption, silent)
+        else:
+            text, silent = args[0], args[1] if len(args) > 1 else False
+            sent = 0
+            for chat_id in self.chat_ids:
+                if self.telegram.send_message(chat_id, text, disable_notification=silent):
+                    sent += 1
+                else:
+                    print(f"ERROR sending Telegram message to chat {chat_id}: {self.telegram.last_error}")
+        self.stats['bytes_saved'] += saved
+        return sent > 0
+
+    def _command_listener(self, handle_command):
+        """Telegram commands for the manual calving check ('check'/'start'/'stop')."""
+        last_id = 0
+        while True:
+            if self.gateway:
+                # Several cameras polling the same bot would take each other's updates
+                commands = self.gateway.commands(self.token, self.camera_id, self.camera_name, self.chat_ids)
+                for text in commands or []:
+                    reply = handle_command(text)
+                    if reply:
+                        self.send_message(reply, priority="manual")
+                time.sleep(2 if commands is not None else 10)
+                continue
+            try:
+                updates = self.telegram.call("getUpdates", data={'offset': last_id + 1, 'timeout': 10}, timeout=15, attempts=1)
+                for u in updates or []:
+                    last_id = u["update_id"]
+                    reply = handle_command(u.get("message", {}).get("text", ""))
+                    if reply:
+                        self.send_message(reply, priority="manual")
+            except Exception: pass
+            time.sleep(2)
+
+    # --- Queued notifications (see logic/outbox.py for the priorities) ---
+    def send_photo(self, path, caption, disable_notification=False, priority="event"):
+        return self._queue(priority, 'photo', path, caption, disable_notification)
+
+    def send_album(self, paths, caption, disable_notification=False):
+        return self._queue("event", 'album', paths, caption, disable_notification)
+
+    def send_message(self, text, priority="status", disable_notification=False):
+        return self._queue(priority, 'message', text, disable_notification)
+
+    def _queue(self, priority, kind, *args):
+        if self.outbox is None:
+            return False
+        self.outbox.put(priority, kind, *args)
+        return True
+
+    def close(self, final_message=None):
+        """
+        Stops the sender thread, pending notifications stay in the outbox for the next start.
+        `final_message` (e.g. why the worker stops) is sent right away instead.
+        """
+        if self.outbox is None:
+            return
+        self.outbox.close()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        if final_message:
+            args = [final_message, False]
+            if not (self.gateway and self.gateway.notify(self.token, self.chat_ids, "status", 'message', args)):
+                self.send_now('message', args)
+
+    def stats_line(self):
+        if self.outbox is None:
+            return "Telegram: off"
+        line = (f"{self.outbox.stats_line()} | Sent: {self.stats['sent']} "
+                f"(upload saved {self.stats['bytes_saved'] / 1e6:.1f}MB)")
+        if self.telegram:
+            line += f" | {self.telegram.stats_line()}"
+        return line
@@ -0,0 +1,137 @@
+"""
+Handler pipeline: each step of the detection loop on its own thread.
+
+A source (reading frames from the FrameGrabber) feeds a chain of stages through
+small bounded queues, e.g. preprocess -> inference -> events -> persist. While the
+model runs on one frame, the next frame is already being cropped and the previous
+one is being written to disk, so the frame rate is set by the slowest stage instead
+of the sum of all stages. A full queue blocks the stage before it, so a slow stage
+never makes the queues grow; the FrameGrabber drops the frames nobody took.
+
+Every stage keeps its own timing, see stats_line().
+"""
+
+import time
+import threading
+from queue import Queue, Empty, Full
+
+QUEUE_SIZE = 2 # Items waiting between two stages
+POLL_INTERVAL = 0.5 # Seconds between stop checks of a waiting stage
+
+
+class Stage:
+    """
+    One pipeline step. `func(item)` returns the item for the next stage,
+    or None to drop it (e.g. a frame without motion).
+    """
+
+    def __init__(self, name, func, queue_size=QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.inbox = Queue(maxsize=queue_size)
+        self.items = 0
+        self.busy = 0.0 # Seconds spent in func
+        self._window = (0, 0.0, time.time()) # items, busy, time at the last stats_line()
+
+    def run_one(self, item):
+        start = time.perf_counter()
+        out = self.func(item)
+        self.busy += time.perf_counter() - start
+        # The source returns None while it waits for a frame, that is not an item
+        self.items += item is not None or out is not None
+        return out
+
+    def window_stats(self):
+        """(items, ms per item, load, seconds) since the previous call; load is the fraction of time the stage was busy."""
+        items, busy, since = self._window
+        now = time.time()
+        self._window = (self.items, self.busy, now)
+        n = self.items - items
+        ms = (self.busy - busy) * 1000 / n if n else 0.0
+        load = (self.busy - busy) / (now - since) if now > since else 0.0
+        return n, ms, load, now - since
+
+
+class Pipeline:
+    """
+    Runs `source()` and the stages on their own threads.
+
+    `source()` returns the next item or None when there is none yet (it should wait a
+    little itself). An exception in any stage stops the pipeline; it is available as
+    `error` and re-raised by check().
+    """
+
+    def __init__(self, source, stages, source_name="capture", queue_size=QUEUE_SIZE):
+        self.source = Stage(source_name, lambda _: source())
+        self.stages = [Stage(name, func, queue_size) for name, func in stages]
+        self.running = False
+        self.error = None
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        targets = [self.source] + self.stages
+        for i, stage in enumerate(targets):
+            outbox = targets[i + 1].inbox if i + 1 < len(targets) else None
+            loop = self._source_loop if stage is self.source else self._stage_loop
+            thread = threading.Thread(target=loop, args=(stage, outbox), name=f"pipeline-{stage.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+    def check(self):
+        """Re-raises the exception that stopped the pipeline (call it from the main thread)."""
+        if self.error is not None:
+            raise self.error
+        return self.running
+
+    def _fail(self, stage, e):
+        print(f"ERROR in pipeline stage '{stage.name}': {e}", flush=True)
+        self.error = e
+        self.running = False
+
+    def _put(self, outbox, item):
+        while self.running:
+            try:
+                outbox.put(item, timeout=POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def _source_loop(self, stage, outbox):
+        while self.running:
+            try:
+                item = stage.run_one(None)
+            except Exception as e:
+                self._fail(stage, e)
+                return
+            if item is not None:
+                self._put(outbox, item)
+
+    def _stage_loop(self, stage, outbox):
+        while self.running:
+            try:
+                item = stage.inbox.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+            try:
+                item = stage.run_one(item)
+            except Exception as e:
+                self._fail(stage, e)
+                return
+            if item is not None and outbox is not None:
+                self._put(outbox, item)
+
+    def stats_line(self):
+        """Frames per second taken from the source, then per stage: ms per item, load and queued items."""
+        n, ms, load, seconds = self.source.window_stats()
+        parts = [f"{self.source.name} {ms:.1f}ms"]
+        for stage in self.stages:
+            _, stage_ms, stage_load, _ = stage.window_stats()
+            parts.append(f"{stage.name} {stage_ms:.1f}ms {stage_load:.0%} q{stage.inbox.qsize()}")
+        fps = n / seconds if seconds else 0.0
+        return f"Pipeline {fps:.1f} fps ({', '.join(parts)})"
@@ -0,0 +1,249 @@
+"""
+INT8 quantization tool.
+
+Builds an INT8 ONNX or OpenVINO version of a .pt model, calibrated on frames the
+handlers saved in data/ (real images from our own barns), and compares it with the
+FP32 version on the same images:
+
+    python handlers/quantize_model.py cowcatcherV15.pt
+    python handlers/quantize_model.py calvingcatcherV1.pt --format onnx --samples 200 --data data/Camera_1
+
+The result is stored with the automatic exports in weights/<model>_<hash>_<imgsz>/.
+Switch on 'use_int8_model' in the CowCatcher/CalvingCatcher settings to let the
+handlers load it.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import argparse
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# Handlers are started as scripts, make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handlers.model_loader import cache_dir, exported_path, int8_path
+
+# --- PATH SETUP ---
+BASE_DIR = os.getcwd()
+WEIGHTS_DIR = os.path.join(BASE_DIR, "weights")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+QUANT_FORMATS = ["openvino", "onnx"]
+MATCH_IOU = 0.5 # Boxes of FP32 and INT8 with at least this overlap count as the same detection
+DECISION_CONF = 0.8 # Confidence used to compare the save/notify decisions of both models
+
+
+def find_images(folders, samples, seed=0):
+    """Random sample of the saved frames (annotated copies are skipped, they contain drawn boxes)."""
+    paths = []
+    for folder in folders:
+        paths += glob.glob(os.path.join(folder, "**", "*.jpg"), recursive=True)
+    paths = sorted(p for p in paths if not p.endswith("_annotated.jpg") and "calving_alarm_" not in os.path.basename(p))
+    random.Random(seed).shuffle(paths)
+    return paths[:samples]
+
+
+def letterbox(image, imgsz):
+    """Resize with unchanged aspect ratio and pad to imgsz x imgsz, like YOLO does."""
+    h, w = image.shape[:2]
+    r = imgsz / max(h, w)
+    nh, nw = round(h * r), round(w * r)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas
+
+
+def calibration_tensors(paths, imgsz):
+    """Model input tensors (1, 3, imgsz, imgsz), RGB, 0-1."""
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        image = letterbox(image, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+        yield np.ascontiguousarray(image[None], dtype=np.float32) / 255.0
+
+
+class CalibrationSet:
+    """Re-iterable calibration_tensors(): NNCF may pass over the data more than once, one tensor is made at a time."""
+
+    def __init__(self, paths, imgsz):
+        self.paths = paths
+        self.imgsz = imgsz
+
+    def __iter__(self):
+        return calibration_tensors(self.paths, self.imgsz)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+def quantize_onnx(fp32_file, target, paths, imgsz):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(fp32_file, load_external_data=False).graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.tensors = calibration_tensors(paths, imgsz)
+
+        def get_next(self):
+            tensor = next(self.tensors, None)
+            return None if tensor is None else {input_name: tensor}
+
+    quantize_static(fp32_file, target, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+
+    # Keep the ultralytics metadata (class names, stride, imgsz), YOLO() needs it to load the model
+    fp32, int8 = onnx.load(fp32_file), onnx.load(target)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, target)
+
+
+def quantize_openvino(fp32_dir, target, paths, imgsz, head_index):
+    import nncf
+    import openvino as ov
+
+    xml = glob.glob(os.path.join(fp32_dir, "*.xml"))[0]
+    model = ov.Core().read_model(xml)
+
+    # Same ignored scope as the ultralytics INT8 export: the box decoding in the head stays FP32
+    ignored_scope = nncf.IgnoredScope(
+        patterns=[f".*{head_index}/.*/Add", f".*{head_index}/.*/Sub*", f".*{head_index}/.*/Mul*",
+                  f".*{head_index}/.*/Div*", f".*{head_index}\\.dfl.*"],
+        types=["Sigmoid"],
+        validate=False,
+    )
+    quantized = nncf.quantize(model, nncf.Dataset(CalibrationSet(paths, imgsz)),
+                              preset=nncf.QuantizationPreset.MIXED, ignored_scope=ignored_scope)
+
+    os.makedirs(target, exist_ok=True)
+    ov.save_model(quantized, os.path.join(target, os.path.basename(xml)))
+    shutil.copy2(os.path.join(fp32_dir, "metadata.yaml"), os.path.join(target, "metadata.yaml"))
+
+
+def run_model(model_file, paths, imgsz):
+    """
+    Detections per image as (n, 6) arrays and the average time per image in ms.
+    Images are read one at a time, only the predict calls are timed.
+    """
+    model = YOLO(model_file, task='detect')
+    detections = []
+    elapsed = 0.0
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        if not detections:
+            model.predict(source=image, imgsz=imgsz, verbose=False) # Warm-up
+        start = time.perf_counter()
+        result = model.predict(source=image, imgsz=imgsz, conf=0.2, verbose=False)[0]
+        elapsed += time.perf_counter() - start
+        detections.append(result.boxes.data.cpu().numpy())
+    return detections, elapsed * 1000 / max(len(detections), 1)
+
+
+def box_iou(a, b):
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0]); y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2]); y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def compare(fp32, int8):
+    """Accuracy of INT8 with the FP32 detections as reference (the saved frames have no labels)."""
+    matched, total_fp32, total_int8, conf_deltas, decisions_changed = 0, 0, 0, [], 0
+    for ref, test in zip(fp32, int8):
+        total_fp32 += len(ref); total_int8 += len(test)
+        if len(ref) and len(test):
+            iou = box_iou(ref[:, :4], test[:, :4])
+            same_class = ref[:, None, 5] == test[None, :, 5]
+            matched += int(((iou >= MATCH_IOU) & same_class).any(axis=1).sum())
+
+        top_ref = float(ref[:, 4].max()) if len(ref) else 0.0
+        top_test = float(test[:, 4].max()) if len(test) else 0.0
+        conf_deltas.append(top_test - top_ref)
+        decisions_changed += (top_ref >= DECISION_CONF) != (top_test >= DECISION_CONF)
+
+    return {
+        "images": len(fp32),
+        "recall_vs_fp32": matched / total_fp32 if total_fp32 else 1.0,
+        "precision_vs_fp32": matched / total_int8 if total_int8 else 1.0,
+        "mean_top_conf_delta": float(np.mean(conf_deltas)) if conf_deltas else 0.0,
+        "max_top_conf_drop": float(-min(conf_deltas)) if conf_deltas else 0.0,
+        f"decisions_changed_at_{DECISION_CONF}": int(decisions_changed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize a CowCatcher/CalvingCatcher model to INT8, calibrated on saved frames.")
+    parser.add_argument("model", help="Model file in weights/ (e.g. cowcatcherV15.pt)")
+    parser.add_argument("--format", choices=QUANT_FORMATS, default="openvino")
+    parser.add_argument("--imgsz", type=int, default=640, help="Input size, use the 'Model Input Size' of the cameras")
+    parser.add_argument("--samples", type=int, default=300, help="Number of frames used for calibration and comparison")
+    parser.add_argument("--data", nargs="*", default=[DATA_DIR], help="Folders with saved frames (default: all of data/)")
+    args = parser.parse_args()
+
+    model_path = args.model if os.path.exists(args.model) else os.path.join(WEIGHTS_DIR, args.model)
+    if not model_path.endswith(".pt") or not os.path.exists(model_path):
+        print(f"ERROR: {model_path} is not an existing .pt model.")
+        sys.exit(1)
+
+    paths = find_images(args.data, args.samples)
+    if len(paths) < 10:
+        print(f"ERROR: Found only {len(paths)} images in {', '.join(args.data)}, need at least 10 for calibration.")
+        sys.exit(1)
+    print(f"Using {len(paths)} frames for calibration and comparison")
+
+    folder = cache_dir(model_path, args.imgsz)
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    local_pt = os.path.join(folder, os.path.basename(model_path))
+    if not os.path.exists(local_pt):
+        shutil.copy2(model_path, local_pt)
+
+    # FP32 export of the same format is both the starting point and the reference
+    fp32_file = exported_path(folder, stem, args.format)
+    if not os.path.exists(fp32_file):
+        print(f"Exporting FP32 {args.format} model...")
+        YOLO(local_pt, task='detect').export(format=args.format, imgsz=args.imgsz, dynamic=True)
+
+    target = int8_path(folder, stem, args.format)
+    print(f"Quantizing to INT8 ({args.format})...")
+    if args.format == "onnx":
+        quantize_onnx(fp32_file, target, paths, args.imgsz)
+    else:
+        head_index = len(YOLO(local_pt, task='detect').model.model) - 1
+        quantize_openvino(fp32_file, target, paths, args.imgsz, head_index)
+
+    print("Comparing FP32 and INT8 on the same frames...")
+    fp32_detections, fp32_ms = run_model(fp32_file, paths, args.imgsz)
+    int8_detections, int8_ms = run_model(target, paths, args.imgsz)
+
+    report = compare(fp32_detections, int8_detections)
+    report.update({"format": args.format, "imgsz": args.imgsz, "fp32_ms": fp32_ms, "int8_ms": int8_ms,
+                   "speedup": fp32_ms / int8_ms if int8_ms else 0.0})
+    with open(os.path.join(folder, f"{stem}_int8_{args.format}_report.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"✅ INT8 model saved: {target}")
+    print(f"   Speed: {fp32_ms:.1f} ms -> {int8_ms:.1f} ms per frame ({report['speedup']:.2f}x)")
+    print(f"   Detections found again: {report['recall_vs_fp32']:.1%} | Extra detections: {1 - report['precision_vs_fp32']:.1%}")
+    print(f"   Top confidence: mean delta {report['mean_top_conf_delta']:+.3f}, largest drop {report['max_top_conf_drop']:.3f}")
+    print(f"   Frames with a different decision at conf {DECISION_CONF}: {report[f'decisions_changed_at_{DECISION_CONF}']}/{report['images']}")
+    print("Switch on 'use_int8_model' in the settings to use it.")
+
+
+if __name__ == "__main__":
+    main()
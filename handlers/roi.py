@@ -0,0 +1,64 @@
+"""
+Per-camera regions of interest.
+
+A camera can have one or more polygons in config.json ("roi"), with points relative
+to the frame size (0.0 - 1.0). Before inference the frame is cropped to the bounding
+rectangle of all polygons and everything outside the polygons is blacked out, so the
+model only looks at the pen and works on fewer pixels.
+"""
+
+import cv2
+import numpy as np
+
+IMGSZ_STRIDE = 32 # YOLO input sizes are multiples of the model stride
+
+
+class RegionOfInterest:
+    def __init__(self, polygons):
+        self.polygons = [np.array(p, dtype=np.float32) for p in (polygons or []) if len(p) >= 3]
+        self._shape = None
+        self._rect = None
+        self._mask = None
+
+    @property
+    def enabled(self):
+        return bool(self.polygons)
+
+    def _build(self, shape):
+        """Converts the polygons to pixels for this frame size and caches the crop rectangle and mask."""
+        h, w = shape[:2]
+        points = [np.round(p * (w, h)).astype(np.int32) for p in self.polygons]
+        x0, y0 = np.clip(np.min([p.min(axis=0) for p in points], axis=0), 0, (w - 1, h - 1))
+        x1, y1 = np.clip(np.max([p.max(axis=0) for p in points], axis=0) + 1, 1, (w, h))
+
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [p - (x0, y0) for p in points], 255)
+
+        self._shape = shape[:2]
+        self._rect = (int(x0), int(y0), int(x1), int(y1))
+        # A single rectangle covering its bounding box needs no masking
+        self._mask = None if cv2.countNonZero(mask) == mask.size else mask
+
+    def crop(self, frame):
+        """Returns (image, offset): the masked crop and its top-left corner in the frame."""
+        if not self.enabled:
+            return frame, (0, 0)
+        if self._shape != frame.shape[:2]:
+            self._build(frame.shape)
+
+        x0, y0, x1, y1 = self._rect
+        image = frame[y0:y1, x0:x1]
+        if self._mask is not None:
+            image = cv2.bitwise_and(image, image, mask=self._mask)
+        return image, (x0, y0)
+
+    def imgsz(self, imgsz, frame_shape):
+        """Scales the model input size with the crop, so the pixel density stays the same."""
+        if not self.enabled:
+            return imgsz
+        if self._shape != frame_shape[:2]:
+            self._build(frame_shape)
+
+        x0, y0, x1, y1 = self._rect
+        ratio = max(x1 - x0, y1 - y0) / max(frame_shape[:2])
+        return max(IMGSZ_STRIDE, int(np.ceil(imgsz * ratio / IMGSZ_STRIDE)) * IMGSZ_STRIDE)
@@ -0,0 +1,83 @@
+"""
+Adaptive sampling rate for the handlers.
+
+Instead of analyzing a fixed share of the frames, each camera has a minimum and a
+maximum rate (analyzed frames per second). The sampler stays at the low idle rate
+while nothing is seen, switches to the full rate as soon as a detection crosses the
+pre-trigger confidence (or an event is running) and holds it for a while after the
+last one. When the system CPU is saturated the rate backs off, but never below the
+minimum rate.
+
+CPU load is read with psutil when it is installed; without it there is no back-off.
+"""
+
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CPU_SAMPLE_INTERVAL = 2.0 # Seconds between CPU load readings
+BACKOFF_STEP = 0.8 # Rate factor applied per reading while the CPU is saturated
+RECOVER_STEP = 1.25 # Rate factor applied per reading once there is headroom again
+CPU_HEADROOM_MARGIN = 20 # Percent below the back-off level that counts as headroom
+
+
+class AdaptiveSampler:
+    def __init__(self, min_rate, max_rate, pre_trigger=0.5, hold_time=10, cpu_backoff_percent=90):
+        self.max_rate = max(float(max_rate), 0.01)
+        self.min_rate = min(max(float(min_rate), 0.01), self.max_rate)
+        self.pre_trigger = pre_trigger
+        self.hold_time = hold_time
+        self.cpu_backoff_percent = cpu_backoff_percent
+
+        self.full_rate_until = 0.0
+        self.last_taken = 0.0
+        self.cpu_factor = 1.0
+        self.cpu_percent = None
+        self.last_cpu_check = 0.0
+        if psutil is not None:
+            psutil.cpu_percent(interval=None) # First call only starts the measurement
+        else:
+            print("⚠️ psutil not installed, the sampling rate does not back off on high CPU load.")
+
+    def report(self, confidence, now=None, active=False):
+        """Called with the highest confidence of every analyzed frame; `active` keeps the full rate (event running)."""
+        now = now or time.time()
+        if active or confidence >= self.pre_trigger:
+            self.full_rate_until = now + self.hold_time
+
+    @property
+    def boosted(self):
+        return time.time() < self.full_rate_until
+
+    def _update_cpu(self, now):
+        if psutil is None or now - self.last_cpu_check < CPU_SAMPLE_INTERVAL:
+            return
+        self.last_cpu_check = now
+        self.cpu_percent = psutil.cpu_percent(interval=None)
+        if self.cpu_percent >= self.cpu_backoff_percent:
+            self.cpu_factor = max(self.cpu_factor * BACKOFF_STEP, 0.01)
+        elif self.cpu_percent < self.cpu_backoff_percent - CPU_HEADROOM_MARGIN:
+            self.cpu_factor = min(self.cpu_factor * RECOVER_STEP, 1.0)
+
+    def rate(self, now=None):
+        now = now or time.time()
+        self._update_cpu(now)
+        rate = self.max_rate if now < self.full_rate_until else self.min_rate
+        return max(rate * self.cpu_factor, self.min_rate)
+
+    def wait_time(self, now=None):
+        """Seconds until the next frame should be analyzed (0 when it is due)."""
+        now = now or time.time()
+        return max(0.0, self.last_taken + 1.0 / self.rate(now) - now)
+
+    def taken(self, now=None):
+        self.last_taken = now or time.time()
+
+    def stats_line(self):
+        mode = "full" if self.boosted else "idle"
+        cpu = f", CPU {self.cpu_percent:.0f}%" if self.cpu_percent is not None else ""
+        backoff = f", back-off x{self.cpu_factor:.2f}" if self.cpu_factor < 1.0 else ""
+        return f"Rate: {self.rate():.1f}/s ({mode}{cpu}{backoff})"
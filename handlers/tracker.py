@@ -0,0 +1,96 @@
+"""
+Detect-then-track: follow the detected boxes with optical flow between detector runs.
+
+While a mounting event is being collected the same animals are scored on every
+analyzed frame. With tracking on, the detector runs only every `detect_every` frames;
+in between, feature points inside each box are followed with Lucas-Kanade optical
+flow on a small grayscale copy and the boxes are moved along. A tracked box keeps the
+confidence of its last detection, lowered by `decay` per tracked frame, so tracking
+alone never keeps an event alive for long. When too few points survive, the track is
+lost and the caller runs the detector on that frame right away.
+"""
+
+import cv2
+import numpy as np
+
+from handlers.detections import Detections
+
+TRACK_WIDTH = 640 # Width of the grayscale copy used for optical flow
+MAX_POINTS = 30 # Feature points per box
+MIN_POINTS = 6 # Fewer surviving points than this: track lost
+MIN_SURVIVAL = 0.5 # Share of the points of the previous frame that must survive
+MAX_FB_ERROR = 1.0 # Pixels, a point tracked forward and back must land this close to its start
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class OpticalFlowTracker:
+    def __init__(self, detect_every=3, decay=0.95):
+        self.detect_every = max(int(detect_every), 1)
+        self.decay = decay
+        self.tracks = []
+        self.prev_gray = None
+        self.scale = 1.0
+        self.age = 0 # Frames tracked since the last detection
+        self.names = {}
+        self.stats = {'detected': 0, 'tracked': 0, 'lost': 0}
+
+    def _gray(self, frame):
+        self.scale = min(1.0, TRACK_WIDTH / frame.shape[1])
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA) if self.scale < 1.0 else frame
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def detection_due(self):
+        """True when the detector should run on the next frame (nothing tracked, or K frames passed)."""
+        return not self.tracks or self.age >= self.detect_every - 1
+
+    def start(self, frame, detections):
+        """Takes the Detections of a detector run (in `frame` coordinates) as the new tracks."""
+        self.stats['detected'] += 1
+        self.age = 0
+        self.names = detections.names
+        self.prev_gray = self._gray(frame)
+        self.tracks = []
+
+        for box, conf, cls in zip(detections.boxes, detections.conf, detections.cls):
+            box = box * self.scale
+            mask = np.zeros_like(self.prev_gray)
+            mask[int(box[1]):int(box[3]) + 1, int(box[0]):int(box[2]) + 1] = 255
+            points = cv2.goodFeaturesToTrack(self.prev_gray, MAX_POINTS, 0.01, 3, mask=mask)
+            if points is not None and len(points) >= MIN_POINTS:
+                self.tracks.append({'box': box, 'conf': float(conf), 'cls': float(cls), 'points': points})
+
+    def track(self, frame):
+        """Moves all boxes to `frame`. Returns Detections, or None when a track was lost."""
+        gray = self._gray(frame)
+        boxes = []
+        for track in self.tracks:
+            points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, track['points'], None, **LK_PARAMS)
+            # Forward-backward check: points that do not track back to where they started are unreliable
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, points, None, **LK_PARAMS)
+            fb_error = np.linalg.norm((back - track['points']).reshape(-1, 2), axis=1)
+            good = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (fb_error < MAX_FB_ERROR)
+            if good.sum() < max(MIN_POINTS, MIN_SURVIVAL * len(track['points'])):
+                self.stats['lost'] += 1
+                self.tracks = []
+                return None
+
+            shift = np.median(points[good] - track['points'][good], axis=0).reshape(2)
+            track['box'] = track['box'] + np.tile(shift, 2)
+            track['points'] = points[good].reshape(-1, 1, 2)
+            track['conf'] *= self.decay
+            boxes.append([*(track['box'] / self.scale), track['conf'], track['cls']])
+
+        self.prev_gray = gray
+        self.age += 1
+        self.stats['tracked'] += 1
+        return Detections.from_data(boxes, self.names, frame.shape)
+
+    def reset(self):
+        self.tracks = []
+
+    def stats_line(self):
+        total = self.stats['detected'] + self.stats['tracked']
+        share = self.stats['tracked'] / total if total else 0.0
+        return f"Tracker: {share:.0%} of event frames tracked | Lost: {self.stats['lost']}"
@@ -0,0 +1,122 @@
+"""
+Persistent, bounded, prioritized notification outbox.
+
+Telegram sends go through an SQLite file under data/ instead of an in-memory queue:
+pending notifications survive a restart of the worker (they are sent after it starts
+again), and an internet outage cannot grow the backlog without limit. Items are
+handed out by priority (alarm > event > manual check > status), oldest first, so
+a backlog of status messages never delays an alarm.
+
+Bounds: every priority class has a maximum age, older items are dropped. When the
+outbox is full, the oldest item of the lowest priority class is dropped to make room;
+an alarm is only dropped when the outbox holds nothing but alarms. Failed sends only
+count against an item when Telegram rejected it (e.g. unknown chat, file too large):
+during an outage items wait, bounded by age and size alone.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+PRIORITIES = {'alarm': 0, 'event': 1, 'manual': 2, 'status': 3}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+MAX_AGE = {'alarm': 24 * 3600, 'event': 6 * 3600, 'manual': 3600, 'status': 600} # Seconds
+MAX_ITEMS = 200
+MAX_ATTEMPTS = 10 # Rejected sends before an item is dropped
+RETRY_DELAY = 30 # Seconds before a failed item is tried again
+
+
+class Outbox:
+    def __init__(self, path, max_items=MAX_ITEMS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_items = max_items
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, priority INTEGER, created REAL, not_before REAL,
+            attempts INTEGER DEFAULT 0, kind TEXT, payload TEXT)""")
+        self.changed = threading.Condition()
+        self.closed = False
+        self.stats = {'dropped': 0}
+
+        self._expire()
+        pending = self.pending()
+        if pending:
+            print(f"📬 Outbox: {pending} notification(s) from before the restart will be sent", flush=True)
+
+    def _expire(self):
+        now = time.time()
+        for name, priority in PRIORITIES.items():
+            dropped = self.db.execute("DELETE FROM outbox WHERE priority = ? AND created < ?",
+                                      (priority, now - MAX_AGE[name])).rowcount
+            if dropped:
+                self.stats['dropped'] += dropped
+                print(f"⚠️ Outbox: {dropped} {name} notification(s) too old, dropped", flush=True)
+
+    def put(self, priority, kind, *args):
+        """Stores a notification: `priority` a key of PRIORITIES, `kind` and `args` (JSON) for the worker."""
+        now = time.time()
+        with self.changed:
+            self._expire()
+            if self.pending() >= self.max_items:
+                # Full: drop the oldest item of the lowest priority class, or this one if it ranks lower still
+                lowest = self.db.execute("SELECT id, priority FROM outbox ORDER BY priority DESC, id LIMIT 1").fetchone()
+                self.stats['dropped'] += 1
+                if lowest[1] < PRIORITIES[priority]:
+                    print(f"⚠️ Outbox full ({self.max_items}), {priority} notification dropped", flush=True)
+                    return
+                self.db.execute("DELETE FROM outbox WHERE id = ?", (lowest[0],))
+                print(f"⚠️ Outbox full ({self.max_items}), oldest lower priority notification dropped", flush=True)
+            self.db.execute("INSERT INTO outbox (priority, created, not_before, kind, payload) VALUES (?, ?, ?, ?, ?)",
+                            (PRIORITIES[priority], now, now, kind, json.dumps(args)))
+            self.changed.notify()
+
+    def get(self):
+        """
+        Waits for the most urgent notification that is due. Returns (id, priority, kind, args),
+        or None once the outbox is closed. Call done() or retry() with the id afterwards.
+        """
+        with self.changed:
+            while not self.closed:
+                now = time.time()
+                row = self.db.execute("SELECT id, priority, kind, payload FROM outbox WHERE not_before <= ? "
+                                      "ORDER BY priority, id LIMIT 1", (now,)).fetchone()
+                if row:
+                    # Not handed out again while it is being sent
+                    self.db.execute("UPDATE outbox SET not_before = ? WHERE id = ?", (now + RETRY_DELAY, row[0]))
+                    return row[0], PRIORITY_NAMES[row[1]], row[2], json.loads(row[3])
+                due = self.db.execute("SELECT MIN(not_before) FROM outbox").fetchone()[0]
+                self.changed.wait(min(due - now, RETRY_DELAY) if due else RETRY_DELAY)
+        return None
+
+    def done(self, item_id):
+        with self.changed:
+            self.db.execute("DELETE FROM outbox WHERE id = ?", (item_id,))
+
+    def retry(self, item_id, permanent=False):
+        """
+        The send failed: try again after RETRY_DELAY. Only `permanent` failures (rejected by
+        Telegram, not a network failure, 429 or server error) count, the item is dropped
+        after MAX_ATTEMPTS of them.
+        """
+        with self.changed:
+            self.db.execute("UPDATE outbox SET attempts = attempts + ?, not_before = ? WHERE id = ?",
+                            (int(permanent), time.time() + RETRY_DELAY, item_id))
+            if permanent and self.db.execute("DELETE FROM outbox WHERE id = ? AND attempts >= ?", (item_id, MAX_ATTEMPTS)).rowcount:
+                self.stats['dropped'] += 1
+                print(f"⚠️ Outbox: notification rejected {MAX_ATTEMPTS} times, dropped", flush=True)
+
+    def pending(self):
+        with self.changed:
+            return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        """Wakes the worker (get() returns None). Pending items stay for the next start."""
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+
+    def stats_line(self):
+        return f"Outbox: {self.pending()} pending | Dropped: {self.stats['dropped']}"
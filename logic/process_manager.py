@@ -3,14 +3,30 @@ import sys
 import threading
 import time
 import os
-import requests
+import secrets
 from datetime import datetime
 
+from logic.telegram_client import TelegramClient
+
 # SETTINGS
 WATCHDOG_TIMEOUT = 90   
 WATCHDOG_INTERVAL = 5   
 MAX_RETRIES = 5         
 HIBERNATION_TIME = 3600 
+HEARTBEAT_MARKERS = ("Frames processed", "Opening camera stream", "Optimizing model")
+
+# Shared inference server (handlers/inference_server.py), log lines go to the SYSTEM log
+INFERENCE_SERVER_ID = "SYSTEM inference_server"
+INFERENCE_ADDRESS_ENV = "COWCATCHER_INFERENCE_ADDRESS"
+INFERENCE_AUTHKEY_ENV = "COWCATCHER_INFERENCE_AUTHKEY"
+
+# Notification gateway (handlers/notification_gateway.py), sends to Telegram for all cameras
+GATEWAY_ID = "SYSTEM notification_gateway"
+GATEWAY_ADDRESS_ENV = "COWCATCHER_GATEWAY_ADDRESS"
+GATEWAY_AUTHKEY_ENV = "COWCATCHER_GATEWAY_AUTHKEY"
+
+# Display names of the system processes, shared by all cameras
+SYSTEM_PROCESS_NAMES = {INFERENCE_SERVER_ID: "Inference server", GATEWAY_ID: "Notification gateway"}
 
 class ProcessManager:
     def __init__(self, config_manager, log_callback=None):
@@ -23,6 +39,16 @@ class ProcessManager:
         
         self.hibernating_cameras = {} 
         self.alert_sent = {}          
+
+        # System processes (inference server, notification gateway) by log id, with the
+        # environment variables the camera workers need to reach them
+        self.system_processes = dict.fromkeys(SYSTEM_PROCESS_NAMES)
+        self.system_env = {proc_id: {} for proc_id in SYSTEM_PROCESS_NAMES}
+        # start_camera runs on several threads (startup, watchdog restarts): spawn each only once
+        self.system_locks = {proc_id: threading.Lock() for proc_id in SYSTEM_PROCESS_NAMES}
+        # One auth key per session, so running cameras can reconnect after a restart
+        self.inference_authkey = secrets.token_hex(16)
+        self.gateway_authkey = secrets.token_hex(16)
         
         self.watchdog_running = True
         self.watchdog_thread = threading.Thread(target=self._watchdog_loop, daemon=True)
@@ -58,12 +84,12 @@ class ProcessManager:
                        f"The system will automatically retry in <b>1 hour</b>.\n"
                        f"You will not receive further notifications unless it succeeds.")
 
+                # Retried with backoff: this alert is sent exactly once
+                telegram = TelegramClient.for_token(token)
                 for chat_id in chat_ids:
-                    url = f"https://api.telegram.org/bot{token}/sendMessage"
-                    try:
-                        requests.post(url, data={'chat_id': chat_id, 'text': msg, 'parse_mode': 'HTML'}, timeout=10)
-                    except Exception: pass
-                
+                    if not telegram.send_message(chat_id, msg, parse_mode='HTML'):
+                        self.log(cam_id, f"Error in telegram alert to {chat_id}: {telegram.last_error}")
+
                 self.log(cam_id, "🚨 Telegram emergency message sent.")
                 
             except Exception as e:
@@ -72,6 +98,89 @@ class ProcessManager:
         self.alert_sent[cam_id] = True
         threading.Thread(target=_send, daemon=True).start()
 
+    def start_inference_server(self):
+        """
+        Starts the shared inference server if enabled and not yet running.
+        Returns the environment variables the camera workers need to reach it.
+        """
+        settings = self.cfg.get_inference_server_settings()
+        env = {
+            INFERENCE_ADDRESS_ENV: f"127.0.0.1:{settings.get('port', 50610)}",
+            INFERENCE_AUTHKEY_ENV: self.inference_authkey,
+        }
+        return self._start_system_process("inference_server.py", INFERENCE_SERVER_ID, env, settings)
+
+    def stop_inference_server(self):
+        self._stop_system_process(INFERENCE_SERVER_ID)
+
+    def start_notification_gateway(self):
+        """
+        Starts the notification gateway if enabled and not yet running.
+        Returns the environment variables the camera workers need to reach it.
+        """
+        settings = self.cfg.get_notification_gateway_settings()
+        env = {
+            GATEWAY_ADDRESS_ENV: f"127.0.0.1:{settings.get('port', 50611)}",
+            GATEWAY_AUTHKEY_ENV: self.gateway_authkey,
+        }
+        return self._start_system_process("notification_gateway.py", GATEWAY_ID, env, settings)
+
+    def stop_notification_gateway(self):
+        self._stop_system_process(GATEWAY_ID)
+
+    def _start_system_process(self, script, proc_id, env, settings):
+        """
+        Starts handlers/`script` as the system process `proc_id` if `settings` enable it and it
+        is not yet running. `env` holds the variables that tell the camera workers how to reach it
+        (only processes started by us know the auth key); returns it, or {} when not started.
+        """
+        name = SYSTEM_PROCESS_NAMES[proc_id]
+        with self.system_locks[proc_id]:
+            if not settings.get("enabled", False) or getattr(sys, 'frozen', False):
+                return {}
+            process = self.system_processes[proc_id]
+            if process and process.poll() is None:
+                return self.system_env[proc_id]
+
+            script_path = os.path.join("handlers", script)
+            if not os.path.exists(script_path):
+                self.log(proc_id, f"Error: Script '{script_path}' not found.")
+                return {}
+
+            process_env = os.environ.copy()
+            process_env.update(env)
+
+            creation_flags = 0
+            if sys.platform == "win32":
+                creation_flags = subprocess.CREATE_NO_WINDOW
+
+            try:
+                process = subprocess.Popen(
+                    [sys.executable, '-u', script_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    text=True, bufsize=1, creationflags=creation_flags, encoding='utf-8', errors='replace', env=process_env
+                )
+            except Exception as e:
+                self.log(proc_id, f"Error starting {name.lower()}: {str(e)}")
+                self.system_env[proc_id] = {}
+                return {}
+
+            self.system_processes[proc_id] = process
+            self.system_env[proc_id] = env
+            for level in ("INFO", "ERROR"):
+                threading.Thread(target=self._read_output, args=(process, proc_id, level), daemon=True).start()
+            self.log(proc_id, f"{name} started")
+            return env
+
+    def _stop_system_process(self, proc_id):
+        with self.system_locks[proc_id]:
+            process = self.system_processes[proc_id]
+            if process and process.poll() is None:
+                process.terminate()
+                try: process.wait(timeout=5)
+                except subprocess.TimeoutExpired: process.kill()
+                self.log(proc_id, f"{SYSTEM_PROCESS_NAMES[proc_id]} stopped.")
+            self.system_processes[proc_id] = None
+
     def start_camera(self, camera_id):
             if camera_id in self.processes and self.processes[camera_id].poll() is None:
                 return
@@ -90,6 +199,8 @@ class ProcessManager:
                 script_name = "cowcatcher_handler.py"
             elif handler_type == "calvingcatcher":
                 script_name = "calving_handler.py"
+            elif handler_type == "combined":
+                script_name = "combined_handler.py"
             else:
                 self.log(camera_id, f"Error: Unknown handler type '{handler_type}'")
                 return
@@ -117,6 +228,12 @@ class ProcessManager:
                      return
                      
                 cmd = [sys.executable, '-u', worker_script, camera_id]
+
+            # Camera workers send their frames to the shared inference server (if enabled)
+            env = os.environ.copy()
+            env.update(self.start_inference_server())
+            # ... and their Telegram notifications to the notification gateway (if enabled)
+            env.update(self.start_notification_gateway())
             
             creation_flags = 0
             if sys.platform == "win32":
@@ -125,7 +242,7 @@ class ProcessManager:
             try:
                 process = subprocess.Popen(
                     cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                    text=True, bufsize=1, creationflags=creation_flags, encoding='utf-8', errors='replace'
+                    text=True, bufsize=1, creationflags=creation_flags, encoding='utf-8', errors='replace', env=env
                 )
                 self.processes[camera_id] = process
                 
@@ -183,6 +300,8 @@ class ProcessManager:
         self.watchdog_running = False
         ids = list(self.processes.keys())
         for cam_id in ids: self.stop_camera(cam_id)
+        self.stop_inference_server()
+        self.stop_notification_gateway()
 
     def is_running(self, camera_id):
         return camera_id in self.processes and self.processes[camera_id].poll() is None
@@ -194,7 +313,8 @@ class ProcessManager:
                 stripped_line = line.strip()
                 self.log(cam_id, stripped_line)
                 
-                if "Frames processed" in stripped_line or "Opening camera stream" in stripped_line:
+                # "Optimizing model": the first start exports and benchmarks the model, which takes a while
+                if any(marker in stripped_line for marker in HEARTBEAT_MARKERS):
                     self.heartbeats[cam_id] = time.time()
                     if self.retry_counts.get(cam_id, 0) > 0:
                         self.retry_counts[cam_id] = 0
@@ -217,6 +337,18 @@ class ProcessManager:
                         if self.log_callback: self.log_callback(cam_id, f"[SYSTEM] {msg}")
                         threading.Thread(target=self.restart_camera, args=(cam_id,)).start()
             
+            # A system process died while cameras still use it: start it again (cameras reconnect)
+            for proc_id, start in ((INFERENCE_SERVER_ID, self.start_inference_server),
+                                   (GATEWAY_ID, self.start_notification_gateway)):
+                with self.system_locks[proc_id]:
+                    process = self.system_processes[proc_id]
+                    died = process and process.poll() is not None and self.watchdog_running
+                    if died:
+                        self.log(proc_id, f"{SYSTEM_PROCESS_NAMES[proc_id]} exited (code {process.returncode}), restarting...")
+                        self.system_processes[proc_id] = None
+                if died and any(self.is_running(cam_id) for cam_id in active_cameras):
+                    start()
+
             hibernating_ids = list(self.hibernating_cameras.keys())
             for cam_id in hibernating_ids:
                 sleep_start = self.hibernating_cameras[cam_id]
@@ -0,0 +1,195 @@
+"""
+Shared Telegram Bot API client for the handlers and the watchdog.
+
+One client per bot token and process: its requests.Session keeps the TLS connection
+to api.telegram.org alive between messages, and its rate limiter spaces the calls of
+that bot. Failed calls are retried with exponential backoff and jitter; on a 429 the
+`retry_after` Telegram asks for is honoured. Errors that a retry cannot fix (wrong
+token, unknown chat) are not retried.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0 # Seconds before the first retry, doubled per attempt
+BACKOFF_MAX = 30.0
+BOT_RATE = 20 # Calls per second per bot, below Telegram's limit of about 30
+POOL_SIZE = 4 # Keep-alive connections per bot
+MEDIA_GROUP_LIMIT = 10 # Photos per album (sendMediaGroup takes 2 to 10)
+
+
+class TelegramClient:
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    @classmethod
+    def for_token(cls, token):
+        """The shared client of a bot (created on first use)."""
+        with cls._clients_lock:
+            if token not in cls._clients:
+                cls._clients[token] = cls(token)
+            return cls._clients[token]
+
+    def __init__(self, token, rate=BOT_RATE):
+        self.token = token
+        self.interval = 1.0 / rate
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.last_error = None
+        self.last_error_permanent = False # The last failure was a reject that a retry cannot fix (4xx other than 429)
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0}
+
+    def _wait_for_slot(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def call(self, method, data=None, files=None, timeout=30, attempts=MAX_ATTEMPTS):
+        """
+        Calls a Bot API method. Returns its 'result' (e.g. the sent message), or None when
+        it failed after all attempts; the reason is in `last_error`, and `last_error_permanent`
+        tells a reject by Telegram from a network failure, 429 or server error.
+        files: {field: open file}, rewound before every attempt.
+        """
+        url = API_URL.format(token=self.token, method=method)
+        for attempt in range(attempts):
+            self._wait_for_slot()
+            self.stats['calls'] += 1
+            wait = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.5)
+            try:
+                for f in (files or {}).values():
+                    f.seek(0)
+                response = self.session.post(url, data=data, files=files, timeout=timeout)
+            except requests.RequestException as e:
+                self.last_error = str(e)
+                self.last_error_permanent = False
+            else:
+                try:
+                    reply = response.json()
+                except ValueError:
+                    reply = {}
+                if response.status_code == 200 and reply.get('ok', True):
+                    return reply.get('result', True)
+
+                self.last_error = reply.get('description') or response.text
+                self.last_error_permanent = 400 <= response.status_code < 500 and response.status_code != 429
+                if response.status_code == 429:
+                    self.stats['rate_limited'] += 1
+                    wait = reply.get('parameters', {}).get('retry_after', wait)
+                elif response.status_code < 500:
+                    break # Bad request, wrong token, blocked by the user: a retry will not help
+
+            if attempt < attempts - 1:
+                self.stats['retries'] += 1
+                time.sleep(wait)
+
+        self.stats['failed'] += 1
+        return None
+
+    def send_message(self, chat_id, text, **params):
+        return self.call("sendMessage", data={'chat_id': chat_id, 'text': text, **params}, timeout=10)
+
+    def send_photo(self, chat_id, path, caption="", disable_notification=False, file_id=None):
+        """Uploads the photo at `path`, or sends an earlier upload by its `file_id`."""
+        data = {'chat_id': chat_id, 'caption': caption, 'disable_notification': disable_notification}
+        if file_id:
+            return self.call("sendPhoto", data={**data, 'photo': file_id})
+        with open(path, 'rb') as photo:
+            return self.call("sendPhoto", data=data, files={'photo': photo})
+
+    def send_photo_to_chats(self, chat_ids, path, caption="", disable_notification=False):
+        """
+        Sends a photo to all chats, uploading it only once: the other chats get it by the
+        file_id of the upload (uploaded again if that fails).
+        Returns (chats reached, upload bytes saved).
+        """
+        sent, saved, file_id = 0, 0, None
+        for chat_id in chat_ids:
+            message = None
+            if file_id:
+                message = self.send_photo(chat_id, path, caption, disable_notification, file_id=file_id)
+                if message:
+                    saved += os.path.getsize(path)
+                else:
+                    print(f"⚠️ Sending by file_id failed for chat {chat_id}, uploading again: {self.last_error}")
+            if not message:
+                message = self.send_photo(chat_id, path, caption, disable_notification)
+                if message and not file_id:
+                    # Largest size of the uploaded photo
+                    file_id = message['photo'][-1]['file_id']
+            if message:
+                sent += 1
+            else:
+                print(f"ERROR sending Telegram photo to chat {chat_id}: {self.last_error}")
+        return sent, saved
+
+    def send_media_group(self, chat_id, paths, caption="", disable_notification=False, file_ids=None):
+        """
+        Sends the photos as one album with `caption` on the first one. Uploads them, or sends
+        earlier uploads by their `file_ids`. Returns the list of sent messages, or None.
+        """
+        media = [{'type': 'photo', 'media': file_ids[i] if file_ids else f"attach://photo{i}"} for i in range(len(paths))]
+        if caption:
+            media[0]['caption'] = caption
+        data = {'chat_id': chat_id, 'media': json.dumps(media), 'disable_notification': disable_notification}
+        if file_ids:
+            return self.call("sendMediaGroup", data=data)
+
+        photos = [open(path, 'rb') for path in paths]
+        try:
+            return self.call("sendMediaGroup", data=data, files={f"photo{i}": f for i, f in enumerate(photos)})
+        finally:
+            for f in photos:
+                f.close()
+
+    def send_album_to_chats(self, chat_ids, paths, caption="", disable_notification=False):
+        """
+        Sends the photos to all chats as albums, one request per album per chat instead of one
+        per photo. More photos than fit in one album are split evenly over several albums,
+        each with the caption on its first photo. Like send_photo_to_chats() every album is
+        uploaded once. Returns (chats that got all albums, upload bytes saved).
+        """
+        if len(paths) == 1:
+            return self.send_photo_to_chats(chat_ids, paths[0], caption, disable_notification)
+
+        albums = math.ceil(len(paths) / MEDIA_GROUP_LIMIT)
+        per_album = math.ceil(len(paths) / albums)
+        reached = dict.fromkeys(chat_ids, True)
+        saved = 0
+        for n, start in enumerate(range(0, len(paths), per_album)):
+            album = paths[start:start + per_album]
+            album_caption = f"{caption} ({n + 1}/{albums})" if albums > 1 and caption else caption
+            file_ids = None
+            for chat_id in chat_ids:
+                messages = None
+                if file_ids:
+                    messages = self.send_media_group(chat_id, album, album_caption, disable_notification, file_ids)
+                    if messages:
+                        saved += sum(os.path.getsize(path) for path in album)
+                    else:
+                        print(f"⚠️ Sending album by file_id failed for chat {chat_id}, uploading again: {self.last_error}")
+                if not messages:
+                    messages = self.send_media_group(chat_id, album, album_caption, disable_notification)
+                    if messages and not file_ids:
+                        file_ids = [m['photo'][-1]['file_id'] for m in messages]
+                if not messages:
+                    reached[chat_id] = False
+                    print(f"ERROR sending Telegram album to chat {chat_id}: {self.last_error}")
+        return sum(reached.values()), saved
+
+    def stats_line(self):
+        return f"Telegram: {self.stats['retries']} retries | Rate limited: {self.stats['rate_limited']} | Failed: {self.stats['failed']}"